@@ -1,6 +1,5 @@
 #!/usr/bin/env runaiida
-import sys
-import time
+import argparse
 
 #from re import S
 from aiida.plugins import DataFactory, WorkflowFactory
@@ -11,21 +10,64 @@ from aiida.engine import submit
 from aiida_common_workflows.common import ElectronicType, RelaxType, SpinType
 from aiida_common_workflows.plugins import get_entry_point_name_from_class
 from aiida_common_workflows.plugins import load_workflow_entry_point
+from aiida_quantumespresso.workflows.pw.base import PwBaseWorkChain
+from aiida_quantumespresso.workflows.pw.relax import PwRelaxWorkChain
 from aiida_submission_controller import FromGroupSubmissionController
 
+from submission_utils.adaptive import AdaptiveConcurrencyMixin, run_adaptive
+from submission_utils.cost import CostAwareOrderingMixin, CostModel
+from submission_utils.daemon import SubmissionDaemon
+from submission_utils.parallelization import Parallelization, get_qe_cmdline
+from submission_utils.policies import AdaptiveConcurrency
+from submission_utils.volumes import VolumeResubmissionController
+
 DRY_RUN = False
 MAX_CONCURRENT = 24
+# Bounds of the maximum number of concurrent workflows, and time (in seconds) between two batches, with --adaptive
+ADAPTIVE_MIN_CONCURRENT = 8
+ADAPTIVE_MAX_CONCURRENT = 200
+ADAPTIVE_INTERVAL = 600
+# Time (in seconds) between two resyncs with the database, with --daemon
+DAEMON_POLL_INTERVAL = 600
 PLUGIN_NAME = 'quantum_espresso'
 CODE_LABEL = 'qe-6.8-pw@eiger-mc'
-
-
-class EosSubmissionController(FromGroupSubmissionController):
+PROTOCOL = 'verification-PBE-v1'
+# Resources and parallelization are chosen per system from its size (see `submission_utils/parallelization.py`):
+# number of cores per machine, and maximum number of machines per calculation
+CORES_PER_MACHINE = 128
+MAX_MACHINES = 2
+# Values that override the computed ones, for an element or a system, e.g.:
+# {'Ce': {'num_machines': 2}, ('U', 'X2O5'): {'npool': 16, 'nband': 2}}
+PARALLELIZATION_OVERRIDES = {}
+
+
+def get_protocol_inputs():
+    """Return the protocol inputs (pseudo family, k-point distance, ...) of the `PwBaseWorkChain` of the relax workflow.
+
+    As in the Quantum ESPRESSO common relax input generator, a protocol that `aiida-quantumespresso` does not define
+    (e.g. `verification-PBE-v1`) is read from `aiida-common-workflows`, as overrides of the default protocol.
+    """
+    if PROTOCOL in PwRelaxWorkChain.get_available_protocols():
+        protocol, overrides = PROTOCOL, None
+    else:
+        generator = load_workflow_entry_point('relax', PLUGIN_NAME).get_input_generator()
+        protocol, overrides = None, generator._load_local_protocols()[PROTOCOL]  # pylint: disable=protected-access
+    relax_inputs = PwRelaxWorkChain.get_protocol_inputs(protocol, overrides)
+    return PwBaseWorkChain.get_protocol_inputs(protocol, relax_inputs.get('base'))
+
+
+class EosSubmissionController(AdaptiveConcurrencyMixin, CostAwareOrderingMixin, FromGroupSubmissionController):
     """A SubmissionController for submitting EOS with Quantum ESPRESSO common workflows."""
     def __init__(self, code_label, *args, **kwargs):
         """Pass also a code label, that should be a code associated to an `quantumespresso.pw` plugin."""
         super().__init__(*args, **kwargs)
         self._code = orm.load_code(code_label)
         self._process_class = WorkflowFactory('common_workflows.eos')
+        self._parallelization = Parallelization(
+            kpoints_distance=get_protocol_inputs()['kpoints_distance'],
+            cores_per_machine=CORES_PER_MACHINE,
+            max_machines=MAX_MACHINES,
+            overrides=PARALLELIZATION_OVERRIDES)
 
     def get_extra_unique_keys(self):
         """Return a tuple of the keys of the unique extras that will be used to uniquely identify your workchains.
@@ -46,6 +88,9 @@ class EosSubmissionController(FromGroupSubmissionController):
         sub_process_cls_name = get_entry_point_name_from_class(sub_process_cls).name
         generator = sub_process_cls.get_input_generator()
 
+        parallelization = self._parallelization.get_parallelization(
+            structure.cell, len(structure.sites), extras_values)
+
         engine_types = generator.spec().inputs['engines']
         engines = {}
         # There should be only one
@@ -54,7 +99,8 @@ class EosSubmissionController(FromGroupSubmissionController):
                 'code': CODE_LABEL,
                 'options': {
                     'resources': {
-                        'num_machines': 1
+                        'num_machines': parallelization['num_machines'],
+                        'num_mpiprocs_per_machine': parallelization['num_mpiprocs_per_machine'],
                     },
                     'account': 'mr0',
                     'max_wallclock_seconds': 3600
@@ -65,7 +111,7 @@ class EosSubmissionController(FromGroupSubmissionController):
             'structure': structure,
             'generator_inputs': {  # code-agnostic inputs for the relaxation
                 'engines': engines,
-                'protocol': 'verification-PBE-v1',
+                'protocol': PROTOCOL,
                 'relax_type': RelaxType.NONE,
                 'electronic_type': ElectronicType.METAL,
                 'spin_type': SpinType.NONE,
@@ -75,7 +121,7 @@ class EosSubmissionController(FromGroupSubmissionController):
                 'base': {
                     'pw': {
                         'settings' : orm.Dict(dict= {
-                            'cmdline': ['-nk', '32'],
+                            'cmdline': get_qe_cmdline(parallelization),
                         })
                     }
                 }
@@ -84,12 +130,50 @@ class EosSubmissionController(FromGroupSubmissionController):
 
         return inputs, self._process_class
 
+
+def get_cost_model():
+    """Return the model of the cost of the systems, with the k-point distance and the pseudopotentials of `PROTOCOL`.
+
+    The cutoffs are the recommended ones of the pseudo family of the protocol (see `get_protocol_inputs`), as used by
+    the relax workflows.
+    """
+    protocol_inputs = get_protocol_inputs()
+    family = orm.load_group(protocol_inputs['pseudo_family'])
+
+    ecutwfc = {}
+    valence_electrons = {}
+    for element in family.elements:
+        ecutwfc[element] = family.get_recommended_cutoffs(elements=(element,), unit='Ry')[0]
+        valence_electrons[element] = family.get_pseudo(element).z_valence
+    return CostModel(
+        kpoints_distance=protocol_inputs['kpoints_distance'], ecutwfc=ecutwfc, valence_electrons=valence_electrons)
+
 if __name__ == "__main__":
-    try:
-        SET_NAME = sys.argv[1]
-    except IndexError:
-        print("Pass as parameter the set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Submit the EOS workflows of a set.")
+    parser.add_argument(
+        'set_name', help="The set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
+    parser.add_argument(
+        '--adaptive', action='store_true',
+        help="Keep submitting in a loop until all workflows are done, adapting the maximum number of concurrent "
+        "workflows to the load of the computer (queue wait, running jobs, recent failures).")
+    parser.add_argument(
+        '--order', choices=['extras', 'cost'], default='extras',
+        help="Order of submission: by the extras (element, configuration), or by decreasing estimated cost, "
+        "limiting the number of expensive systems running at the same time.")
+    parser.add_argument(
+        '--missing-volumes', action='store_true',
+        help="Instead of EOS workflows, submit relax workflows only for the volumes that are missing from the failed "
+        "EOS workflows (see `get_results.py --resubmitted-volumes` to use them).")
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help="Keep running until all workflows are done, submitting a new workflow as soon as an active one "
+        "terminates (instead of running the script in a loop).")
+    args = parser.parse_args()
+    if args.missing_volumes and (args.adaptive or args.order != 'extras'):
+        parser.error("--missing-volumes can not be combined with --adaptive or --order")
+    if args.daemon and (args.adaptive or args.missing_volumes):
+        parser.error("--daemon can not be combined with --adaptive or --missing-volumes")
+    SET_NAME = args.set_name
 
     STRUCTURES_GROUP_LABEL = f'acwf-verification/{SET_NAME}/structures/{PLUGIN_NAME}'
     WORKFLOWS_GROUP_LABEL = f'acwf-verification/{SET_NAME}/workflows/{PLUGIN_NAME}'
@@ -99,7 +183,20 @@ if __name__ == "__main__":
         code_label=CODE_LABEL,
         group_label=WORKFLOWS_GROUP_LABEL,
         max_concurrent=MAX_CONCURRENT)
-    
+
+    if args.missing_volumes:
+        controller = VolumeResubmissionController(
+            eos_controller=controller,
+            group_label=f'{WORKFLOWS_GROUP_LABEL}/volumes',
+            max_concurrent=MAX_CONCURRENT)
+    if args.order == 'cost':
+        controller.cost_model = get_cost_model()
+    if args.adaptive:
+        controller.concurrency_policy = AdaptiveConcurrency(
+            initial=min(max(MAX_CONCURRENT, ADAPTIVE_MIN_CONCURRENT), ADAPTIVE_MAX_CONCURRENT),
+            min_concurrent=ADAPTIVE_MIN_CONCURRENT,
+            max_concurrent=ADAPTIVE_MAX_CONCURRENT)
+
     print('Already run    :', controller.num_already_run)
     print('Max concurrent :', controller.max_concurrent)
     print('Available slots:', controller.num_available_slots)
@@ -107,11 +204,18 @@ if __name__ == "__main__":
     print('Still to run   :', controller.num_to_run)
     print()
 
-    run_processes = controller.submit_new_batch(dry_run=DRY_RUN)
-    for run_process_extras, run_process in run_processes.items():
-        if run_process is None:
-            print(f'{run_process_extras} --> To be run')    
-        else:
-            print(f'{run_process_extras} --> PK = {run_process.pk}')
+    if args.daemon:
+        SubmissionDaemon(controller, poll_interval=DAEMON_POLL_INTERVAL, dry_run=DRY_RUN).run()
+    elif args.adaptive:
+        run_adaptive(
+            controller, computer_label=orm.load_code(CODE_LABEL).computer.label,
+            interval=ADAPTIVE_INTERVAL, dry_run=DRY_RUN)
+    else:
+        run_processes = controller.submit_new_batch(dry_run=DRY_RUN)
+        for run_process_extras, run_process in run_processes.items():
+            if run_process is None:
+                print(f'{run_process_extras} --> To be run')    
+            else:
+                print(f'{run_process_extras} --> PK = {run_process.pk}')
 
     print()
@@ -1,4 +1,5 @@
 #!/usr/bin/env runaiida
+import argparse
 import json
 
 # from re import S
@@ -12,10 +13,14 @@ from aiida_common_workflows.plugins import get_entry_point_name_from_class
 from aiida_common_workflows.plugins import load_workflow_entry_point
 from aiida_submission_controller import FromGroupSubmissionController
 
+from submission_utils.daemon import SubmissionDaemon
+
 DRY_RUN = False
 MAX_CONCURRENT = 1
 PLUGIN_NAME = "quantum_espresso"
 CODE_LABEL = "qe-7.3-gf-pw@thor"
+# Time (in seconds) between two resyncs with the database, with --daemon
+DAEMON_POLL_INTERVAL = 600
 
 
 class EnergyMagnetizationSubmissionController(FromGroupSubmissionController):
@@ -104,6 +109,16 @@ class EnergyMagnetizationSubmissionController(FromGroupSubmissionController):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Submit the energy vs magnetization workflows."
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running until all workflows are done, submitting a new workflow "
+        "as soon as an active one terminates (instead of running the script in a loop).",
+    )
+    args = parser.parse_args()
 
     SET_NAME = "unaries-verification-PBE-magnetic-d-block-OFClBr-v1"
     STRUCTURES_GROUP_LABEL = f"acwf-verification/{SET_NAME}/structures"
@@ -130,11 +145,16 @@ if __name__ == "__main__":
     print("Still to run   :", controller.num_to_run)
     print()
 
-    run_processes = controller.submit_new_batch(dry_run=DRY_RUN)
-    for run_process_extras, run_process in run_processes.items():
-        if run_process is None:
-            print(f"{run_process_extras} --> To be run")
-        else:
-            print(f"{run_process_extras} --> PK = {run_process.pk}")
+    if args.daemon:
+        SubmissionDaemon(
+            controller, poll_interval=DAEMON_POLL_INTERVAL, dry_run=DRY_RUN
+        ).run()
+    else:
+        run_processes = controller.submit_new_batch(dry_run=DRY_RUN)
+        for run_process_extras, run_process in run_processes.items():
+            if run_process is None:
+                print(f"{run_process_extras} --> To be run")
+            else:
+                print(f"{run_process_extras} --> PK = {run_process.pk}")
 
     print()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Simulate a submission campaign of EOS workflows offline, to compare submission settings.
+
+The systems and their runtimes are read either from a CSV file (one line per calculation, with the columns
+`element`, `configuration`, `wallclock_seconds` and optionally `num_machines` and `failed`), or from the calculations
+of the EOS workflows of a previous campaign (`--group`, run it with `verdi run` in that case).
+Each combination of the values of `--max-concurrent`, `--order` and `--retry` is simulated `--repeat` times, and the
+averages are printed (see `submission_utils/simulator.py`).
+"""
+import argparse
+import itertools
+
+import numpy as np
+
+from submission_utils.policies import AdaptiveConcurrency
+from submission_utils.simulator import RETRY_STRATEGIES, CampaignSimulator, get_system_models_from_group, \
+    load_system_models_csv
+
+# The number of machines of the allocation, and of cores per machine
+NUM_MACHINES = 32
+CORES_PER_MACHINE = 128
+# The time (in seconds) between two submissions
+INTERVAL = 60
+# Bounds of the maximum number of concurrent workflows with --adaptive
+ADAPTIVE_MIN_CONCURRENT = 8
+ADAPTIVE_MAX_CONCURRENT = 200
+
+COLUMNS = [
+    ('makespan_hours', 'Makespan [h]', '{:.1f}'),
+    ('num_failed', 'Failed', '{:.1f}'),
+    ('num_retries', 'Retries', '{:.1f}'),
+    ('mean_occupancy', 'Occupancy', '{:.1%}'),
+    ('mean_queue_length', 'Queue', '{:.1f}'),
+    ('mean_queue_wait_hours', 'Wait [h]', '{:.2f}'),
+    ('used_core_hours', 'Used [core-h]', '{:.0f}'),
+    ('wasted_core_hours', 'Wasted [core-h]', '{:.0f}'),
+    ('idle_core_hours', 'Idle [core-h]', '{:.0f}'),
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a submission campaign of EOS workflows offline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help="A CSV file with the wallclock times of the calculations.")
+    source.add_argument(
+        '--group', help="The label of a group of EOS workflows, whose calculations provide the wallclock times, e.g. "
+        "acwf-verification/oxides-verification-PBE-v1/workflows/quantum_espresso")
+    parser.add_argument(
+        '--max-concurrent', type=int, nargs='+', default=[24],
+        help="The maximum numbers of concurrent workflows to compare (the initial value with --adaptive).")
+    parser.add_argument(
+        '--order', choices=['extras', 'cost'], nargs='+', default=['extras'], help="The submission orders to compare.")
+    parser.add_argument(
+        '--retry', choices=RETRY_STRATEGIES, nargs='+', default=['none'],
+        help="The retry strategies of the failed workflows to compare: none, the whole workflow, or only the "
+        "missing volumes.")
+    parser.add_argument('--max-retries', type=int, default=1, help="The maximum number of retries of each system.")
+    parser.add_argument(
+        '--adaptive', action='store_true', help="Adapt the maximum number of concurrent workflows to the load.")
+    parser.add_argument('--machines', type=int, default=NUM_MACHINES, help="The number of machines of the allocation.")
+    parser.add_argument('--num-volumes', type=int, default=7, help="The number of volumes of each EOS workflow.")
+    parser.add_argument('--repeat', type=int, default=10, help="The number of simulations of each combination.")
+    parser.add_argument('--seed', type=int, default=0, help="The seed of the random number generator.")
+    args = parser.parse_args()
+
+    if args.csv:
+        systems = load_system_models_csv(args.csv)
+    else:
+        systems = get_system_models_from_group(args.group)
+    if not systems:
+        parser.error("No calculations with a wallclock time found")
+
+    print(f'{len(systems)} systems, {args.machines} machines with {CORES_PER_MACHINE} cores')
+    print(f'Mean of {args.repeat} simulations for each combination')
+    print()
+    header = ['Max conc.', 'Order', 'Retry'] + [title for _, title, _ in COLUMNS]
+    widths = [max(len(title), 8) for title in header]
+    print(' | '.join(title.rjust(width) for title, width in zip(header, widths)))
+    for max_concurrent, order, retry in itertools.product(args.max_concurrent, args.order, args.retry):
+        reports = []
+        for repetition in range(args.repeat):
+            concurrency_policy = None
+            if args.adaptive:
+                concurrency_policy = AdaptiveConcurrency(
+                    initial=min(max(max_concurrent, ADAPTIVE_MIN_CONCURRENT), ADAPTIVE_MAX_CONCURRENT),
+                    min_concurrent=ADAPTIVE_MIN_CONCURRENT,
+                    max_concurrent=ADAPTIVE_MAX_CONCURRENT)
+            simulator = CampaignSimulator(
+                systems, num_machines=args.machines, max_concurrent=max_concurrent, order=order,
+                concurrency_policy=concurrency_policy, retry=retry, max_retries=args.max_retries,
+                num_volumes=args.num_volumes, interval=INTERVAL, cores_per_machine=CORES_PER_MACHINE,
+                seed=args.seed + repetition)
+            reports.append(simulator.run())
+        values = [fmt.format(np.mean([report[key] for report in reports])) for key, _, fmt in COLUMNS]
+        print(' | '.join(
+            value.rjust(width) for value, width in zip([str(max_concurrent), order, retry] + values, widths)))
@@ -0,0 +1,150 @@
+"""Adapt the maximum number of concurrent workflows of a submission controller to the load of the computer.
+
+At each iteration of `run_adaptive`, the load of the target computer is observed with `get_computer_load`
+(number of queued and running calculations, time spent in the queue, recent failures of the workflows of the
+group), and the `AdaptiveConcurrency` policy (in `policies.py`) raises or lowers the number of concurrent workflows
+within bounds, before submitting a new batch.
+
+Submission controllers get the number of concurrent workflows from the policy by inheriting from
+`AdaptiveConcurrencyMixin` (before the `aiida-submission-controller` class).
+"""
+import datetime
+import statistics
+import time
+
+from aiida import orm
+from aiida.common import timezone
+
+from .policies import ComputerLoad
+
+# Process states of the terminated processes that did not finish (a finished process can still have failed,
+# if its exit status is not zero)
+NOT_FINISHED_STATES = ['excepted', 'killed']
+
+
+def parse_job_info_date(value):
+    """Return the (timezone-aware) datetime of a date serialized in the `last_job_info` of a calculation.
+
+    Dates without timezone, as returned by most schedulers, are considered in the local timezone.
+    Return None if the value is None.
+    """
+    if value is None:
+        return None
+    date = datetime.datetime.strptime(value['date'], '%Y-%m-%dT%H:%M:%S.%f')
+    if value['timezone'] is None:
+        return timezone.make_aware(date)
+    return date.replace(tzinfo=datetime.timezone.utc)
+
+
+def get_computer_load(computer_label, group_label, window=3600):
+    """Observe the load of a computer and the recent failures of the workflows of a group.
+
+    Two queries are run: one on the calculations on the computer that are active or that were modified in the last
+    `window` seconds (projecting their scheduler state and last job info), one on the workflows of the group
+    that terminated in the same window.
+
+    :return: a `ComputerLoad`.
+    """
+    now = timezone.now()
+    since = now - datetime.timedelta(seconds=window)
+
+    query = orm.QueryBuilder()
+    query.append(orm.Computer, filters={'label': computer_label}, tag='computer')
+    query.append(
+        orm.CalcJobNode, with_computer='computer', filters={
+            'or': [
+                {'attributes.sealed': False},
+                {'attributes': {'!has_key': 'sealed'}},
+                {'mtime': {'>': since}},
+            ]
+        },
+        project=['attributes.scheduler_state', 'attributes.last_job_info']
+    )
+    num_queued_jobs = 0
+    num_running_jobs = 0
+    queue_waits = []
+    for scheduler_state, job_info in query.iterall():
+        job_info = job_info or {}
+        submission_time = parse_job_info_date(job_info.get('submission_time'))
+        dispatch_time = parse_job_info_date(job_info.get('dispatch_time'))
+        if scheduler_state in ['queued', 'queued held']:
+            num_queued_jobs += 1
+            if submission_time is not None:
+                queue_waits.append((now - submission_time).total_seconds())
+        elif scheduler_state == 'running':
+            num_running_jobs += 1
+        # Jobs that started to run in the window (they might have finished in the meantime)
+        if scheduler_state in ['running', 'done'] and submission_time is not None and dispatch_time is not None:
+            if dispatch_time > since:
+                queue_waits.append((dispatch_time - submission_time).total_seconds())
+
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': group_label}, tag='group')
+    query.append(
+        orm.ProcessNode, with_group='group', filters={'attributes.sealed': True, 'mtime': {'>': since}},
+        project=['attributes.process_state', 'attributes.exit_status']
+    )
+    num_terminated = 0
+    num_failed = 0
+    for process_state, exit_status in query.iterall():
+        num_terminated += 1
+        if process_state in NOT_FINISHED_STATES or exit_status != 0:
+            num_failed += 1
+
+    return ComputerLoad(
+        num_queued_jobs=num_queued_jobs,
+        num_running_jobs=num_running_jobs,
+        queue_wait=statistics.median(queue_waits) if queue_waits else None,
+        num_terminated=num_terminated,
+        num_failed=num_failed,
+    )
+
+
+class AdaptiveConcurrencyMixin:
+    """Mixin for submission controllers, taking the maximum number of concurrent processes from a policy.
+
+    Set the `concurrency_policy` attribute to an `AdaptiveConcurrency` instance; if it is None (the default),
+    the fixed `max_concurrent` passed to the controller is used.
+    """
+    concurrency_policy = None
+
+    @property
+    def max_concurrent(self):
+        """Value of the maximum number of concurrent processes that can be run."""
+        if self.concurrency_policy is None:
+            return super().max_concurrent
+        return self.concurrency_policy.value
+
+
+def run_adaptive(controller, computer_label, interval=600, window=3600, dry_run=False):
+    """Submit new batches in a loop, adapting the maximum number of concurrent workflows before each batch.
+
+    The loop stops when all workflows have been submitted and none of them is still active.
+
+    :param controller: a submission controller inheriting from `AdaptiveConcurrencyMixin`, with its
+        `concurrency_policy` set.
+    :param computer_label: the label of the computer where the calculations run.
+    :param interval: the time (in seconds) between two iterations.
+    :param window: the observation window (in seconds) of `get_computer_load`.
+    """
+    while True:
+        load = get_computer_load(computer_label, controller.group_label, window=window)
+        num_active = controller.num_active_slots
+        value, reason = controller.concurrency_policy.update(load, num_active)
+        queue_wait = 'n/a' if load.queue_wait is None else f'{load.queue_wait:.0f} s'
+        print(
+            f'[{timezone.now():%Y-%m-%d %H:%M:%S}] active={num_active} queued={load.num_queued_jobs} '
+            f'running={load.num_running_jobs} queue_wait={queue_wait} '
+            f'failed={load.num_failed}/{load.num_terminated} -> max_concurrent={value} ({reason})'
+        )
+
+        run_processes = controller.submit_new_batch(dry_run=dry_run)
+        for run_process_extras, run_process in run_processes.items():
+            if run_process is None:
+                print(f'{run_process_extras} --> To be run')
+            else:
+                print(f'{run_process_extras} --> PK = {run_process.pk}')
+
+        if dry_run or (controller.num_to_run == 0 and controller.num_active_slots == 0):
+            break
+        time.sleep(interval)
@@ -0,0 +1,145 @@
+"""Estimate the cost of the EOS workflows, and submit the most expensive ones first to reduce the campaign makespan.
+
+The cost of a system is estimated by `CostModel` from its structure: for plane-wave DFT, the cost of an SCF cycle
+scales roughly as the number of k-points, times the number of plane waves (proportional to the cell volume and to
+``ecutwfc**1.5``), times the square of the number of electrons. The configuration (unary or oxide, prototype) enters
+through the number of atoms and the cell of the structure. The estimate is only meant to rank the systems, so
+all constant prefactors are dropped.
+
+Submission controllers inheriting from `CostAwareOrderingMixin` (before the `aiida-submission-controller` class)
+submit the workflows in order of decreasing cost (the *longest processing time first* rule, that keeps the cheap
+systems for the end of the campaign so that the last slots free up at about the same time), but limit the fraction of
+slots taken by the most expensive systems, so that each batch mixes expensive and cheap systems
+(see `select_by_cost` in `policies.py`).
+"""
+import numpy as np
+from ase.data import atomic_numbers
+
+from aiida import orm
+
+from .policies import HEAVY_QUANTILE, MAX_HEAVY_FRACTION, select_by_cost
+from .submit import submit_processes
+
+# Default k-point distance (in 1/angstrom, including the 2*pi factor, as in `KpointsData.set_kpoints_mesh_from_density`)
+DEFAULT_KPOINTS_DISTANCE = 0.06
+# Default wavefunction cutoff (in Ry), used for the elements not in the `ecutwfc` table of the `CostModel`
+DEFAULT_ECUTWFC = 50.
+
+
+def get_kpoints_mesh(cell, kpoints_distance):
+    """Return the k-point mesh of a cell for a given k-point distance, as `KpointsData.set_kpoints_mesh_from_density`."""
+    reciprocal_cell = 2. * np.pi * np.linalg.inv(np.array(cell)).T
+    return [
+        max(1, int(np.ceil(round(np.linalg.norm(vector) / kpoints_distance, 5))))
+        for vector in reciprocal_cell
+    ]
+
+
+class CostModel:
+    """Model of the (relative) cost of the EOS workflow of a structure.
+
+    :param kpoints_distance: the k-point distance of the protocol, used to compute the k-point mesh.
+    :param ecutwfc: a dictionary {element: wavefunction cutoff in Ry}, e.g. the recommended cutoffs of the
+        pseudopotentials of the protocol (the largest cutoff among the elements of a structure is used).
+    :param valence_electrons: a dictionary {element: number of valence electrons}, e.g. from the pseudopotentials;
+        for elements not in the dictionary, the atomic number is used (an upper bound).
+    """
+
+    def __init__(self, kpoints_distance=DEFAULT_KPOINTS_DISTANCE, ecutwfc=None, valence_electrons=None):
+        self.kpoints_distance = kpoints_distance
+        self.ecutwfc = ecutwfc or {}
+        self.valence_electrons = valence_electrons or {}
+
+    def get_num_kpoints(self, cell):
+        """Return the number of k-points of the mesh of a cell (before any symmetry reduction)."""
+        return int(np.prod(get_kpoints_mesh(cell, self.kpoints_distance)))
+
+    def get_cost(self, cell, symbols):
+        """Return the estimated cost of a structure, given its cell (3x3) and the list of the symbols of its atoms."""
+        volume = abs(np.linalg.det(np.array(cell)))
+        ecutwfc = max(self.ecutwfc.get(symbol, DEFAULT_ECUTWFC) for symbol in symbols)
+        num_electrons = sum(self.valence_electrons.get(symbol, atomic_numbers[symbol]) for symbol in symbols)
+        return self.get_num_kpoints(cell) * volume * ecutwfc**1.5 * num_electrons**2
+
+
+def get_structure_costs(parent_group_label, extra_keys, cost_model):
+    """Return the estimated costs of all structures of a group, as a dictionary {extras tuple: cost}.
+
+    The cell and the sites of all structures are projected with a single query, without loading the nodes.
+
+    :param extra_keys: the keys of the extras that identify the structures (see ``get_extra_unique_keys``).
+    """
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': parent_group_label}, tag='group')
+    query.append(
+        orm.StructureData, with_group='group',
+        project=[f'extras.{key}' for key in extra_keys] + ['attributes.cell', 'attributes.kinds', 'attributes.sites'])
+    costs = {}
+    for result in query.iterall():
+        extras_values = tuple(result[:len(extra_keys)])
+        cell, kinds, sites = result[len(extra_keys):]
+        kind_symbols = {}
+        for kind in kinds:
+            if len(kind['symbols']) != 1:
+                raise ValueError(f'Alloys and vacancies are not supported (structure with extras {extras_values})')
+            kind_symbols[kind['name']] = kind['symbols'][0]
+        costs[extras_values] = cost_model.get_cost(cell, [kind_symbols[site['kind_name']] for site in sites])
+    return costs
+
+
+class CostAwareOrderingMixin:
+    """Mixin for submission controllers submitting from a parent group, ordering the submissions by cost.
+
+    Set the `cost_model` attribute to a `CostModel` instance to enable it; if it is None (the default),
+    the processes are submitted in the order of their extras, as usual.
+    The systems whose cost is above the `heavy_quantile` of the costs of all systems of the parent group are
+    considered heavy, and can take at most a fraction `max_heavy_fraction` of the slots.
+    """
+    cost_model = None
+    heavy_quantile = HEAVY_QUANTILE
+    max_heavy_fraction = MAX_HEAVY_FRACTION
+
+    _costs = None
+
+    def get_costs(self):
+        """Return the estimated costs of all systems of the parent group (computed at the first call)."""
+        if self._costs is None:
+            self._costs = get_structure_costs(self.parent_group_label, self.get_extra_unique_keys(), self.cost_model)
+        return self._costs
+
+    def get_active_extras(self):
+        """Return the set of the extras tuples of the active processes of the group."""
+        query = self.get_query(process_projections=self.get_process_extra_projections(), only_active=True)
+        return {tuple(extras) for extras in query.all()}
+
+    def select_extras_to_submit(self, extras_to_run, active_extras, num_slots):
+        """Return the list of the extras tuples to submit in the next batch, among those still to run.
+
+        With a cost model, the most expensive processes are selected first (see `select_by_cost`); otherwise,
+        they are selected in the order of their extras.
+        """
+        if self.cost_model is None:
+            return sorted(extras_to_run)[:num_slots]
+
+        costs = self.get_costs()
+        return select_by_cost(
+            extras_to_run, costs,
+            num_slots=num_slots,
+            active_extras=active_extras,
+            heavy_threshold=float(np.quantile(list(costs.values()), self.heavy_quantile)),
+            max_heavy=max(1, int(self.max_heavy_fraction * self.max_concurrent)),
+        )
+
+    def submit_new_batch(self, dry_run=False, sort=True):
+        """Submit a new batch of calculations, ensuring less than self.max_concurrent active at the same time.
+
+        With a cost model, the most expensive processes are submitted first (see `select_by_cost`).
+        """
+        if self.cost_model is None:
+            return super().submit_new_batch(dry_run=dry_run, sort=sort)
+
+        extras_to_run = set(self.get_all_extras_to_submit()).difference(self._check_submitted_extras())
+        active_extras = self.get_active_extras()
+        to_submit = self.select_extras_to_submit(
+            extras_to_run, active_extras, num_slots=max(0, self.max_concurrent - len(active_extras)))
+        return submit_processes(self, to_submit, dry_run=dry_run)
@@ -0,0 +1,146 @@
+"""Keep a submission controller running, submitting a new process as soon as an active one terminates.
+
+Instead of running the launch script in a loop (each run loading the profile and the code, and querying the group
+to find the processes already submitted), `SubmissionDaemon` keeps a single session open:
+
+- at start, it builds an in-memory index of the submitted extras tuples, of the active processes of the group and of
+  the extras still to run, with one query each;
+- it subscribes to the broadcasts of the AiiDA processes reaching a terminal state (finished, excepted, killed), as
+  the AiiDA engine does to wait for a process, and as soon as one of the active processes terminates, it submits new
+  processes to fill the free slots;
+- as a fall-back in case some broadcasts are missed (or the communicator is not available), every `poll_interval`
+  seconds it rebuilds the index from the database.
+
+The processes are submitted with `submit_processes`, in the order of the extras or, for controllers inheriting from
+`CostAwareOrderingMixin`, with their `select_extras_to_submit`. The daemon stops when all processes have been
+submitted and none of them is still active.
+"""
+import queue
+import threading
+import time
+
+from aiida.common import timezone
+from aiida.engine import ProcessState
+
+from .cost import CostAwareOrderingMixin
+from .submit import submit_processes
+
+# The process states that are broadcast when a process terminates
+TERMINAL_STATES = [ProcessState.FINISHED, ProcessState.EXCEPTED, ProcessState.KILLED]
+
+
+class SubmissionDaemon:
+    """Submit the processes of a submission controller as soon as slots free up, in a single long-running session.
+
+    :param controller: a submission controller (e.g. a `FromGroupSubmissionController`); the set of extras to submit
+        (``get_all_extras_to_submit``) is only refreshed at each resync.
+    :param poll_interval: the time (in seconds) between two resyncs of the index with the database.
+    """
+
+    def __init__(self, controller, poll_interval=600, dry_run=False):
+        self.controller = controller
+        self.poll_interval = poll_interval
+        self.dry_run = dry_run
+        self.submitted = set()
+        self.active = {}
+        self.to_run = set()
+        self._terminated = queue.SimpleQueue()
+        self._wakeup = threading.Event()
+        self._last_resync = None
+
+    def resync(self):
+        """Rebuild the in-memory index of the submitted, active and still to run extras from the database."""
+        self._last_resync = time.monotonic()
+        controller = self.controller
+        num_keys = len(controller.get_extra_unique_keys())
+        self.submitted = set(controller._check_submitted_extras())  # pylint: disable=protected-access
+        query = controller.get_query(
+            process_projections=controller.get_process_extra_projections() + ['id'], only_active=True)
+        self.active = {result[num_keys]: tuple(result[:num_keys]) for result in query.all()}
+        self.to_run = set(controller.get_all_extras_to_submit()).difference(self.submitted)
+
+    def on_terminated(self, communicator, body, sender=None, subject=None, correlation_id=None):
+        """Broadcast subscriber, called (in the thread of the communicator) when a process terminates.
+
+        Only the PK is recorded, and the main loop is woken up: the index is only changed by the main loop.
+        """
+        # pylint: disable=unused-argument
+        if sender in self.active:
+            self._terminated.put(sender)
+            self._wakeup.set()
+
+    def subscribe(self):
+        """Subscribe to the broadcasts of the processes reaching a terminal state.
+
+        :return: the identifier of the subscriber, or None if the communicator is not available (in which case only
+            the periodic resync is used).
+        """
+        import kiwipy  # pylint: disable=import-outside-toplevel
+        from aiida.manage.manager import get_manager  # pylint: disable=import-outside-toplevel
+
+        broadcast_filter = kiwipy.BroadcastFilter(self.on_terminated)
+        for state in TERMINAL_STATES:
+            broadcast_filter.add_subject_filter(f'state_changed.*.{state.value}')
+        try:
+            return get_manager().get_communicator().add_broadcast_subscriber(broadcast_filter)
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f'Could not subscribe to the process broadcasts ({exc}), polling every {self.poll_interval} s')
+            return None
+
+    def unsubscribe(self, identifier):
+        from aiida.manage.manager import get_manager  # pylint: disable=import-outside-toplevel
+
+        if identifier is not None:
+            get_manager().get_communicator().remove_broadcast_subscriber(identifier)
+
+    def fill_slots(self):
+        """Submit new processes up to the maximum number of concurrent processes, and add them to the index."""
+        num_slots = max(0, self.controller.max_concurrent - len(self.active))
+        if not num_slots or not self.to_run:
+            return {}
+        if isinstance(self.controller, CostAwareOrderingMixin):
+            to_submit = self.controller.select_extras_to_submit(self.to_run, set(self.active.values()), num_slots)
+        else:
+            to_submit = sorted(self.to_run)[:num_slots]
+
+        submitted = submit_processes(self.controller, to_submit, dry_run=self.dry_run)
+        for extras, node in submitted.items():
+            if node is None:
+                print(f'{extras} --> To be run')
+            else:
+                print(f'{extras} --> PK = {node.pk}')
+                self.active[node.pk] = extras
+                self.submitted.add(extras)
+                self.to_run.discard(extras)
+        return submitted
+
+    def print_status(self, message):
+        print(
+            f'[{timezone.now():%Y-%m-%d %H:%M:%S}] {message}: active={len(self.active)} '
+            f'to_run={len(self.to_run)} max_concurrent={self.controller.max_concurrent}')
+
+    def run(self):
+        """Run until all processes have been submitted and terminated (or only submit one batch, with `dry_run`)."""
+        identifier = None if self.dry_run else self.subscribe()
+        try:
+            # The index is built after subscribing, not to miss the processes terminating in between
+            self.resync()
+            self.print_status('Started')
+            self.fill_slots()
+            while not self.dry_run and (self.active or self.to_run):
+                timeout = max(0., self._last_resync + self.poll_interval - time.monotonic())
+                if self._wakeup.wait(timeout=timeout):
+                    self._wakeup.clear()
+                    while not self._terminated.empty():
+                        extras = self.active.pop(self._terminated.get(), None)
+                        if extras is not None:
+                            print(f'{extras} --> terminated')
+                    self.print_status('Process terminated')
+                # Resync every `poll_interval`, also when broadcasts keep arriving more often than that
+                if time.monotonic() - self._last_resync >= self.poll_interval:
+                    self.resync()
+                    self.print_status('Resync')
+                self.fill_slots()
+        finally:
+            self.unsubscribe(identifier)
+        self.print_status('Done')
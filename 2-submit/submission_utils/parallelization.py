@@ -0,0 +1,102 @@
+"""Choose the resources and the parallelization of each calculation from the size of its system.
+
+Instead of the same resources and flags for all systems (e.g. one machine and 32 k-point pools), `Parallelization`
+chooses them per structure, from the number of atoms and the k-point mesh generated by the protocol:
+
+- the number of machines grows with the number of atoms (`atoms_per_machine`), up to `max_machines`;
+- the MPI processes (all cores of the machines) are split in k-point pools. Each pool gets about one process every
+  `atoms_per_process` atoms (rounded up to a power of two), and there are never more pools than (an estimate
+  of) the irreducible k-points, so that no pool is left without k-points;
+- if the pools are larger than `max_procs_per_band_group` processes, they are split in band groups.
+
+The values can be overridden for single systems or elements with a table, see `Parallelization.get_parallelization`.
+"""
+import math
+
+import numpy as np
+
+from .cost import get_kpoints_mesh
+
+# The largest number of symmetry operations of a crystal: the number of irreducible k-points is at least the number
+# of k-points of the mesh divided by this
+MAX_NUM_SYMMETRIES = 48
+
+
+def get_largest_divisor(value, max_divisor):
+    """Return the largest divisor of `value` that is not larger than `max_divisor` (at least 1)."""
+    for divisor in range(min(value, max(1, max_divisor)), 0, -1):
+        if value % divisor == 0:
+            return divisor
+    return 1
+
+
+class Parallelization:
+    """Policy to choose the resources and the parallelization of a calculation from its structure.
+
+    :param kpoints_distance: the k-point distance of the protocol, used to compute the k-point mesh.
+    :param cores_per_machine: the number of cores (MPI processes) per machine.
+    :param max_machines: the maximum number of machines of a calculation.
+    :param atoms_per_machine: one more machine is requested every this number of atoms.
+    :param atoms_per_process: the number of atoms per MPI process within a k-point pool.
+    :param max_procs_per_band_group: pools with more processes than this are split in band groups.
+    :param overrides: a dictionary of values that override those computed, with keys that are either a tuple of
+        extras (e.g. ``('Ce', 'X2O3')``) or an element (e.g. ``'Ce'``, for all its configurations), and values that
+        are dictionaries with any of the keys returned by `get_parallelization`.
+    """
+
+    def __init__(
+            self, kpoints_distance, cores_per_machine, max_machines=1, atoms_per_machine=8, atoms_per_process=2,
+            max_procs_per_band_group=64, overrides=None):
+        self.kpoints_distance = kpoints_distance
+        self.cores_per_machine = cores_per_machine
+        self.max_machines = max_machines
+        self.atoms_per_machine = atoms_per_machine
+        self.atoms_per_process = atoms_per_process
+        self.max_procs_per_band_group = max_procs_per_band_group
+        self.overrides = overrides or {}
+
+    def get_parallelization(self, cell, num_atoms, extras_values=None):
+        """Return the resources and parallelization of the calculation of a structure.
+
+        :param cell: the cell of the structure (3x3).
+        :param num_atoms: the number of atoms of the structure.
+        :param extras_values: the tuple of extras identifying the system (e.g. ``('Ce', 'X2O3')``); the first one is
+            used as the element to look for overrides. Values in the `overrides` for the system take precedence over
+            those for the element.
+        :return: a dictionary with the `num_machines`, `num_mpiprocs_per_machine`, `npool` and `nband`.
+        """
+        num_machines = min(self.max_machines, max(1, math.ceil(num_atoms / self.atoms_per_machine)))
+        num_procs = num_machines * self.cores_per_machine
+
+        procs_per_pool = 2**math.ceil(math.log2(max(1, num_atoms / self.atoms_per_process)))
+        procs_per_pool = min(procs_per_pool, self.cores_per_machine)
+        num_kpoints = int(np.prod(get_kpoints_mesh(cell, self.kpoints_distance)))
+        num_irreducible_kpoints = max(1, num_kpoints // MAX_NUM_SYMMETRIES)
+        npool = get_largest_divisor(num_procs, min(num_procs // procs_per_pool, num_irreducible_kpoints))
+
+        procs_per_pool = num_procs // npool
+        nband = 1
+        if procs_per_pool > self.max_procs_per_band_group:
+            nband = procs_per_pool // get_largest_divisor(procs_per_pool, self.max_procs_per_band_group)
+
+        parallelization = {
+            'num_machines': num_machines,
+            'num_mpiprocs_per_machine': self.cores_per_machine,
+            'npool': npool,
+            'nband': nband,
+        }
+        if extras_values is not None:
+            parallelization.update(self.overrides.get(extras_values[0], {}))
+            parallelization.update(self.overrides.get(tuple(extras_values), {}))
+        return parallelization
+
+
+def get_qe_cmdline(parallelization):
+    """Return the command-line flags of pw.x (e.g. ``['-nk', '16']``) for a parallelization.
+
+    The number of band groups is only passed if larger than one.
+    """
+    cmdline = ['-nk', str(parallelization['npool'])]
+    if parallelization['nband'] > 1:
+        cmdline += ['-nb', str(parallelization['nband'])]
+    return cmdline
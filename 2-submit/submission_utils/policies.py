@@ -0,0 +1,120 @@
+"""The submission policies of the controllers, without AiiDA dependencies.
+
+They are used both by the submission controllers and by the offline simulator of the campaigns (`simulator.py`),
+that must run without AiiDA:
+
+- `AdaptiveConcurrency` chooses the maximum number of concurrent workflows from the `ComputerLoad` of the computer
+  (see `adaptive.py` for its observation and the controllers using it);
+- `select_by_cost` chooses the workflows of the next batch from their estimated costs, limiting the number of heavy
+  ones (see `cost.py` for the cost model and the controllers using it).
+"""
+from collections import namedtuple
+
+# The systems whose cost is above this quantile of the costs of all systems are considered heavy, and can take at most
+# this fraction of the slots (see `select_by_cost`)
+HEAVY_QUANTILE = 0.8
+MAX_HEAVY_FRACTION = 0.5
+
+ComputerLoad = namedtuple(
+    'ComputerLoad', ['num_queued_jobs', 'num_running_jobs', 'queue_wait', 'num_terminated', 'num_failed'])
+ComputerLoad.__doc__ = """The load of a computer, as returned by `adaptive.get_computer_load`.
+
+- `num_queued_jobs`, `num_running_jobs`: the number of active calculations on the computer that are queued
+  or running in the scheduler;
+- `queue_wait`: the median time (in seconds) spent in the queue by the calculations that are queued, or that started
+  to run in the observation window (None if there are none);
+- `num_terminated`, `num_failed`: the number of workflows of the group that terminated in the observation window,
+  and how many of them failed.
+"""
+
+
+def select_by_cost(extras_to_run, costs, num_slots, active_extras=(), heavy_threshold=None, max_heavy=None):
+    """Select the processes to submit in the next batch, in order of decreasing cost.
+
+    :param extras_to_run: the extras tuples of the processes still to submit.
+    :param costs: a dictionary {extras tuple: cost}, with (at least) all processes to run and active.
+    :param num_slots: the number of processes to select (at most).
+    :param active_extras: the extras tuples of the processes that are currently active.
+    :param heavy_threshold: the processes with a cost larger than this are considered heavy.
+    :param max_heavy: the maximum number of heavy processes that can be active at the same time (including those
+        already active); if None, there is no limit. The heavy processes above the limit are skipped (they will be
+        submitted in a following batch), and cheaper processes are selected instead.
+    :return: the list of the selected extras tuples.
+    """
+    num_heavy = 0
+    if heavy_threshold is not None:
+        num_heavy = sum(1 for extras in active_extras if costs[extras] > heavy_threshold)
+
+    selected = []
+    # Sort by decreasing cost, and then by extras to make the order reproducible
+    for extras in sorted(extras_to_run, key=lambda extras: (-costs[extras], extras)):
+        if len(selected) >= num_slots:
+            break
+        if heavy_threshold is not None and costs[extras] > heavy_threshold:
+            if max_heavy is not None and num_heavy >= max_heavy:
+                continue
+            num_heavy += 1
+        selected.append(extras)
+    return selected
+
+
+class AdaptiveConcurrency:
+    """Policy that raises or lowers the maximum number of concurrent workflows, within bounds.
+
+    At each call of `update`, in order of priority:
+
+    - if at least `min_terminated` workflows terminated in the observation window, and the fraction of them that
+      failed is larger than `max_failure_rate`, the value is multiplied by `backoff` (something is wrong:
+      better to submit less while the failures are investigated);
+    - if the calculations wait in the queue more than `high_queue_wait` seconds, the value is lowered by `step`
+      (more submissions would only wait in the queue);
+    - if `max_running_jobs` is set and at least as many calculations are running, the value is kept
+      (the allocation is saturated);
+    - if all slots are in use and the calculations wait in the queue less than `low_queue_wait` seconds,
+      the value is raised by `step` (the computer can take more work).
+
+    Otherwise, the value is kept.
+    """
+
+    def __init__(
+            self, initial, min_concurrent, max_concurrent, step=4, low_queue_wait=600, high_queue_wait=3600,
+            max_failure_rate=0.2, min_terminated=5, backoff=0.5, max_running_jobs=None):
+        if not min_concurrent <= initial <= max_concurrent:
+            raise ValueError(
+                f'The initial value ({initial}) must be between min_concurrent ({min_concurrent}) '
+                f'and max_concurrent ({max_concurrent})')
+        if low_queue_wait > high_queue_wait:
+            raise ValueError('low_queue_wait must not be larger than high_queue_wait')
+        self.value = initial
+        self.min_concurrent = min_concurrent
+        self.max_concurrent = max_concurrent
+        self.step = step
+        self.low_queue_wait = low_queue_wait
+        self.high_queue_wait = high_queue_wait
+        self.max_failure_rate = max_failure_rate
+        self.min_terminated = min_terminated
+        self.backoff = backoff
+        self.max_running_jobs = max_running_jobs
+
+    def _clip(self, value):
+        return max(self.min_concurrent, min(self.max_concurrent, value))
+
+    def update(self, load, num_active):
+        """Update the value from the load of the computer (a `ComputerLoad`) and the number of active workflows.
+
+        :return: a tuple (value, reason), with the new value and a string describing why it was chosen.
+        """
+        if load.num_terminated >= self.min_terminated and load.num_failed > self.max_failure_rate * load.num_terminated:
+            self.value = self._clip(int(self.value * self.backoff))
+            reason = f'{load.num_failed}/{load.num_terminated} recent workflows failed'
+        elif load.queue_wait is not None and load.queue_wait > self.high_queue_wait:
+            self.value = self._clip(self.value - self.step)
+            reason = f'long queue wait ({load.queue_wait:.0f} s)'
+        elif self.max_running_jobs is not None and load.num_running_jobs >= self.max_running_jobs:
+            reason = f'{load.num_running_jobs} calculations running, the allocation is saturated'
+        elif num_active >= self.value and (load.queue_wait is None or load.queue_wait < self.low_queue_wait):
+            self.value = self._clip(self.value + self.step)
+            reason = 'all slots in use and short queue wait'
+        else:
+            reason = 'no change needed'
+        return self.value, reason
@@ -0,0 +1,372 @@
+"""Simulate a submission campaign against a local stand-in scheduler, to tune the submission offline.
+
+The campaign is replayed with an event-driven simulation:
+
+- the systems are described by a `SystemModel`: samples of the wallclock time of their calculations, the number of
+  machines of each calculation, and the probability that a calculation fails. These can be read from a CSV file
+  (`load_system_models_csv`) or from the calculations of the EOS workflows of a group (`get_system_models_from_group`);
+- each EOS workflow runs one calculation per volume: first the first volume, then all others in parallel (as
+  `EquationOfStateWorkChain` does). The wallclock time of each calculation is drawn from the samples of its system;
+  a calculation that fails stops after a random fraction of its wallclock time, and its EOS workflow fails;
+- the calculations run on a `StandInScheduler`, with a fixed number of machines (a dedicated allocation);
+- every `interval` seconds, the controller submits new EOS workflows up to `max_concurrent` active ones, with the same
+  ordering (`select_by_cost`) and adaptive concurrency (`AdaptiveConcurrency`) policies of the submission controllers;
+- failed workflows can be retried, either as a whole (`retry='workflow'`, as when they are removed from the group and
+  submitted again) or only for their failed volumes (`retry='volumes'`, as with `--missing-volumes`).
+
+`CampaignSimulator.run` returns the makespan, the occupancy of the machines and of the queue, and the core-hours
+used, wasted (by failed calculations, and by the volumes recomputed when retrying whole workflows) and left idle.
+"""
+import csv
+import heapq
+import statistics
+from collections import namedtuple
+
+import numpy as np
+
+from .policies import HEAVY_QUANTILE, MAX_HEAVY_FRACTION, ComputerLoad, select_by_cost
+
+SystemModel = namedtuple('SystemModel', ['runtimes', 'num_machines', 'failure_rate'])
+SystemModel.__doc__ = """The model of the calculations of a system: `runtimes` is a list of samples of their wallclock time
+(in seconds), `num_machines` is the number of machines of each calculation, `failure_rate` the probability that
+a calculation fails."""
+
+# The columns of the CSV files read by `load_system_models_csv`; `num_machines` and `failed` are optional
+CSV_COLUMNS = ['element', 'configuration', 'wallclock_seconds', 'num_machines', 'failed']
+RETRY_STRATEGIES = ['none', 'workflow', 'volumes']
+
+
+def get_system_models(rows):
+    """Build the system models from rows of calculation data.
+
+    :param rows: an iterable of tuples ``(element, configuration, wallclock_seconds, num_machines, failed)``, one
+        for each calculation; `num_machines` can be None (1 machine) and `failed` None (not failed).
+    :return: a dictionary {(element, configuration): `SystemModel`}. The runtime samples are the wallclock times of
+        the calculations that did not fail (or of all of them, if all failed), the number of machines is the largest
+        one, the failure rate the fraction of failed calculations.
+    """
+    calculations = {}
+    for element, configuration, wallclock, num_machines, failed in rows:
+        calculations.setdefault((element, configuration), []).append(
+            (float(wallclock), int(num_machines or 1), bool(failed)))
+
+    models = {}
+    for system, system_calculations in sorted(calculations.items()):
+        runtimes = [wallclock for wallclock, _, failed in system_calculations if not failed]
+        if not runtimes:
+            runtimes = [wallclock for wallclock, _, _ in system_calculations]
+        num_failed = sum(1 for _, _, failed in system_calculations if failed)
+        models[system] = SystemModel(
+            runtimes=runtimes,
+            num_machines=max(num_machines for _, num_machines, _ in system_calculations),
+            failure_rate=num_failed / len(system_calculations),
+        )
+    return models
+
+
+def load_system_models_csv(fname):
+    """Load the system models from a CSV file with one line per calculation (see `CSV_COLUMNS`).
+
+    Lines with an empty wallclock time (calculations that never ran) are skipped.
+    """
+    with open(fname, newline='') as fhandle:
+        reader = csv.DictReader(fhandle)
+        missing_columns = set(CSV_COLUMNS[:3]) - set(reader.fieldnames or [])
+        if missing_columns:
+            raise ValueError(f"Missing columns {sorted(missing_columns)} in the CSV file '{fname}'")
+        rows = [(
+            row['element'], row['configuration'], row['wallclock_seconds'],
+            row.get('num_machines') or None, int(row.get('failed') or 0)
+        ) for row in reader if row['wallclock_seconds']]
+    return get_system_models(rows)
+
+
+def get_system_models_from_group(workflows_group_label):
+    """Get the system models from the calculations of the EOS workflows of a group.
+
+    The calculations are found following the CALL links from the EOS workflows, with `get_eos_calcjobs` of
+    `eos_utils/calcjobs.py` (a link to the folder of `3-analyze`, where `get_telemetry.py` also uses it). The wallclock
+    time is taken from the last job info of each calculation, and the calculations that did not finish with a zero
+    exit status are counted as failed. Calculations without wallclock time are skipped.
+
+    This is the only function of the module that needs AiiDA, which is imported here, so that the simulator can run
+    without it from a CSV file.
+    """
+    from eos_utils.calcjobs import get_eos_calcjobs  # pylint: disable=import-outside-toplevel
+
+    relax_workflows, calcjobs = get_eos_calcjobs(workflows_group_label, projections=[
+        'attributes.last_job_info.wallclock_time_seconds', 'attributes.resources.num_machines',
+        'attributes.process_state', 'attributes.exit_status'
+    ])
+    rows = [(
+        relax_workflows[relax_pk]['element'], relax_workflows[relax_pk]['configuration'], wallclock, num_machines,
+        not (process_state == 'finished' and exit_status == 0)
+    ) for relax_pk, _, wallclock, num_machines, process_state, exit_status in calcjobs if wallclock is not None]
+    return get_system_models(rows)
+
+
+class StandInScheduler:
+    """A scheduler for a fixed number of machines, starting the queued jobs in order as soon as they fit.
+
+    Jobs that do not fit in the free machines do not block the following ones (first-fit backfilling).
+    The scheduler also integrates over time the number of busy machines and of queued jobs.
+    """
+
+    def __init__(self, num_machines):
+        self.num_machines = num_machines
+        self.free_machines = num_machines
+        self.queue = []
+        self.running = set()
+        self.last_time = 0.
+        self.busy_machine_seconds = 0.
+        self.queued_job_seconds = 0.
+        self.max_queue_length = 0
+
+    def advance(self, time):
+        """Advance the clock to `time`, integrating the occupancy since the last call."""
+        elapsed = time - self.last_time
+        self.busy_machine_seconds += elapsed * (self.num_machines - self.free_machines)
+        self.queued_job_seconds += elapsed * len(self.queue)
+        self.last_time = time
+
+    def submit(self, job, time):
+        """Add a job (with a `num_machines` attribute) to the queue."""
+        if job.num_machines > self.num_machines:
+            raise ValueError(f'A job needs {job.num_machines} machines, but only {self.num_machines} are available')
+        job.submit_time = time
+        self.queue.append(job)
+        self.max_queue_length = max(self.max_queue_length, len(self.queue))
+
+    def finish(self, job):
+        """Release the machines of a running job."""
+        self.running.remove(job)
+        self.free_machines += job.num_machines
+
+    def start_jobs(self, time):
+        """Start the queued jobs that fit in the free machines, in order, and return them."""
+        started = []
+        for job in list(self.queue):
+            if job.num_machines <= self.free_machines:
+                self.queue.remove(job)
+                self.running.add(job)
+                self.free_machines -= job.num_machines
+                job.start_time = time
+                started.append(job)
+        return started
+
+
+class Job:
+    """A calculation of one volume of an EOS workflow, as seen by the `StandInScheduler`."""
+
+    def __init__(self, workflow, volume_index, num_machines, runtime, fails):
+        self.workflow = workflow
+        self.volume_index = volume_index
+        self.num_machines = num_machines
+        self.runtime = runtime
+        self.fails = fails
+        self.submit_time = None
+        self.start_time = None
+
+
+class Workflow:
+    """An EOS workflow (or, when retrying the failed volumes, a set of relax workflows) of a system."""
+
+    def __init__(self, system, volume_indices):
+        self.system = system
+        self.volume_indices = sorted(volume_indices)
+        self.pending = list(self.volume_indices)
+        self.num_running = 0
+        self.failed_volumes = []
+        self.completed_volumes = []
+
+
+class CampaignSimulator:
+    """Replay a submission campaign of EOS workflows against a `StandInScheduler`.
+
+    :param systems: a dictionary {(element, configuration): `SystemModel`}, with the systems of the campaign.
+    :param num_machines: the number of machines of the scheduler.
+    :param max_concurrent: the maximum number of active workflows (the initial value, with a `concurrency_policy`).
+    :param order: 'extras' to submit the systems in order of their extras, or 'cost' to submit the most expensive
+        first (the cost being the mean core-seconds of a calculation), with the limits on the expensive systems of
+        `CostAwareOrderingMixin` (`HEAVY_QUANTILE` and `MAX_HEAVY_FRACTION`).
+    :param concurrency_policy: an optional `AdaptiveConcurrency` instance, updated at each submission.
+    :param retry: the retry strategy of failed workflows, one of `RETRY_STRATEGIES`.
+    :param max_retries: the maximum number of retries of each system.
+    :param num_volumes: the number of volumes of each EOS workflow.
+    :param interval: the time (in seconds) between two submissions.
+    :param window: the observation window (in seconds) of the load for the `concurrency_policy`.
+    :param cores_per_machine: the number of cores per machine, to convert machine-hours to core-hours.
+    :param seed: the seed of the random number generator.
+    """
+
+    def __init__(
+            self, systems, num_machines, max_concurrent, order='extras', concurrency_policy=None, retry='none',
+            max_retries=1, num_volumes=7, interval=60, window=3600, cores_per_machine=1, seed=0):
+        if retry not in RETRY_STRATEGIES:
+            raise ValueError(f"Unknown retry strategy '{retry}', valid ones are {RETRY_STRATEGIES}")
+        self.systems = systems
+        self.scheduler = StandInScheduler(num_machines)
+        self.max_concurrent = max_concurrent
+        self.order = order
+        self.concurrency_policy = concurrency_policy
+        self.retry = retry
+        self.max_retries = max_retries
+        self.num_volumes = num_volumes
+        self.interval = interval
+        self.window = window
+        self.cores_per_machine = cores_per_machine
+        self.rng = np.random.default_rng(seed)
+
+        self.costs = {
+            system: float(np.mean(model.runtimes)) * model.num_machines for system, model in systems.items()
+        }
+        self.time = 0.
+        self.events = []
+        self.to_submit = set(systems)
+        self.to_retry = []
+        self.active = []
+        self.num_retries = {system: 0 for system in systems}
+        self.succeeded = set()
+        self.failed = set()
+        # (time, queue wait) of the started jobs, and (time, failed) of the terminated workflows
+        self.queue_waits = []
+        self.terminated_workflows = []
+        self.used_machine_seconds = 0.
+        self.wasted_machine_seconds = 0.
+        self.completed_machine_seconds = {system: 0. for system in systems}
+
+    def get_load(self):
+        """Return the current load of the scheduler, as `get_computer_load` observes it on a real computer."""
+        since = self.time - self.window
+        queue_waits = [self.time - job.submit_time for job in self.scheduler.queue]
+        queue_waits += [wait for start_time, wait in self.queue_waits if start_time > since]
+        terminated = [failed for end_time, failed in self.terminated_workflows if end_time > since]
+        return ComputerLoad(
+            num_queued_jobs=len(self.scheduler.queue),
+            num_running_jobs=len(self.scheduler.running),
+            queue_wait=statistics.median(queue_waits) if queue_waits else None,
+            num_terminated=len(terminated),
+            num_failed=sum(terminated),
+        )
+
+    def submit_batch(self):
+        """Submit new workflows (the retries first) up to the maximum number of active workflows."""
+        max_concurrent = self.max_concurrent
+        if self.concurrency_policy is not None:
+            max_concurrent, _ = self.concurrency_policy.update(self.get_load(), len(self.active))
+        num_slots = max(0, max_concurrent - len(self.active))
+
+        while self.to_retry and num_slots > 0:
+            self.start_workflow(self.to_retry.pop(0))
+            num_slots -= 1
+
+        if self.order == 'cost':
+            active_systems = [workflow.system for workflow in self.active]
+            heavy_threshold = float(np.quantile(list(self.costs.values()), HEAVY_QUANTILE))
+            to_submit = select_by_cost(
+                self.to_submit, self.costs, num_slots, active_extras=active_systems, heavy_threshold=heavy_threshold,
+                max_heavy=max(1, int(MAX_HEAVY_FRACTION * max_concurrent)))
+        else:
+            to_submit = sorted(self.to_submit)[:num_slots]
+        for system in to_submit:
+            self.to_submit.remove(system)
+            self.start_workflow(Workflow(system, range(self.num_volumes)))
+
+    def start_workflow(self, workflow):
+        self.active.append(workflow)
+        # The first volume runs first, and is the reference of the others (also when retrying the failed volumes)
+        if workflow.volume_indices[0] == 0 and len(workflow.volume_indices) > 1:
+            self.submit_volumes(workflow, [0])
+        else:
+            self.submit_volumes(workflow, workflow.volume_indices)
+
+    def submit_volumes(self, workflow, volume_indices):
+        model = self.systems[workflow.system]
+        for volume_index in volume_indices:
+            workflow.pending.remove(volume_index)
+            workflow.num_running += 1
+            fails = self.rng.random() < model.failure_rate
+            runtime = float(self.rng.choice(model.runtimes))
+            if fails:
+                runtime *= self.rng.random()
+            self.scheduler.submit(Job(workflow, volume_index, model.num_machines, runtime, fails), self.time)
+
+    def start_jobs(self):
+        for job in self.scheduler.start_jobs(self.time):
+            self.queue_waits.append((self.time, self.time - job.submit_time))
+            heapq.heappush(self.events, (self.time + job.runtime, 1, id(job), job))
+
+    def finish_job(self, job):
+        self.scheduler.finish(job)
+        workflow = job.workflow
+        workflow.num_running -= 1
+        machine_seconds = job.runtime * job.num_machines
+        self.used_machine_seconds += machine_seconds
+        if job.fails:
+            workflow.failed_volumes.append(job.volume_index)
+            self.wasted_machine_seconds += machine_seconds
+        else:
+            workflow.completed_volumes.append(job.volume_index)
+            self.completed_machine_seconds[workflow.system] += machine_seconds
+
+        if job.volume_index == 0 and workflow.pending:
+            if job.fails:
+                # The EOS workflow stops if its first volume fails
+                workflow.failed_volumes.extend(workflow.pending)
+                workflow.pending = []
+            else:
+                self.submit_volumes(workflow, list(workflow.pending))
+        if workflow.num_running == 0 and not workflow.pending:
+            self.finish_workflow(workflow)
+
+    def finish_workflow(self, workflow):
+        self.active.remove(workflow)
+        system = workflow.system
+        self.terminated_workflows.append((self.time, bool(workflow.failed_volumes)))
+        if not workflow.failed_volumes:
+            self.succeeded.add(system)
+        elif self.retry == 'none' or self.num_retries[system] >= self.max_retries:
+            self.failed.add(system)
+        else:
+            self.num_retries[system] += 1
+            if self.retry == 'workflow':
+                # The volumes computed so far are recomputed
+                self.wasted_machine_seconds += self.completed_machine_seconds[system]
+                self.completed_machine_seconds[system] = 0.
+                self.to_retry.append(Workflow(system, range(self.num_volumes)))
+            else:
+                self.to_retry.append(Workflow(system, workflow.failed_volumes))
+
+    def run(self):
+        """Run the simulation until all systems succeeded or failed, and return a report (a dictionary)."""
+        heapq.heappush(self.events, (0., 0, 0, None))
+        while self.events:
+            time, _, _, job = heapq.heappop(self.events)
+            self.scheduler.advance(time)
+            self.time = time
+            if job is None:
+                # A submission by the controller
+                self.submit_batch()
+                if self.to_submit or self.to_retry or self.active:
+                    heapq.heappush(self.events, (self.time + self.interval, 0, 0, None))
+            else:
+                self.finish_job(job)
+            self.start_jobs()
+
+        makespan = self.time
+        allocated_machine_seconds = makespan * self.scheduler.num_machines
+        to_core_hours = self.cores_per_machine / 3600.
+        return {
+            'makespan_hours': makespan / 3600.,
+            'num_succeeded': len(self.succeeded),
+            'num_failed': len(self.failed),
+            'num_retries': sum(self.num_retries.values()),
+            'mean_occupancy': self.scheduler.busy_machine_seconds / allocated_machine_seconds if makespan else 0.,
+            'mean_queue_length': self.scheduler.queued_job_seconds / makespan if makespan else 0.,
+            'max_queue_length': self.scheduler.max_queue_length,
+            'mean_queue_wait_hours': (
+                statistics.mean(wait for _, wait in self.queue_waits) / 3600. if self.queue_waits else 0.),
+            'used_core_hours': self.used_machine_seconds * to_core_hours,
+            'wasted_core_hours': self.wasted_machine_seconds * to_core_hours,
+            'idle_core_hours': (allocated_machine_seconds - self.scheduler.busy_machine_seconds) * to_core_hours,
+        }
@@ -0,0 +1,24 @@
+"""Submission of processes on behalf of a submission controller."""
+from aiida import engine
+
+
+def submit_processes(controller, to_submit, dry_run=False):
+    """Submit the processes identified by a list of extras tuples, as ``submit_new_batch`` of the controller does.
+
+    Each process is submitted with the inputs returned by ``get_inputs_and_processclass_from_extras``,
+    gets its unique extras set, and is added to the group of the controller.
+
+    :return: a dictionary {extras tuple: submitted process node}; with `dry_run`, nothing is submitted and
+        the values are None.
+    """
+    if dry_run:
+        return {key: None for key in to_submit}
+
+    submitted = {}
+    for workchain_extras in to_submit:
+        inputs, process_class = controller.get_inputs_and_processclass_from_extras(workchain_extras)
+        res = engine.submit(process_class, **inputs)
+        res.set_extra_many(dict(zip(controller.get_extra_unique_keys(), workchain_extras)))
+        controller.group.add_nodes([res])
+        submitted[workchain_extras] = res
+    return submitted
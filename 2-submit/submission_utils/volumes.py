@@ -0,0 +1,165 @@
+"""Resubmit only the volumes that are missing from the failed EOS workflows, instead of the whole EOS.
+
+`VolumeResubmissionController` looks at the failed EOS workflows (finished with a non-zero exit status, or excepted)
+of a group, finds the scale factors (volumes) for which no relax sub-workflow finished successfully, and submits just
+those relax workflows, with the same inputs that the EOS workflow would have used. They are put in a separate group
+(by convention `<EOS_GROUP_LABEL>/volumes`), with the extras:
+
+- `element`, `configuration`: those of the structure of the EOS;
+- `eos_workflow_uuid`: the UUID of the failed EOS workflow whose volume they replace;
+- `scale_index`: the index of the scale factor (0 for the smallest volume);
+- `num_scale_factors`: the number of volumes of the EOS.
+
+`get_results.py --resubmitted-volumes` then stitches the volumes computed by these relax workflows together with the
+surviving volumes of the failed EOS workflows.
+
+As in the EOS workflow, all volumes use the first (smallest) volume as reference workflow (e.g. to use the same
+k-point mesh for all volumes): if that volume is the one that failed, it is resubmitted first, and the other missing
+volumes of the same EOS are only submitted once it finished successfully.
+"""
+from aiida import orm
+from aiida.common import LinkType
+from aiida.plugins import WorkflowFactory
+from aiida_common_workflows.workflows.eos import scale_structure
+from aiida_submission_controller import BaseSubmissionController
+
+# The failed EOS workflows, whose missing volumes are resubmitted
+FAILED_FILTERS = {'or': [
+    {'attributes.process_state': 'excepted'},
+    {'and': [{'attributes.process_state': 'finished'}, {'attributes.exit_status': {'!==': 0}}]},
+]}
+
+
+def get_scale_factors(eos_node):
+    """Return the list of the scale factors of an EOS workflow, computed as the EOS workflow itself does."""
+    if 'scale_factors' in eos_node.inputs:
+        return [float(value) for value in eos_node.inputs.scale_factors.get_list()]
+    count = eos_node.inputs.scale_count.value
+    increment = eos_node.inputs.scale_increment.value
+    return [1 + i * increment - (count - 1) * increment / 2 for i in range(count)]
+
+
+def get_scale_index(scale_factors, scale_factor):
+    """Return the index of the scale factor in the list that is the closest to the given one."""
+    return min(range(len(scale_factors)), key=lambda index: abs(scale_factors[index] - scale_factor))
+
+
+class VolumeResubmissionController(BaseSubmissionController):
+    """A SubmissionController resubmitting the missing volumes of the failed EOS workflows of a group.
+
+    :param eos_controller: the submission controller of the EOS workflows; its
+        ``get_inputs_and_processclass_from_extras`` provides the inputs of the relax workflows.
+    """
+
+    def __init__(self, eos_controller, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._eos_controller = eos_controller
+        self._missing_volumes = None
+
+    def get_extra_unique_keys(self):
+        """Return a tuple of the keys of the unique extras that will be used to uniquely identify your workchains.
+
+        Here: the element and configuration of the structure, the UUID of the failed EOS workflow, and the index of
+        the volume.
+        """
+        return ['element', 'configuration', 'eos_workflow_uuid', 'scale_index']
+
+    def get_resubmitted_references(self):
+        """Return the resubmitted relax workflows of the first volume that finished successfully.
+
+        :return: a dictionary {EOS workflow UUID: relax workflow node}.
+        """
+        query = self.get_query(process_projections=['extras.eos_workflow_uuid', '*'])
+        query.add_filter('process', {
+            'extras.scale_index': 0, 'attributes.process_state': 'finished', 'attributes.exit_status': 0
+        })
+        return dict(query.all())
+
+    def get_missing_volumes(self):
+        """Return the volumes to resubmit, computed at the first call.
+
+        :return: a dictionary where the keys are the extras tuples (see `get_extra_unique_keys`), and the values are
+            dictionaries with the `eos_node`, the `scale_factor`, the scaled `structure` if it already exists
+            (the input of the failed relax workflow) or None, the `reference_workchain` and the `num_scale_factors`.
+        """
+        if self._missing_volumes is not None:
+            return self._missing_volumes
+
+        resubmitted_references = self.get_resubmitted_references()
+        query = orm.QueryBuilder()
+        query.append(orm.Group, filters={'label': self._eos_controller.group_label}, tag='group')
+        query.append(orm.WorkflowNode, with_group='group', filters=FAILED_FILTERS, project='*')
+
+        self._missing_volumes = {}
+        for eos_node in query.all(flat=True):
+            structure = eos_node.inputs.structure
+            scale_factors = get_scale_factors(eos_node)
+            children = sorted(
+                (triple.node for triple in eos_node.get_outgoing(link_type=LinkType.CALL_WORK).all()),
+                key=lambda node: node.pk)
+
+            done = set()
+            structures = {}
+            for child in children:
+                scale_index = get_scale_index(
+                    scale_factors, child.inputs.structure.get_cell_volume() / structure.get_cell_volume())
+                structures[scale_index] = child.inputs.structure
+                if child.is_finished_ok:
+                    done.add(scale_index)
+
+            # The first volume is the reference of all others (see `EquationOfStateWorkChain.run_eos`)
+            reference_workchain = None
+            if children and children[0].is_finished_ok:
+                reference_workchain = children[0]
+            else:
+                reference_workchain = resubmitted_references.get(eos_node.uuid)
+
+            for scale_index, scale_factor in enumerate(scale_factors):
+                if scale_index in done:
+                    continue
+                if reference_workchain is None and scale_index != 0:
+                    # Wait until the first volume is computed
+                    continue
+                extras_values = (
+                    structure.extras['element'], structure.extras['configuration'], eos_node.uuid, scale_index)
+                self._missing_volumes[extras_values] = {
+                    'eos_node': eos_node,
+                    'scale_factor': scale_factor,
+                    'structure': structures.get(scale_index),
+                    'reference_workchain': reference_workchain if scale_index != 0 else None,
+                    'num_scale_factors': len(scale_factors),
+                }
+        return self._missing_volumes
+
+    def get_all_extras_to_submit(self):
+        """Return a *set* of the values of all extras uniquely identifying all simulations that you want to submit."""
+        return set(self.get_missing_volumes())
+
+    def get_inputs_and_processclass_from_extras(self, extras_values):
+        """Return inputs and process class for the submission of this specific process.
+
+        The relax workflow is built as in `EquationOfStateWorkChain.get_sub_workchain_builder`, from the inputs of the
+        EOS workflow returned by the EOS submission controller.
+        """
+        element, configuration, _, _ = extras_values
+        volume = self.get_missing_volumes()[extras_values]
+        eos_inputs, _ = self._eos_controller.get_inputs_and_processclass_from_extras((element, configuration))
+
+        structure = volume['structure']
+        if structure is None:
+            structure = scale_structure(volume['eos_node'].inputs.structure, orm.Float(volume['scale_factor']))
+
+        process_class = WorkflowFactory(eos_inputs['sub_process_class'])
+        builder = process_class.get_input_generator().get_builder(
+            structure=structure, reference_workchain=volume['reference_workchain'], **eos_inputs['generator_inputs'])
+        builder._update(**eos_inputs.get('sub_process', {}))  # pylint: disable=protected-access
+
+        return builder._inputs(prune=True), process_class  # pylint: disable=protected-access
+
+    def submit_new_batch(self, dry_run=False, sort=True):
+        """Submit a new batch of relax workflows, also setting the `num_scale_factors` extra of each of them."""
+        submitted = super().submit_new_batch(dry_run=dry_run, sort=sort)
+        for extras_values, node in submitted.items():
+            if node is not None:
+                node.set_extra('num_scale_factors', self.get_missing_volumes()[extras_values]['num_scale_factors'])
+        return submitted
@@ -0,0 +1,82 @@
+"""Find the calculations run by the EOS workflows of a group, following the CALL links.
+
+The calculations are not linked to the EOS workflows directly: each EOS workflow calls a relax workflow per volume,
+that calls the calculations through one or more levels of work chains, depending on the code (e.g. for Quantum
+ESPRESSO: the relax workflow calls a `PwRelaxWorkChain`, that calls `PwBaseWorkChain`s, that call the `PwCalculation`s).
+The levels are followed with one query each, for all workflows at once.
+"""
+import numpy as np
+
+from aiida import orm
+from aiida.common import LinkType
+
+
+def get_eos_relax_workflows(workflows_group_label):
+    """Return the relax workflows called by the EOS workflows of a group, with a single query.
+
+    :return: a dictionary with the PKs of the relax workflows as keys, and as values a dictionary with the `eos_pk`,
+        the `element` and `configuration` extras of the EOS workflow, and the `volume_index` of the relax workflow:
+        the rank of the volume of its input structure among those of its EOS workflow (0 for the smallest volume).
+    """
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': workflows_group_label}, tag='group')
+    query.append(
+        orm.WorkflowNode, with_group='group', tag='eos', project=['id', 'extras.element', 'extras.configuration'])
+    query.append(
+        orm.WorkflowNode, with_incoming='eos', edge_filters={'type': LinkType.CALL_WORK.value}, tag='relax',
+        project=['id'])
+    query.append(
+        orm.StructureData, with_outgoing='relax', edge_filters={'label': 'structure'}, project=['attributes.cell'])
+
+    relax_workflows = {}
+    volumes = {}
+    for eos_pk, element, configuration, relax_pk, cell in query.iterall():
+        relax_workflows[relax_pk] = {'eos_pk': eos_pk, 'element': element, 'configuration': configuration}
+        volumes.setdefault(eos_pk, {})[relax_pk] = abs(np.linalg.det(cell))
+    for eos_volumes in volumes.values():
+        for volume_index, relax_pk in enumerate(sorted(eos_volumes, key=lambda pk: (eos_volumes[pk], pk))):
+            relax_workflows[relax_pk]['volume_index'] = volume_index
+    return relax_workflows
+
+
+def get_called_calcjobs(root_pks, projections=()):
+    """Return the calculations called (directly or indirectly) by the given workflows.
+
+    Two queries are run for each level of nesting (the calculations, and the work chains of the next level), for all
+    the workflows at once.
+
+    :param projections: the projections of the calculations, e.g. ``['attributes.exit_status']``.
+    :return: a list of tuples ``(root_pk, calcjob_pk, *projected_values)``, with the PK of the root workflow that
+        called the calculation.
+    """
+    roots = {pk: pk for pk in root_pks}
+    frontier = list(root_pks)
+    calcjobs = []
+    while frontier:
+        query = orm.QueryBuilder()
+        query.append(orm.WorkflowNode, filters={'id': {'in': frontier}}, project='id', tag='caller')
+        query.append(
+            orm.CalcJobNode, with_incoming='caller', edge_filters={'type': LinkType.CALL_CALC.value},
+            project=['id'] + list(projections))
+        for caller_pk, *values in query.iterall():
+            calcjobs.append((roots[caller_pk], *values))
+
+        query = orm.QueryBuilder()
+        query.append(orm.WorkflowNode, filters={'id': {'in': frontier}}, project='id', tag='caller')
+        query.append(
+            orm.WorkflowNode, with_incoming='caller', edge_filters={'type': LinkType.CALL_WORK.value}, project='id')
+        frontier = []
+        for caller_pk, called_pk in query.iterall():
+            roots[called_pk] = roots[caller_pk]
+            frontier.append(called_pk)
+    return calcjobs
+
+
+def get_eos_calcjobs(workflows_group_label, projections=()):
+    """Return the calculations run by the EOS workflows of a group (see `get_called_calcjobs`).
+
+    :return: a tuple ``(relax_workflows, calcjobs)``, with the relax workflows as returned by
+        `get_eos_relax_workflows`, and a list of tuples ``(relax_pk, calcjob_pk, *projected_values)``.
+    """
+    relax_workflows = get_eos_relax_workflows(workflows_group_label)
+    return relax_workflows, get_called_calcjobs(list(relax_workflows), projections)
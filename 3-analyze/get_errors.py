@@ -1,10 +1,15 @@
 #!/usr/bin/env runaiida
+import argparse
 import os
 import json
-import sys
+import re
+
+from collections import Counter
 
 from aiida import orm
 from aiida.cmdline.utils.common import get_workchain_report
+from aiida.common import LinkType
+from aiida.common.log import LOG_LEVELS
 
 
 def get_plugin_name():
@@ -29,41 +34,246 @@ def get_plugin_name():
 
 PLUGIN_NAME = get_plugin_name()
 
+# Filters of the EOS workflows whose report is collected
+FAILED_FILTERS = {
+    'and': [
+        {'attributes.exit_status': {"!==": 0}},
+        {'attributes.process_state': {"!==": 'waiting'}},
+    ]
+}
+# Log messages that look like errors, used to classify the failures
+ERROR_MESSAGE_REGEX = re.compile(r'error|fail|except|abort|kill|not converge', re.IGNORECASE)
+# Parts of the messages that change from workflow to workflow, replaced to get a pattern shared by similar errors
+# (integers are kept, since they are often exit statuses)
+MESSAGE_PATTERN_SUBSTITUTIONS = [
+    (re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'), '<UUID>'),
+    (re.compile(r'<\d+>'), '<PK>'),
+    (re.compile(r'^\[\d+\|'), '[<PK>|'),
+    (re.compile(r'\b(pk|PK)(\s*[=:]?\s*)\d+'), r'\1\2<PK>'),
+    (re.compile(r'[-+]?(\d+\.\d*|\.\d+|\d+(?=[eE]))([eE][-+]?\d+)?'), '<X>'),
+]
+
+
+def get_failed_workflows(workflows_group_label):
+    """Return the failed EOS workflows of the group with a single projected query.
+
+    :return: a dictionary with the PKs of the EOS workflows as keys, and as values a dictionary with the `uuid`,
+        `process_state` and `exit_status` of the workflow, and the `structure_pk`, `structure_uuid`,
+        `element` and `configuration` of its input structure.
+    """
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': workflows_group_label}, tag='group')
+    query.append(
+        orm.ProcessNode, with_group='group', filters=FAILED_FILTERS, tag='eos',
+        project=['id', 'uuid', 'attributes.process_state', 'attributes.exit_status'])
+    query.append(
+        orm.StructureData, with_outgoing='eos', edge_filters={'label': 'structure'},
+        project=['id', 'uuid', 'extras.element', 'extras.configuration'])
+    return {
+        pk: {
+            'uuid': uuid,
+            'process_state': process_state,
+            'exit_status': exit_status,
+            'structure_pk': structure_pk,
+            'structure_uuid': structure_uuid,
+            'element': element,
+            'configuration': configuration,
+        }
+        for pk, uuid, process_state, exit_status, structure_pk, structure_uuid, element, configuration
+        in query.iterall()
+    }
+
+
+def get_workchain_trees(root_pks):
+    """Return all the work chains called (directly or indirectly) by the given work chains.
+
+    One query is run for each level of nesting, for all the trees at once.
+
+    :return: a dictionary with the PKs of the work chains (including the roots) as keys, and as values a tuple
+        ``(root_pk, depth)`` with the PK of the root work chain that called it and its level of nesting (0 for the
+        roots), as used for the indentation by `get_workchain_report`.
+    """
+    tree = {pk: (pk, 0) for pk in root_pks}
+    frontier = list(root_pks)
+    depth = 0
+    while frontier:
+        depth += 1
+        query = orm.QueryBuilder()
+        query.append(orm.WorkChainNode, filters={'id': {'in': frontier}}, project='id', tag='caller')
+        query.append(
+            orm.WorkChainNode, with_incoming='caller', edge_filters={'type': LinkType.CALL_WORK.value}, project='id')
+        frontier = []
+        for caller_pk, called_pk in query.iterall():
+            tree[called_pk] = (tree[caller_pk][0], depth)
+            frontier.append(called_pk)
+    return tree
+
+
+def get_log_entries(node_pks, levelname='REPORT'):
+    """Return the log entries of all the given nodes with a single query, keeping only those at least at `levelname`.
+
+    :return: a list of dictionaries with the `id`, `node_pk`, `time`, `levelname` and `message` of each entry.
+    """
+    if not node_pks:
+        return []
+    query = orm.QueryBuilder()
+    query.append(
+        orm.Log, filters={'dbnode_id': {'in': list(node_pks)}},
+        project=['id', 'dbnode_id', 'time', 'levelname', 'message'])
+    return [
+        {'id': log_id, 'node_pk': node_pk, 'time': time, 'levelname': entry_levelname, 'message': message}
+        for log_id, node_pk, time, entry_levelname, message in query.iterall()
+        if LOG_LEVELS[entry_levelname] >= LOG_LEVELS[levelname]
+    ]
+
+
+def format_report(entries, indent_size=4):
+    """Format the log entries of a work chain tree as `get_workchain_report` does.
+
+    :param entries: a list of ``(entry, depth)`` tuples, with the entries as returned by `get_log_entries`.
+    """
+    if not entries:
+        return 'No log messages recorded for this entry'
+
+    entries = sorted(entries, key=lambda entry_depth: (entry_depth[0]['time'], entry_depth[0]['id']))
+    width_id = len(str(max(entry['id'] for entry, _ in entries)))
+    width_levelname = max(len(entry['levelname']) for entry, _ in entries)
+    return '\n'.join(
+        '{time:%Y-%m-%d %H:%M:%S} [{id:<{width_id}} | {levelname:>{width_levelname}}]:{indent} {message}'.format(
+            id=entry['id'],
+            levelname=entry['levelname'],
+            message=entry['message'],
+            time=entry['time'],
+            width_id=width_id,
+            width_levelname=width_levelname,
+            indent=' ' * (depth * indent_size)
+        )
+        for entry, depth in entries
+    )
+
+
+def get_reports_bulk(root_pks, levelname='REPORT'):
+    """Return the report of many work chains, the same as `get_workchain_report` but with a few queries in total.
+
+    :return: a tuple ``(reports, entries)``, two dictionaries with the PKs of the root work chains as keys, and as
+        values respectively the formatted report and the list of ``(entry, depth)`` tuples of its tree.
+    """
+    tree = get_workchain_trees(root_pks)
+    entries = {pk: [] for pk in root_pks}
+    for entry in get_log_entries(list(tree), levelname=levelname):
+        root_pk, depth = tree[entry['node_pk']]
+        entries[root_pk].append((entry, depth))
+    reports = {pk: format_report(root_entries) for pk, root_entries in entries.items()}
+    return reports, entries
+
+
+def get_message_pattern(message):
+    """Return the pattern of a log message, replacing the UUIDs, PKs and real numbers that change between workflows."""
+    for regex, replacement in MESSAGE_PATTERN_SUBSTITUTIONS:
+        message = regex.sub(replacement, message)
+    return message.strip()
+
+
+def get_error_pattern(entries):
+    """Return the pattern of the first message of a work chain tree that looks like an error (None if there is none).
+
+    The first error is used since the following ones are typically the same failure, propagated up to the callers.
+
+    :param entries: a list of ``(entry, depth)`` tuples, as returned by `get_reports_bulk`.
+    """
+    for entry, _ in sorted(entries, key=lambda entry_depth: (entry_depth[0]['time'], entry_depth[0]['id'])):
+        if LOG_LEVELS[entry['levelname']] >= LOG_LEVELS['WARNING'] or ERROR_MESSAGE_REGEX.search(entry['message']):
+            return get_message_pattern(entry['message'])
+    return None
+
+
+def classify_failures(data, error_patterns):
+    """Group the failed workflows by exit status and by error pattern.
+
+    :param data: the data written to the errors file, with the systems (e.g. 'Ag-X/FCC') as keys.
+    :param error_patterns: a dictionary with the error pattern of each system (see `get_error_pattern`).
+    :return: a list of dictionaries with the `process_state`, the `exit_status`, the error `pattern` and the list of
+        `systems` of each class of failures, sorted by decreasing number of systems.
+    """
+    classes = {}
+    for system, system_data in sorted(data.items()):
+        key = (system_data['process_state'], system_data['exit_status'], error_patterns.get(system))
+        classes.setdefault(key, []).append(system)
+    return [
+        {'process_state': process_state, 'exit_status': exit_status, 'pattern': pattern, 'systems': systems}
+        for (process_state, exit_status, pattern), systems in sorted(
+            classes.items(), key=lambda key_systems: (-len(key_systems[1]), str(key_systems[0])))
+    ]
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect the reports of the EOS workflows of a set that failed.")
+    parser.add_argument(
+        'set_name', help="The set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
+    parser.add_argument(
+        '--bulk', action='store_true',
+        help="Fetch the log entries of all failed workflows (and of the work chains they called) with a few queries, "
+        "instead of collecting the report of each workflow one by one (much faster with many failures)")
+    parser.add_argument(
+        '--classify', action='store_true',
+        help="Also group the failed workflows by exit status and error message pattern, in a separate "
+        "`errors-classified-*.json` file (requires --bulk)")
+    args = parser.parse_args()
+    if args.classify and not args.bulk:
+        parser.error("--classify can only be used together with --bulk")
+    SET_NAME = args.set_name
 
-    try:
-        SET_NAME = sys.argv[1]
-    except IndexError:
-        print("Pass as parameter the set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
-        sys.exit(1)
     STRUCTURES_GROUP_LABEL = f'acwf-verification/{SET_NAME}/structures/{PLUGIN_NAME}'
     WORKFLOWS_GROUP_LABEL = f'acwf-verification/{SET_NAME}/workflows/{PLUGIN_NAME}'
 
-    group_node_query = orm.QueryBuilder().append(
-        orm.Group, filters={'label': WORKFLOWS_GROUP_LABEL}, tag='groups',
-    ).append(orm.Node, project='*', with_group='groups', filters={
-        'and': [
-            {'attributes.exit_status': {"!==": 0}},
-            {'attributes.process_state': {"!==": 'waiting'}},
-        ]
-    })
-    group_node_query.distinct()
-    wf_nodes = group_node_query.all(flat=True)
-
     data = {}
-    for node in wf_nodes:
-        structure = node.inputs.structure
-        print(f"{structure.extras['element']} {structure.extras['configuration']} ({structure.pk}) -> {node.pk}: {node.process_state.value} ({node.exit_status})")
-        data[f"{structure.extras['element']}-{structure.extras['configuration']}"] = {
-            'structure': structure.uuid, 
-            'eos_workflow': node.uuid, 
-            'eos_workflow_report': get_workchain_report(node, levelname='REPORT'),
-            'process_state': node.process_state.value,
-            'exit_status': node.exit_status
-        }
+    if args.bulk:
+        workflows = get_failed_workflows(WORKFLOWS_GROUP_LABEL)
+        reports, entries = get_reports_bulk(sorted(workflows))
+        error_patterns = {}
+        for pk, workflow in sorted(workflows.items()):
+            print(f"{workflow['element']} {workflow['configuration']} ({workflow['structure_pk']}) -> {pk}: {workflow['process_state']} ({workflow['exit_status']})")
+            data[f"{workflow['element']}-{workflow['configuration']}"] = {
+                'structure': workflow['structure_uuid'],
+                'eos_workflow': workflow['uuid'],
+                'eos_workflow_report': reports[pk],
+                'process_state': workflow['process_state'],
+                'exit_status': workflow['exit_status']
+            }
+            error_patterns[f"{workflow['element']}-{workflow['configuration']}"] = get_error_pattern(entries[pk])
+    else:
+        group_node_query = orm.QueryBuilder().append(
+            orm.Group, filters={'label': WORKFLOWS_GROUP_LABEL}, tag='groups',
+        ).append(orm.Node, project='*', with_group='groups', filters=FAILED_FILTERS)
+        group_node_query.distinct()
+        wf_nodes = group_node_query.all(flat=True)
+
+        for node in wf_nodes:
+            structure = node.inputs.structure
+            print(f"{structure.extras['element']} {structure.extras['configuration']} ({structure.pk}) -> {node.pk}: {node.process_state.value} ({node.exit_status})")
+            data[f"{structure.extras['element']}-{structure.extras['configuration']}"] = {
+                'structure': structure.uuid,
+                'eos_workflow': node.uuid,
+                'eos_workflow_report': get_workchain_report(node, levelname='REPORT'),
+                'process_state': node.process_state.value,
+                'exit_status': node.exit_status
+            }
 
     fname = f"outputs/errors-{SET_NAME}-{PLUGIN_NAME}.json"
     os.makedirs('outputs', exist_ok=True)
     with open(fname, 'w') as fhandle:
         json.dump(data, fhandle, indent=2, sort_keys=True)
     print(f"'{fname}' written.")
+
+    if args.classify:
+        classes = classify_failures(data, error_patterns)
+        print()
+        print("Counter of exit statuses: " + str(Counter(
+            f"{system_data['process_state']} ({system_data['exit_status']})" for system_data in data.values())))
+        for failure_class in classes:
+            print(f"- {len(failure_class['systems'])} x {failure_class['process_state']} "
+                  f"({failure_class['exit_status']}): {failure_class['pattern']}")
+        fname = f"outputs/errors-classified-{SET_NAME}-{PLUGIN_NAME}.json"
+        with open(fname, 'w') as fhandle:
+            json.dump(classes, fhandle, indent=2)
+        print(f"'{fname}' written.")
@@ -2,18 +2,24 @@
 
 # The version of the script will be placed in the json file containing the results.
 # We should change this number anytime this script or `eos_utils.eosfit_31_adapted` is modified.
-import sys
+import argparse
 import json
 import os
+import subprocess
+import sys
+import tempfile
 
 import tqdm
 import numpy as np
 
 from collections import Counter
 from eos_utils.eosfit_31_adapted import BM, echarge
+from eos_utils.results_io import STREAM_EXTENSIONS, ResultsWriter, StressArraysBuilder, save_stress_arrays
 
 from aiida import orm
 from aiida.common import LinkType, NotExistentAttributeError
+from aiida.common.folders import RepositoryFolder
+from aiida.manage.configuration import get_profile
 from aiida_common_workflows.workflows.relax.workchain import CommonRelaxWorkChain
 
 
@@ -29,7 +35,7 @@ def extract_from_failed(node):
     """
     ens=[]
     vols=[]
-    streses=[]
+    stresses=[]
     num_atoms = None
     num_attempt_vols = 0
     for i in node.get_outgoing(link_type=LinkType.CALL_WORK).all():
@@ -50,7 +56,7 @@ def extract_from_failed(node):
                 stress = None
             stresses.append(stress)
 
-    return vols,ens,streses,num_atoms,num_attempt_vols
+    return vols,ens,stresses,num_atoms,num_attempt_vols
 
 
 def get_plugin_name():
@@ -75,171 +81,716 @@ def get_plugin_name():
 
 PLUGIN_NAME = get_plugin_name()
 
-if __name__ == "__main__":
-    try:
-        SET_NAME = sys.argv[1]
-    except IndexError:
-        print("Pass as parameter the set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
-        sys.exit(1)
 
-    STRUCTURES_GROUP_LABEL = f'acwf-verification/{SET_NAME}/structures/{PLUGIN_NAME}'
-    WORKFLOWS_GROUP_LABEL = f'acwf-verification/{SET_NAME}/workflows/{PLUGIN_NAME}'
+def get_state(process_state, exit_status):
+    """Return the state string used in the statistics, e.g. 'finished.0' or 'excepted'."""
+    if process_state == 'finished':
+        return f'{process_state}.{exit_status}'
+    return process_state
+
+
+def get_record_from_node(node):
+    """Collect the raw data (volumes, energies, stresses, ...) of one EOS workflow, walking the provenance graph.
+
+    Return a dictionary with the same format as the one returned by `get_records_bulk`.
+    The `volumes`, `energies` and `stresses` lists are empty if the workflow does not have results (yet);
+    `num_attempt_vols` is only set for failed workflows, where only some of the volumes might have been computed.
+    """
+    structure = node.inputs.structure
+    element = structure.extras['element']
+    configuration = structure.extras['configuration']
+
+    record = {
+        'element': element,
+        'configuration': configuration,
+        'structure_uuid': structure.uuid,
+        'eos_workflow_uuid': node.uuid,
+        'process_state': node.process_state.value,
+        'exit_status': node.exit_status,
+        'volumes': [],
+        'energies': [],
+        'stresses': [],
+        'num_atoms': None,
+        'num_attempt_vols': None,
+    }
+
+    # For successfully finished workflows, collect the data from outputs
+    if node.process_state.value == 'finished' and node.exit_status == 0:
+        # Extract volumes and energies for this system
+        outputs = node.get_outgoing(link_type=LinkType.RETURN).nested()
+        for index, sub_structure in sorted(outputs['structures'].items()):
+            if record['num_atoms'] is None:
+                record['num_atoms'] = len(sub_structure.sites)
+            else:
+                assert record['num_atoms'] == len(sub_structure.sites), (
+                    f"Number of atoms changes between structures for {element} {configuration}!"
+                )
+            record['volumes'].append(sub_structure.get_cell_volume())
+            energy_node = outputs['total_energies'][index]
+            record['energies'].append(energy_node.value)
+            parent_workflows_links = energy_node.get_incoming(link_type=LinkType.RETURN).all()
+            parent_workflows = [
+                triple.node for triple in parent_workflows_links
+                if issubclass(triple.node.process_class, CommonRelaxWorkChain)]
+            assert len(parent_workflows) == 1, "Error retrieving the parent Relax workflow!"
+            parent_workflow = parent_workflows[0]
+            try:
+                stress = parent_workflow.outputs.stress.get_array('stress').tolist()
+            except AttributeError:
+                stress = None
+            record['stresses'].append(stress)
+    # For failed workflows, check if some volumes concluded succesfully
+    elif (node.process_state.value == 'finished' and node.exit_status != 0) or (node.process_state.value == 'excepted'):
+        (record['volumes'], record['energies'], record['stresses'],
+            record['num_atoms'], record['num_attempt_vols']) = extract_from_failed(node)
+
+    return record
+
+
+def get_output_index(link_label):
+    """Return the integer index of a link label of a nested EOS output, e.g. 3 for `total_energies__3`."""
+    return int(link_label.rpartition('__')[2])
+
+
+def load_array_from_repository(uuid, name):
+    """Load an array of a stored `ArrayData` node directly from its `.npy` file in the file repository.
+
+    This returns the same as `orm.load_node(uuid).get_array(name)`, without loading the node from the database.
+    It relies on the layout of the file repository of AiiDA 1.x, where the files of a node are stored in the `path`
+    subfolder of its repository folder.
+    """
+    folder = RepositoryFolder(section='node', uuid=uuid).get_subfolder('path')
+    return np.load(folder.get_abs_path(f'{name}.npy'), allow_pickle=False)
+
+
+# Filters of the processes that finished successfully, and of those that failed (i.e. finished with a non-zero exit
+# status or excepted), for which `extract_from_failed` tries to salvage the completed volumes
+FINISHED_OK_FILTERS = {'attributes.process_state': 'finished', 'attributes.exit_status': 0}
+FAILED_FILTERS = {'or': [
+    {'attributes.process_state': 'excepted'},
+    {'and': [{'attributes.process_state': 'finished'}, {'attributes.exit_status': {'!==': 0}}]},
+]}
+
+
+def get_group_query(workflows_group_label, pks=None, eos_filters=None):
+    """Return a query on the EOS workflows of the group, projecting their PK, with the EOS workflow tagged as `eos`.
+
+    :param pks: if specified, only consider the workflows of the group with these PKs.
+    :param eos_filters: optional additional filters on the EOS workflows.
+    """
+    eos_filters = dict(eos_filters or {})
+    if pks is not None:
+        eos_filters['id'] = {'in': list(pks)}
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': workflows_group_label}, tag='group')
+    query.append(orm.ProcessNode, with_group='group', filters=eos_filters, project='id', tag='eos')
+    return query
+
+
+def extract_from_failed_bulk(workflows_group_label, pks=None):
+    """Salvage the completed volumes of all failed EOS workflows of the group at once, with a few projected queries.
+
+    This is the equivalent of calling `extract_from_failed` on each failed EOS workflow, without loading
+    the sub-workflows (and their outputs) one by one: a workflow only has volumes if all its successful
+    relax sub-workflows have a `relaxed_structure` output (otherwise the volumes can not be retrieved).
+
+    :param pks: if specified, only consider the workflows of the group with these PKs.
+    :return: a dictionary with the PKs of the failed EOS workflows as keys, and as values the same tuple
+        ``(vols, ens, stresses, num_atoms, num_attempt_vols)`` returned by `extract_from_failed`.
+    """
+    # All the sub-workflows called by each failed EOS workflow (the attempted volumes), with their state
+    query = get_group_query(workflows_group_label, pks=pks, eos_filters=FAILED_FILTERS)
+    query.append(
+        orm.WorkflowNode, with_incoming='eos', edge_filters={'type': LinkType.CALL_WORK.value},
+        project=['id', 'attributes.process_state', 'attributes.exit_status'])
+    num_attempt_vols = Counter()
+    finished_ok_relaxes = {}
+    for pk, relax_pk, process_state, exit_status in query.iterall():
+        num_attempt_vols[pk] += 1
+        if process_state == 'finished' and exit_status == 0:
+            finished_ok_relaxes.setdefault(pk, set()).add(relax_pk)
+
+    # Relaxed structure and total energy of the successful sub-workflows
+    query = get_group_query(workflows_group_label, pks=pks, eos_filters=FAILED_FILTERS)
+    query.append(
+        orm.WorkflowNode, with_incoming='eos', edge_filters={'type': LinkType.CALL_WORK.value},
+        filters=FINISHED_OK_FILTERS, project='id', tag='relax')
+    query.append(
+        orm.StructureData, with_incoming='relax',
+        edge_filters={'type': LinkType.RETURN.value, 'label': 'relaxed_structure'},
+        project=['attributes.cell', 'attributes.sites'])
+    query.append(
+        orm.Float, with_incoming='relax', edge_filters={'type': LinkType.RETURN.value, 'label': 'total_energy'},
+        project='attributes.value')
+    volumes_data = {}
+    for pk, relax_pk, cell, sites, energy in query.iterall():
+        volumes_data.setdefault(pk, {})[relax_pk] = (abs(float(np.linalg.det(cell))), len(sites), energy)
+
+    # Stresses of the successful sub-workflows, read from the repository files (see `get_records_bulk`)
+    query = get_group_query(workflows_group_label, pks=pks, eos_filters=FAILED_FILTERS)
+    query.append(
+        orm.WorkflowNode, with_incoming='eos', edge_filters={'type': LinkType.CALL_WORK.value},
+        filters=FINISHED_OK_FILTERS, project='id', tag='relax')
+    query.append(
+        orm.ArrayData, with_incoming='relax', edge_filters={'type': LinkType.RETURN.value, 'label': 'stress'},
+        project='uuid')
+    stresses = {}
+    for _, relax_pk, stress_uuid in sorted(query.iterall(), key=lambda row: row[2]):
+        stresses[relax_pk] = load_array_from_repository(stress_uuid, 'stress').tolist()
+
+    salvaged = {}
+    for pk in num_attempt_vols:
+        relax_pks = sorted(finished_ok_relaxes.get(pk, set()))
+        pk_volumes_data = volumes_data.get(pk, {})
+        vols, ens, eos_stresses, num_atoms = [], [], [], None
+        # If a successful sub-workflow has no output structure, we can not retrieve the volumes
+        if all(relax_pk in pk_volumes_data for relax_pk in relax_pks):
+            for relax_pk in relax_pks:
+                volume, relax_num_atoms, energy = pk_volumes_data[relax_pk]
+                if num_atoms is None:
+                    num_atoms = relax_num_atoms
+                vols.append(volume)
+                ens.append(energy)
+                eos_stresses.append(stresses.get(relax_pk))
+        salvaged[pk] = (vols, ens, eos_stresses, num_atoms, num_attempt_vols[pk])
+    return salvaged
+
+
+def get_records_bulk(workflows_group_label, pks=None):
+    """Collect the raw data of all EOS workflows in a group with a handful of projected queries.
+
+    This returns the same records as calling `get_record_from_node` on each workflow of the group,
+    but without loading each node (and walking its links) one by one; the completed volumes of
+    failed workflows are salvaged with `extract_from_failed_bulk`.
+
+    :param pks: if specified, only consider the workflows of the group with these PKs.
+    """
+    def get_eos_query(**eos_filters):
+        return get_group_query(workflows_group_label, pks=pks, eos_filters=eos_filters)
+
+    # The EOS workflows, their state, and the extras of the input structure
+    query = get_eos_query()
+    query.add_projection('eos', ['uuid', 'attributes.process_state', 'attributes.exit_status'])
+    query.append(
+        orm.StructureData, with_outgoing='eos', edge_filters={'label': 'structure'},
+        project=['uuid', 'extras.element', 'extras.configuration'])
+    records = {}
+    for pk, uuid, process_state, exit_status, structure_uuid, element, configuration in query.iterall():
+        records[pk] = {
+            'element': element,
+            'configuration': configuration,
+            'structure_uuid': structure_uuid,
+            'eos_workflow_uuid': uuid,
+            'process_state': process_state,
+            'exit_status': exit_status,
+            'volumes': [],
+            'energies': [],
+            'stresses': [],
+            'num_atoms': None,
+            'num_attempt_vols': None,
+        }
+
+    # Cell and sites of the structures returned by the successful workflows, indexed by the output index
+    query = get_eos_query(**FINISHED_OK_FILTERS)
+    query.append(
+        orm.StructureData, with_incoming='eos',
+        edge_filters={'type': LinkType.RETURN.value, 'label': {'like': 'structures__%'}}, edge_project='label',
+        project=['attributes.cell', 'attributes.sites'])
+    structures = {}
+    for pk, link_label, cell, sites in query.iterall():
+        structures.setdefault(pk, {})[get_output_index(link_label)] = (cell, len(sites))
+
+    # Total energies returned by the successful workflows, indexed by the output index
+    query = get_eos_query(**FINISHED_OK_FILTERS)
+    query.append(
+        orm.Float, with_incoming='eos',
+        edge_filters={'type': LinkType.RETURN.value, 'label': {'like': 'total_energies__%'}}, edge_project='label',
+        project=['id', 'attributes.value'])
+    energies = {}
+    for pk, link_label, energy_pk, energy in query.iterall():
+        energies.setdefault(pk, {})[get_output_index(link_label)] = (energy_pk, energy)
+
+    # Stresses of the relax sub-workflows, indexed by the PK of the total energy they returned
+    # (that is the same node returned by the EOS workflow). Only the UUIDs of the stress nodes are queried,
+    # the arrays are then read from the repository files in a single pass (sorted by UUID, i.e. by folder)
+    query = get_eos_query(**FINISHED_OK_FILTERS)
+    query.append(orm.WorkflowNode, with_incoming='eos', edge_filters={'type': LinkType.CALL_WORK.value}, tag='relax')
+    query.append(
+        orm.Float, with_incoming='relax', edge_filters={'type': LinkType.RETURN.value, 'label': 'total_energy'},
+        project='id')
+    query.append(
+        orm.ArrayData, with_incoming='relax', edge_filters={'type': LinkType.RETURN.value, 'label': 'stress'},
+        project='uuid')
+    stresses = {}
+    for _, energy_pk, stress_uuid in sorted(query.iterall(), key=lambda row: row[2]):
+        stresses[energy_pk] = load_array_from_repository(stress_uuid, 'stress').tolist()
+
+    salvaged = extract_from_failed_bulk(workflows_group_label, pks=pks)
+
+    for pk, record in records.items():
+        if record['process_state'] == 'finished' and record['exit_status'] == 0:
+            element, configuration = record['element'], record['configuration']
+            assert sorted(structures[pk]) == sorted(energies[pk]), (
+                f"Structures and energies outputs do not match for {element} {configuration}!")
+            for index, (cell, num_atoms) in sorted(structures[pk].items()):
+                if record['num_atoms'] is None:
+                    record['num_atoms'] = num_atoms
+                else:
+                    assert record['num_atoms'] == num_atoms, (
+                        f"Number of atoms changes between structures for {element} {configuration}!"
+                    )
+                record['volumes'].append(abs(float(np.linalg.det(cell))))
+                energy_pk, energy = energies[pk][index]
+                record['energies'].append(energy)
+                record['stresses'].append(stresses.get(energy_pk))
+        elif (record['process_state'] == 'finished' and record['exit_status'] != 0) or (record['process_state'] == 'excepted'):
+            # Failed workflows without any sub-workflow are not returned by the query
+            (record['volumes'], record['energies'], record['stresses'],
+                record['num_atoms'], record['num_attempt_vols']) = salvaged.get(pk, ([], [], [], None, 0))
+
+    return [records[pk] for pk in sorted(records)]
+
+
+def get_resubmitted_volumes(volumes_group_label):
+    """Collect the volumes of the failed EOS workflows that were resubmitted as single relax workflows.
+
+    These are the relax workflows submitted by `launch_calculations_*.py --missing-volumes` in the group
+    `volumes_group_label`; only those that finished successfully are considered.
+
+    :return: a dictionary where the keys are the UUIDs of the failed EOS workflows, and the values are dictionaries
+        with the `num_scale_factors` of the EOS workflow, and the list of the resubmitted `volumes`, each a tuple
+        ``(scale_index, volume, num_atoms, energy, stress)``, sorted by scale index.
+    """
+    def get_relax_query():
+        query = orm.QueryBuilder()
+        query.append(orm.Group, filters={'label': volumes_group_label}, tag='group')
+        query.append(
+            orm.WorkflowNode, with_group='group', filters=FINISHED_OK_FILTERS, tag='relax',
+            project=['id', 'extras.eos_workflow_uuid', 'extras.scale_index', 'extras.num_scale_factors'])
+        return query
+
+    # Stresses, read from the repository files (see `get_records_bulk`)
+    query = get_relax_query()
+    query.append(
+        orm.ArrayData, with_incoming='relax', edge_filters={'type': LinkType.RETURN.value, 'label': 'stress'},
+        project='uuid')
+    stresses = {}
+    for relax_pk, _, _, _, stress_uuid in sorted(query.iterall(), key=lambda row: row[4]):
+        stresses[relax_pk] = load_array_from_repository(stress_uuid, 'stress').tolist()
+
+    query = get_relax_query()
+    query.append(
+        orm.StructureData, with_incoming='relax',
+        edge_filters={'type': LinkType.RETURN.value, 'label': 'relaxed_structure'},
+        project=['attributes.cell', 'attributes.sites'])
+    query.append(
+        orm.Float, with_incoming='relax', edge_filters={'type': LinkType.RETURN.value, 'label': 'total_energy'},
+        project='attributes.value')
+    resubmitted = {}
+    for relax_pk, eos_uuid, scale_index, num_scale_factors, cell, sites, energy in query.iterall():
+        eos_resubmitted = resubmitted.setdefault(eos_uuid, {'num_scale_factors': num_scale_factors, 'volumes': []})
+        eos_resubmitted['volumes'].append(
+            (scale_index, abs(float(np.linalg.det(cell))), len(sites), energy, stresses.get(relax_pk)))
+    for eos_resubmitted in resubmitted.values():
+        eos_resubmitted['volumes'].sort()
+    return resubmitted
+
+
+def stitch_resubmitted_volumes(records, resubmitted):
+    """Add the resubmitted volumes (see `get_resubmitted_volumes`) to the records of the failed EOS workflows.
+
+    The records are modified in place: the resubmitted volumes are appended to the surviving ones, and
+    `num_attempt_vols` is set to the number of volumes of the EOS workflow, so that the system is fitted
+    as usual by `process_record` if enough volumes are available.
+
+    :return: the list of the UUIDs of the EOS workflows whose records were modified.
+    """
+    stitched = []
+    for record in records:
+        eos_resubmitted = resubmitted.get(record['eos_workflow_uuid'])
+        if eos_resubmitted is None:
+            continue
+        if not ((record['process_state'] == 'finished' and record['exit_status'] != 0) or
+                (record['process_state'] == 'excepted')):
+            continue
+        for _, volume, num_atoms, energy, stress in eos_resubmitted['volumes']:
+            if record['num_atoms'] is None:
+                record['num_atoms'] = num_atoms
+            else:
+                assert record['num_atoms'] == num_atoms, (
+                    f"Number of atoms changes between structures for {record['element']} {record['configuration']}!"
+                )
+            record['volumes'].append(volume)
+            record['energies'].append(energy)
+            record['stresses'].append(stress)
+        record['num_attempt_vols'] = eos_resubmitted['num_scale_factors']
+        stitched.append(record['eos_workflow_uuid'])
+    return stitched
+
+
+def get_records(workflows_group_label, bulk=False, pks=None):
+    """Return the records of the EOS workflows in the group, either with bulk queries or node by node.
+
+    :param pks: if specified, only consider the workflows of the group with these PKs.
+    """
+    if bulk:
+        print(f"Fetching the data of the workflows in group '{workflows_group_label}'...")
+        return get_records_bulk(workflows_group_label, pks=pks)
 
     # Get all nodes in the output group (EOS workflows)
     group_node_query = orm.QueryBuilder().append(
-        orm.Group, filters={'label': WORKFLOWS_GROUP_LABEL}, tag='groups',
-    ).append(orm.Node, project='*', with_group='groups')
+        orm.Group, filters={'label': workflows_group_label}, tag='groups',
+    ).append(orm.Node, project='*', with_group='groups', filters={'id': {'in': list(pks)}} if pks is not None else {})
     group_node_query.distinct()
     wf_nodes = group_node_query.all(flat=True)
 
+    records = []
+    # Initialize the progress bar as a variable so we can dynamically set its description
+    progress_bar = tqdm.tqdm(wf_nodes)
+    for node in progress_bar:
+        structure = node.inputs.structure
+        # Set the progress bar description; using :16s to minimize length change of the description
+        description = f"{structure.extras['element']} {structure.extras['configuration']} ({structure.pk})"
+        progress_bar.set_description(f"{description:16s}")
+        progress_bar.refresh()
+        records.append(get_record_from_node(node))
+    return records
+
+
+def get_workflow_signatures(workflows_group_label):
+    """Return the signature of each EOS workflow in the group, used to know if it changed since the last extraction.
+
+    :return: a dictionary where the keys are the workflow PKs, and the values are dictionaries with the
+        ``uuid`` and the ``signature``, a list with process state, exit status and modification time of the node.
+    """
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': workflows_group_label}, tag='group')
+    query.append(
+        orm.ProcessNode, with_group='group',
+        project=['id', 'uuid', 'attributes.process_state', 'attributes.exit_status', 'mtime'])
+    return {
+        pk: {'uuid': uuid, 'signature': [process_state, exit_status, mtime.isoformat()]}
+        for pk, uuid, process_state, exit_status, mtime in query.iterall()
+    }
+
+
+def load_extraction_cache(fname):
+    """Load the extraction cache, a dictionary from EOS workflow UUIDs to their signature and record.
+
+    An empty cache is returned if the file does not exist, or if it was written by a different version of this script.
+    """
+    try:
+        with open(fname) as fhandle:
+            cache = json.load(fhandle)
+    except FileNotFoundError:
+        return {}
+    if cache.get('script_version') != __version__:
+        print(f"Ignoring the extraction cache '{fname}', written by a different version of the script.")
+        return {}
+    return cache['workflows']
+
+
+def save_extraction_cache(fname, workflows):
+    """Write the extraction cache (see `load_extraction_cache`) to file."""
+    with open(fname, 'w') as fhandle:
+        json.dump({'script_version': __version__, 'workflows': workflows}, fhandle)
+
+
+def get_workflow_pks(workflows_group_label):
+    """Return the sorted list of the PKs of the EOS workflows in the group."""
+    query = orm.QueryBuilder()
+    query.append(orm.Group, filters={'label': workflows_group_label}, tag='group')
+    query.append(orm.ProcessNode, with_group='group', project='id')
+    return sorted(query.all(flat=True))
+
+
+def split_into_shards(pks, num_shards):
+    """Split a list of PKs in (at most) `num_shards` contiguous shards of similar size, after sorting it."""
+    if not pks:
+        return []
+    num_shards = min(num_shards, len(pks))
+    return [[int(pk) for pk in shard] for shard in np.array_split(sorted(pks), num_shards)]
+
+
+def run_shard(shard_input, shard_output):
+    """Extract and fit the EOS workflows of one shard, writing the records and the fit results to file.
+
+    This is run by each of the worker processes started by `get_records_in_shards`.
+
+    :param shard_input: a JSON file with the `workflows_group_label`, the `pks` of the workflows and the `bulk` flag.
+    :param shard_output: the JSON file where the `records` and the `fit_results` are written.
+    """
+    with open(shard_input) as fhandle:
+        shard = json.load(fhandle)
+    records = get_records(shard['workflows_group_label'], bulk=shard['bulk'], pks=shard['pks'])
+    fit_results = {record['eos_workflow_uuid']: process_record(record) for record in records}
+    with open(shard_output, 'w') as fhandle:
+        json.dump({'records': records, 'fit_results': fit_results}, fhandle)
+
+
+def get_records_in_shards(workflows_group_label, num_workers, bulk=False, pks=None):
+    """Extract and fit the EOS workflows of the group in parallel, in `num_workers` separate processes.
+
+    The PKs of the workflows are split in contiguous shards, and each shard is processed (see `run_shard`)
+    by a new `verdi run` process of this script, that opens its own connection to the current AiiDA profile.
+    The shards are merged in PK order, so the results do not depend on the number of workers.
+
+    :param pks: if specified, only consider the workflows of the group with these PKs.
+    :return: a tuple ``(records, fit_results)`` with the records (sorted by PK), and a dictionary with the
+        result of `process_record` for each of them, with the UUIDs of the EOS workflows as keys.
+    """
+    if pks is None:
+        pks = get_workflow_pks(workflows_group_label)
+    shards = split_into_shards(pks, num_workers)
+    print(f"Extracting {len(pks)} workflows of group '{workflows_group_label}' with {len(shards)} worker processes...")
+
+    records = []
+    fit_results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        processes = []
+        for shard_index, shard_pks in enumerate(shards):
+            shard_input = os.path.join(folder, f'shard-{shard_index}-input.json')
+            shard_output = os.path.join(folder, f'shard-{shard_index}-output.json')
+            with open(shard_input, 'w') as fhandle:
+                json.dump({'workflows_group_label': workflows_group_label, 'pks': shard_pks, 'bulk': bulk}, fhandle)
+            command = [
+                'verdi', '-p', get_profile().name, 'run', os.path.realpath(__file__),
+                '--shard', shard_input, shard_output
+            ]
+            processes.append((subprocess.Popen(command), shard_output))
+
+        failed_shards = [shard_index for shard_index, (process, _) in enumerate(processes) if process.wait() != 0]
+        if failed_shards:
+            raise RuntimeError(f"The extraction failed for the shards {failed_shards}, see the output above.")
+
+        # Merge the shards in order: they are contiguous ranges of sorted PKs
+        for _, shard_output in processes:
+            with open(shard_output) as fhandle:
+                shard_data = json.load(fhandle)
+            records.extend(shard_data['records'])
+            fit_results.update(shard_data['fit_results'])
+
+    return records, fit_results
+
+
+def get_records_incremental(workflows_group_label, cache_fname, bulk=False, num_workers=1):
+    """Return the records of all EOS workflows in the group, only extracting those that changed since the last run.
+
+    A workflow is (re-)extracted if it is not in the cache, or if its process state, exit status or modification
+    time changed. The records of the other workflows are taken from the cache, that is then updated
+    (workflows that are no longer in the group are dropped from it).
+
+    :param num_workers: if larger than one, the workflows are extracted in parallel with `get_records_in_shards`.
+    :return: a tuple ``(records, fit_results)``, where `fit_results` are those of the workflows extracted
+        in parallel (see `get_records_in_shards`), and is empty otherwise.
+    """
+    cache = load_extraction_cache(cache_fname)
+    signatures = get_workflow_signatures(workflows_group_label)
+
+    to_extract = [
+        pk for pk, signature in signatures.items()
+        if cache.get(signature['uuid'], {}).get('signature') != signature['signature']
+    ]
+    print(
+        f"{len(signatures) - len(to_extract)} workflows unchanged since the last extraction, "
+        f"{len(to_extract)} to (re-)extract."
+    )
+
+    new_records = []
+    fit_results = {}
+    if to_extract and num_workers > 1:
+        new_records, fit_results = get_records_in_shards(
+            workflows_group_label, num_workers, bulk=bulk, pks=to_extract)
+    elif to_extract:
+        new_records = get_records(workflows_group_label, bulk=bulk, pks=to_extract)
+    for record in new_records:
+        cache[record['eos_workflow_uuid']] = {'record': record}
+
+    workflows = {}
+    for pk in sorted(signatures):
+        uuid = signatures[pk]['uuid']
+        workflows[uuid] = {'signature': signatures[pk]['signature'], 'record': cache[uuid]['record']}
+    save_extraction_cache(cache_fname, workflows)
+
+    records = [workflows[signatures[pk]['uuid']]['record'] for pk in sorted(signatures)]
+    return records, fit_results
+
+
+def process_record(record):
+    """Fit the EOS of a single system, and check if the workflow has enough volumes and is centred.
+
+    :param record: a dictionary as returned by `get_record_from_node` or `get_records_bulk`.
+    :return: a dictionary with the `eos_data`, `stress_data`, `BM_fit_data` and `num_atoms` of the system
+        (possibly None), whether it is listed as `failed`, the number of `missing_outputs` and the `completely_off`
+        side (None if not applicable), and the `warning_lines` generated for this system.
+        It only contains JSON-serializable values, so that it can be computed in a different process.
+    """
+    element = record['element']
+    configuration = record['configuration']
+
+    # Initialize to None if the outputs are not there
+    result = {
+        'eos_data': None,
+        'stress_data': None,
+        'BM_fit_data': None,
+        'num_atoms': record['num_atoms'],
+        'failed': False,
+        'missing_outputs': None,
+        'completely_off': None,
+        'warning_lines': [],
+    }
+
+    volumes = record['volumes']
+    energies = record['energies']
+    stresses = record['stresses']
+
+    if record['process_state'] == 'finished' and record['exit_status'] == 0:
+        pass
+    # For failed workflows, check if some volumes concluded succesfully, if more than 80% of vol are ok, go on with fit
+    elif (record['process_state'] == 'finished' and record['exit_status'] != 0) or (record['process_state'] == 'excepted'):
+        num_attempt_vols = record['num_attempt_vols']
+        if not num_attempt_vols or len(volumes)/float(num_attempt_vols) < 0.8:
+            # Not enough volumes, list the material as failed; eos_data, stress_data, BM_fit_data are still None
+            result['failed'] = True
+            # Exit = no fit attempted
+            return result
+        result['missing_outputs'] = num_attempt_vols-len(volumes)
+        result['warning_lines'].append(f"  WARNING! MISSING OUTPUTS: {num_attempt_vols-len(volumes)}")
+    # We return all None also for the case not covered by the two others if. For instance, fall here the materials still running.
+    else:
+        #print(element,configuration,"probably still running?")
+        # Exit = no fit attempted
+        return result
+
+    energies = [e for _, e in sorted(zip(volumes, energies))]
+    stresses = [s for _, s in sorted(zip(volumes, stresses), key=lambda vol_stress: vol_stress[0])]
+    volumes = sorted(volumes)
+    # List as I need to JSON-serialize it
+    result['eos_data'] = (np.array([volumes, energies]).T).tolist()
+    result['stress_data'] = [list(vol_stress) for vol_stress in zip(volumes, stresses)]
+
+    # Check if the central point was completely off (i.e. the minimum of the energies is
+    # on the very left or very right of the volume range)
+    min_loc = np.array(energies).argmin()
+    if min_loc == 0:
+        # Side is whether the minimum occurs on the left side (small volumes) or right side (large volumes)
+        result['completely_off'] = 'left'
+    elif min_loc == len(energies) - 1:
+        result['completely_off'] = 'right'
+
+    try:
+        # I need to pass a numpy array
+        min_volume, E0, bulk_modulus_internal, bulk_deriv, residuals = BM(np.array(result['eos_data']))
+        bulk_modulus_GPa = bulk_modulus_internal * echarge * 1.0e21
+        #1 eV/Angstrom3 = 160.21766208 GPa
+        bulk_modulus_ev_ang3 = bulk_modulus_GPa / 160.21766208
+        result['BM_fit_data'] = {
+            'min_volume': float(min_volume),
+            'E0': float(E0),
+            'bulk_modulus_ev_ang3': float(bulk_modulus_ev_ang3),
+            'bulk_deriv': float(bulk_deriv),
+            'residuals': float(residuals[0])
+        }
+        if residuals[0] > 1.e-3:
+            result['warning_lines'].append(
+                f"WARNING! High fit residuals: {residuals[0]} for {element} {configuration}")
+    except ValueError:
+        # If we cannot find a minimum
+        # Note that BM_fit_data was already set to None at the top
+        result['warning_lines'].append(f"WARNING! Unable to fit for {element} {configuration}")
+
+    return result
+
+
+# The fields of the results file that are dictionaries with the systems (e.g. "He-X2O") as keys
+SYSTEM_FIELDS = ['uuid_mapping', 'eos_data', 'stress_data', 'BM_fit_data', 'num_atoms_in_sim_cell']
+
+
+def pop_records(records):
+    """Yield the records of a list in order, removing each of them from the list, so that it can be freed."""
+    records.reverse()
+    while records:
+        yield records.pop()
+
+
+def process_records(records, set_name, fit_results=None, writer=None):
+    """Fit the EOS of all systems and assemble the content of the results JSON file.
+
+    :param records: a list of dictionaries as returned by `get_record_from_node` or `get_records_bulk`.
+    :param fit_results: an optional dictionary with the results of `process_record` already computed
+        (e.g. by `get_records_in_shards`), with the UUIDs of the EOS workflows as keys; the other records are
+        processed here.
+    :param writer: an optional `ResultsWriter`. If given, the per-system fields (see `SYSTEM_FIELDS`) of each system
+        are written to it as soon as the system is processed, followed by the summary fields at the end,
+        and the returned data only contains the summary fields. The `records` list and the `fit_results` are then
+        emptied while the systems are written, so that the memory does not grow with the size of the set.
+    :return: a tuple ``(data, warning_lines, stress_arrays)``, where `stress_arrays` contains the stresses of all
+        systems as contiguous arrays (see `get_stress_arrays`), also when they are streamed to the `writer`.
+    """
+    if fit_results is None:
+        fit_results = {}
+
     states = []
-    data_to_print = {}
     warning_lines = []
 
-    uuid_mapping = {}
     all_missing_outputs = {}
     completely_off = []
     failed_wfs = []
-    all_eos_data = {}
-    all_stress_data = {}
-    all_BM_fit_data = {}
-    num_atoms_in_sim_cell = {}
+    system_data = {field: {} for field in SYSTEM_FIELDS}
+    systems = set()
+    # The stresses are copied to the arrays as each system is processed, instead of keeping their nested lists
+    stress_arrays = StressArraysBuilder(
+        len(records), max((len(record['volumes']) for record in records), default=0))
 
-    # Initialize the progress bar as a variable so we can dynamically set its description
-    progress_bar = tqdm.tqdm(wf_nodes)
-    for node in progress_bar:
-        structure = node.inputs.structure
-        element = structure.extras['element']
-        configuration = structure.extras['configuration']
+    for record in (records if writer is None else pop_records(records)):
+        element = record['element']
+        configuration = record['configuration']
 
-        uuid_mapping[f'{element}-{configuration}'] = {
-            'structure': structure.uuid,
-            'eos_workflow': node.uuid
-        }
+        # Get the state (possibly adding the exit status if it's finished) and add to a list
+        states.append(get_state(record['process_state'], record['exit_status']))
 
-        # Set the progress bar description; using :16s to minimize length change of the description
-        description = f"{element} {configuration} ({structure.pk})"
-        progress_bar.set_description(f"{description:16s}")
-        progress_bar.refresh()
+        if writer is None:
+            result = fit_results.get(record['eos_workflow_uuid'])
+        else:
+            result = fit_results.pop(record['eos_workflow_uuid'], None)
+        if result is None:
+            result = process_record(record)
 
-        # Get the state (possibly adding the exit status if it's finished) and add to a list
-        state = node.process_state.value
-        if state == 'finished':
-            state = f'{state}.{node.exit_status}'
-        states.append(state)
-
-        # Initialize to None if the outputs are not there
-        eos_data = None
-        stress_data = None
-        BM_fit_data = None
-        num_atoms = None
-
-        volumes = []
-        energies = []
-        stresses = []
-
-        # For successfully finished workflows, collect the data from outputs
-        if node.process_state.value == 'finished' and node.exit_status == 0:
-            # Extract volumes and energies for this system
-            outputs = node.get_outgoing(link_type=LinkType.RETURN).nested()
-            for index, sub_structure in sorted(outputs['structures'].items()):
-                if num_atoms is None:
-                    num_atoms = len(sub_structure.sites)
-                else:
-                    assert num_atoms == len(sub_structure.sites), (
-                        f"Number of atoms changes between structures for {element} {configuration}!"
-                    )
-                volumes.append(sub_structure.get_cell_volume())
-                energy_node = outputs['total_energies'][index]
-                energies.append(energy_node.value)
-                parent_workflows_links = energy_node.get_incoming(link_type=LinkType.RETURN).all()
-                parent_workflows = [
-                    triple.node for triple in parent_workflows_links
-                    if issubclass(triple.node.process_class, CommonRelaxWorkChain)]
-                assert len(parent_workflows) == 1, "Error retrieving the parent Relax workflow!"
-                parent_workflow = parent_workflows[0]
-                try:
-                    stress = parent_workflow.outputs.stress.get_array('stress').tolist()
-                except AttributeError:
-                    stress = None
-                stresses.append(stress)
-        # For failed workflows, check if some volumes concluded succesfully, if more than 80% of vol are ok, go on with fit
-        elif (node.process_state.value == 'finished' and node.exit_status != 0) or (node.process_state.value == 'excepted'):
-            volumes,energies,stresses,num_atoms,num_attempt_vols = extract_from_failed(node)
-            if len(volumes)/float(num_attempt_vols) < 0.8:
-                # Not enough volumes, list the material as failed
-                failed_wfs.append({
-                    'element': element,
-                    'configuration': configuration,
-                    'process_state': node.process_state.value,
-                    'exit_status': node.exit_status,
-                })
-                # Return the info collected so far, eos_data, stress_data, BM_fit_data are still None
-                all_eos_data[f'{element}-{configuration}'] = eos_data
-                num_atoms_in_sim_cell[f'{element}-{configuration}'] = num_atoms
-                all_stress_data[f'{element}-{configuration}'] = stress_data
-                all_BM_fit_data[f'{element}-{configuration}'] = BM_fit_data
-                # Exit loop = no fit attempted
-                continue
-            all_missing_outputs[f'{element}-{configuration}'] = num_attempt_vols-len(volumes)
-            warning_lines.append(f"  WARNING! MISSING OUTPUTS: {num_attempt_vols-len(volumes)}")
-        # We return all None also for the case not covered by the two others if. For instance, fall here the materials still running.
+        if result['failed']:
+            failed_wfs.append({
+                'element': element,
+                'configuration': configuration,
+                'process_state': record['process_state'],
+                'exit_status': record['exit_status'],
+            })
+        if result['missing_outputs'] is not None:
+            all_missing_outputs[f'{element}-{configuration}'] = result['missing_outputs']
+        if result['completely_off'] is not None:
+            completely_off.append(
+                {'element': element, 'configuration': configuration, 'side': result['completely_off']})
+        warning_lines.extend(result['warning_lines'])
+
+        values = {
+            'uuid_mapping': {
+                'structure': record['structure_uuid'],
+                'eos_workflow': record['eos_workflow_uuid']
+            },
+            'eos_data': result['eos_data'],
+            'stress_data': result['stress_data'],
+            'BM_fit_data': result['BM_fit_data'],
+            'num_atoms_in_sim_cell': result['num_atoms'],
+        }
+        systems.add(f'{element}-{configuration}')
+        stress_arrays.add(f'{element}-{configuration}', result['stress_data'])
+        if writer is not None:
+            writer.write_system(f'{element}-{configuration}', values)
         else:
-            #print(element,configuration,"probably still running?")
-            all_eos_data[f'{element}-{configuration}'] = eos_data
-            num_atoms_in_sim_cell[f'{element}-{configuration}'] = num_atoms
-            all_stress_data[f'{element}-{configuration}'] = stress_data
-            all_BM_fit_data[f'{element}-{configuration}'] = BM_fit_data
-            # Exit loop = no fit attempted
-            continue
-        
-        energies = [e for _, e in sorted(zip(volumes, energies))]
-        volumes = sorted(volumes)
-        # List as I need to JSON-serialize it
-        eos_data = (np.array([volumes, energies]).T).tolist()
-        stress_data = list(zip(volumes, stresses))
-
-        # Check if the central point was completely off (i.e. the minimum of the energies is
-        # on the very left or very right of the volume range)
-        min_loc = np.array(energies).argmin()
-        if min_loc == 0:
-            # Side is whether the minimum occurs on the left side (small volumes) or right side (large volumes)
-            completely_off.append({'element': element, 'configuration': configuration, 'side': 'left'})
-        elif min_loc == len(energies) - 1:
-            completely_off.append({'element': element, 'configuration': configuration, 'side': 'right'})   
-
-        try:
-            # I need to pass a numpy array
-            min_volume, E0, bulk_modulus_internal, bulk_deriv, residuals = BM(np.array(eos_data))
-            bulk_modulus_GPa = bulk_modulus_internal * echarge * 1.0e21
-            #1 eV/Angstrom3 = 160.21766208 GPa
-            bulk_modulus_ev_ang3 = bulk_modulus_GPa / 160.21766208
-            data_to_print[(structure.extras['element'], structure.extras['configuration'])] = (
-                min_volume, E0, bulk_modulus_GPa, bulk_deriv)
-            BM_fit_data = {
-                'min_volume': min_volume,
-                'E0': E0,
-                'bulk_modulus_ev_ang3': bulk_modulus_ev_ang3,
-                'bulk_deriv': bulk_deriv,
-                'residuals': residuals[0]
-            }
-            if residuals[0] > 1.e-3:
-                warning_lines.append(f"WARNING! High fit residuals: {residuals[0]} for {structure.extras['element']} {structure.extras['configuration']}")
-        except ValueError:
-            # If we cannot find a minimum
-            # Note that BM_fit_data was already set to None at the top
-            warning_lines.append(f"WARNING! Unable to fit for {structure.extras['element']} {structure.extras['configuration']}")
-
-        all_eos_data[f'{element}-{configuration}'] = eos_data
-        num_atoms_in_sim_cell[f'{element}-{configuration}'] = num_atoms
-        all_stress_data[f'{element}-{configuration}'] = stress_data
-        all_BM_fit_data[f'{element}-{configuration}'] = BM_fit_data
+            for field, value in values.items():
+                system_data[field][f'{element}-{configuration}'] = value
 
     data = {
         'script_version': __version__,
-        'set_name': SET_NAME,
-        # Mapping from strings like "He-X2O" to a dictionary with the UUIDs of the structure and the EOS workflow
-        'uuid_mapping': uuid_mapping,
+        'set_name': set_name,
         # A list of dictionaries with information on the workchains that did not finish with a 0 exit code
         'failed_wfs': failed_wfs,
         # A dictionary that indicate for which elements and configurations there are missing outputs,
@@ -249,19 +800,26 @@ if __name__ == "__main__":
         # off-centre (meaning that the minimum of all computed energies is on either of the two edges, i.e. for
         # the smallest or largest volume)
         'completely_off': completely_off,
-        # Dictionary with the EOS data (volumes and energies datapoints). The keys are the same as the `uuid_mapping`.
-        # Values can be None.
-        'eos_data': all_eos_data,
-        'stress_data': all_stress_data,
-        # Birch-Murnaghan fit data. See above for the keys. Can be None.
-        'BM_fit_data': all_BM_fit_data,
-        'num_atoms_in_sim_cell': num_atoms_in_sim_cell
     }
+    if writer is not None:
+        writer.write_summary({key: value for key, value in data.items() if key not in ['script_version', 'set_name']})
+    else:
+        data.update({
+            # Mapping from strings like "He-X2O" to a dictionary with the UUIDs of the structure and the EOS workflow
+            'uuid_mapping': system_data['uuid_mapping'],
+            # Dictionary with the EOS data (volumes and energies datapoints). The keys are the same as the `uuid_mapping`.
+            # Values can be None.
+            'eos_data': system_data['eos_data'],
+            'stress_data': system_data['stress_data'],
+            # Birch-Murnaghan fit data. See above for the keys. Can be None.
+            'BM_fit_data': system_data['BM_fit_data'],
+            'num_atoms_in_sim_cell': system_data['num_atoms_in_sim_cell'],
+        })
 
     # Print some statistics on the results
     warning_lines.append("")
     warning_lines.append("Counter of states: " + str(Counter(states)))
-    good_cnt = len([eos_data for eos_data in data['eos_data'] if eos_data is not None])
+    good_cnt = len(systems)
     warning_lines.append("")
     warning_lines.append(f"Minimum completely off for {len(completely_off)}/{good_cnt}")
     warning_lines.append("Completely off systems (symbol indicates if the minimum is on the very left or right):")
@@ -271,6 +829,89 @@ if __name__ == "__main__":
             f"({'<' if system['side'] == 'left' else '>'})"
         )
 
+    return data, warning_lines, stress_arrays.get_stress_arrays()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract and fit the EOS results of all workflows of a set.")
+    parser.add_argument(
+        'set_name', nargs='?', help="The set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
+    parser.add_argument(
+        '--bulk', action='store_true',
+        help="Fetch the data of all workflows with a few projected queries, instead of walking each workflow "
+        "node by node (much faster on large groups)")
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Only extract the workflows that are new or changed (state, exit status or modification time) "
+        "since the last run, reusing the others from the on-disk extraction cache in the `outputs` folder")
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Extract and fit the workflows in this number of parallel processes, each with its own connection "
+        "to the AiiDA profile (default: 1, i.e. no parallelization)")
+    parser.add_argument(
+        '--stream', action='store_true',
+        help="Write each system to the results file as soon as it is processed, in a compact format with one "
+        "line per system (`results-*.jsonl`), instead of an indented JSON file written at the end")
+    parser.add_argument(
+        '--compress', action='store_true', help="Compress the streamed results file with gzip (`results-*.jsonl.gz`)")
+    parser.add_argument(
+        '--resubmitted-volumes', action='store_true',
+        help="Add to the failed EOS workflows the volumes resubmitted with `launch_calculations_*.py "
+        "--missing-volumes` (the relax workflows in the group `<WORKFLOWS_GROUP_LABEL>/volumes`)")
+    # Internal: used by `get_records_in_shards` to run a worker process on one shard of the workflows
+    parser.add_argument('--shard', nargs=2, metavar=('INPUT', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.shard is not None:
+        run_shard(*args.shard)
+        sys.exit(0)
+    if args.set_name is None:
+        parser.error("the set_name argument is required")
+    if args.workers < 1:
+        parser.error("the number of workers must be at least 1")
+    if args.compress and not args.stream:
+        parser.error("--compress can only be used together with --stream")
+    SET_NAME = args.set_name
+
+    STRUCTURES_GROUP_LABEL = f'acwf-verification/{SET_NAME}/structures/{PLUGIN_NAME}'
+    WORKFLOWS_GROUP_LABEL = f'acwf-verification/{SET_NAME}/workflows/{PLUGIN_NAME}'
+
+    os.makedirs('outputs', exist_ok=True)
+    fit_results = {}
+    if args.incremental:
+        records, fit_results = get_records_incremental(
+            WORKFLOWS_GROUP_LABEL, cache_fname=f"outputs/extraction-cache-{SET_NAME}-{PLUGIN_NAME}.json",
+            bulk=args.bulk, num_workers=args.workers)
+    elif args.workers > 1:
+        records, fit_results = get_records_in_shards(WORKFLOWS_GROUP_LABEL, args.workers, bulk=args.bulk)
+    else:
+        records = get_records(WORKFLOWS_GROUP_LABEL, bulk=args.bulk)
+
+    if args.resubmitted_volumes:
+        # This is done after the extraction, so that the extraction cache only contains the EOS workflows themselves
+        stitched = stitch_resubmitted_volumes(records, get_resubmitted_volumes(f'{WORKFLOWS_GROUP_LABEL}/volumes'))
+        print(f"Resubmitted volumes added to {len(stitched)} failed EOS workflows.")
+        for uuid in stitched:
+            fit_results.pop(uuid, None)
+
+    # Remove the results file of a previous run in a different format, so that readers do not find stale data
+    results_basename = f"outputs/results-{SET_NAME}-{PLUGIN_NAME}"
+    if args.stream:
+        results_fname = results_basename + STREAM_EXTENSIONS[1 if args.compress else 0]
+    else:
+        results_fname = results_basename + '.json'
+    for extension in ['.json'] + STREAM_EXTENSIONS:
+        if results_basename + extension != results_fname and os.path.exists(results_basename + extension):
+            print(f"Removing the results file '{results_basename + extension}' of a previous run.")
+            os.remove(results_basename + extension)
+
+    if args.stream:
+        with ResultsWriter(results_fname, __version__, SET_NAME, SYSTEM_FIELDS) as writer:
+            data, warning_lines, stress_arrays = process_records(
+                records, SET_NAME, fit_results=fit_results, writer=writer)
+    else:
+        data, warning_lines, stress_arrays = process_records(records, SET_NAME, fit_results=fit_results)
+
     fname = f"outputs/warnings-{SET_NAME}-{PLUGIN_NAME}.txt"
     with open(fname, 'w') as fhandle:
         for line in warning_lines:
@@ -278,9 +919,13 @@ if __name__ == "__main__":
             print(line)
     print(f"Warning log written to: '{fname}'.")
 
-    # Output results to file
-    os.makedirs('outputs', exist_ok=True)
-    fname = f"outputs/results-{SET_NAME}-{PLUGIN_NAME}.json"
-    with open(fname, 'w') as fhandle:
-        json.dump(data, fhandle, indent=2, sort_keys=True)
-    print(f"Output results written to: '{fname}'.")
+    # Output results to file (if not already streamed)
+    if not args.stream:
+        with open(results_fname, 'w') as fhandle:
+            json.dump(data, fhandle, indent=2, sort_keys=True)
+    print(f"Output results written to: '{results_fname}'.")
+
+    # The same stresses of the `stress_data` field, as contiguous arrays
+    fname = f"outputs/stresses-{SET_NAME}-{PLUGIN_NAME}.npz"
+    save_stress_arrays(fname, stress_arrays)
+    print(f"Stress arrays written to: '{fname}'.")
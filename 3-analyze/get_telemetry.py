@@ -0,0 +1,222 @@
+#!/usr/bin/env runaiida
+import argparse
+import csv
+import datetime
+import json
+import os
+
+import numpy as np
+
+from eos_utils.calcjobs import get_eos_calcjobs
+
+from aiida import orm
+
+
+def get_plugin_name():
+    file_name = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        os.pardir, 'plugin_name.txt'
+    )
+    try:
+        with open(file_name) as fhandle:
+            plugin_name = fhandle.read().strip()
+            # Simple check e.g. to make sure there are no weird characters,
+            # newlines, ... - one might still make a typo, but at least we
+            # do a basic check
+            assert plugin_name.isidentifier()
+        return plugin_name
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            "You need to define a file `../plugin_name.txt`, containing the "
+            "name of your plugin (siesta, quantum_espresso, ...) in the format "
+            "expected by the aiida-common-workflows project"
+        ) from exc
+
+PLUGIN_NAME = get_plugin_name()
+
+# Keys of the `output_parameters` of the calculations with the number of SCF iterations, and with the memory (with the
+# key of its units), tried in order; add those of your code if they are not here
+SCF_ITERATIONS_KEYS = ['total_number_of_scf_iterations', 'convergence_info.scf_conv.n_scf_steps']
+MEMORY_KEYS = [('estimated_ram_per_process', 'estimated_ram_per_process_units')]
+# Factors to convert the memory to MB
+MEMORY_UNITS = {'Mb': 1., 'MB': 1., 'GB': 1024.}
+# The columns of the file with one line per calculation (the first ones are those read by
+# `2-submit/simulate_campaign.py --csv`)
+CALCJOB_COLUMNS = [
+    'element', 'configuration', 'wallclock_seconds', 'num_machines', 'failed', 'volume_index', 'calcjob_pk',
+    'eos_workflow_pk', 'num_cores', 'core_hours', 'scf_iterations', 'memory_mb', 'queue_wait_seconds'
+]
+# The date format of the serialized `last_job_info` of the calculations
+JOB_INFO_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def get_job_info_seconds(start, end):
+    """Return the seconds between two serialized dates of a `last_job_info`, or None if any of them is missing."""
+    if not start or not end:
+        return None
+    start = datetime.datetime.strptime(start, JOB_INFO_DATE_FORMAT)
+    end = datetime.datetime.strptime(end, JOB_INFO_DATE_FORMAT)
+    return (end - start).total_seconds()
+
+
+def get_output_parameters(calcjob_pks):
+    """Return the number of SCF iterations and the memory (in MB) of the calculations, with a single query.
+
+    The values are read from the `output_parameters` (see `SCF_ITERATIONS_KEYS` and `MEMORY_KEYS`).
+
+    :return: a dictionary with the PKs of the calculations that have `output_parameters` as keys, and as values a
+        tuple ``(scf_iterations, memory_mb)`` (with None where the value is not available).
+    """
+    if not calcjob_pks:
+        return {}
+    query = orm.QueryBuilder()
+    query.append(orm.CalcJobNode, filters={'id': {'in': list(calcjob_pks)}}, project='id', tag='calc')
+    query.append(orm.Dict, with_incoming='calc', edge_filters={'label': 'output_parameters'}, project=[
+        f'attributes.{key}' for key in SCF_ITERATIONS_KEYS
+    ] + [f'attributes.{key}' for memory_keys in MEMORY_KEYS for key in memory_keys])
+
+    output_parameters = {}
+    for calcjob_pk, *values in query.iterall():
+        scf_iterations = next(
+            (value for value in values[:len(SCF_ITERATIONS_KEYS)] if value is not None), None)
+        memory_mb = None
+        for index in range(len(MEMORY_KEYS)):
+            memory, units = values[len(SCF_ITERATIONS_KEYS) + 2 * index:len(SCF_ITERATIONS_KEYS) + 2 * index + 2]
+            if memory is not None and units in MEMORY_UNITS:
+                memory_mb = memory * MEMORY_UNITS[units]
+                break
+        output_parameters[calcjob_pk] = (scf_iterations, memory_mb)
+    return output_parameters
+
+
+def get_calcjobs(workflows_group_label):
+    """Return the telemetry of all calculations run by the EOS workflows of the group.
+
+    The calculations are found following the CALL links from the relax sub-workflows (see `eos_utils/calcjobs.py`),
+    with a few queries for the whole group, and their output parameters are fetched with one more query.
+
+    :return: a list of dictionaries with the keys of `CALCJOB_COLUMNS` (None where a value is not available),
+        sorted by system, volume index and PK.
+    """
+    relax_workflows, results = get_eos_calcjobs(workflows_group_label, projections=[
+        'attributes.process_state', 'attributes.exit_status', 'attributes.resources.num_machines',
+        'attributes.resources.num_mpiprocs_per_machine', 'attributes.last_job_info.num_mpiprocs',
+        'attributes.last_job_info.wallclock_time_seconds', 'attributes.last_job_info.submission_time.date',
+        'attributes.last_job_info.dispatch_time.date'
+    ])
+    output_parameters = get_output_parameters([result[1] for result in results])
+
+    calcjobs = []
+    for (
+        relax_pk, calc_pk, process_state, exit_status, num_machines, num_mpiprocs_per_machine, num_mpiprocs,
+        wallclock, submission_time, dispatch_time
+    ) in results:
+        relax_workflow = relax_workflows[relax_pk]
+        num_cores = num_mpiprocs
+        if num_machines is not None and num_mpiprocs_per_machine is not None:
+            num_cores = num_machines * num_mpiprocs_per_machine
+        scf_iterations, memory_mb = output_parameters.get(calc_pk, (None, None))
+        calcjobs.append({
+            'element': relax_workflow['element'],
+            'configuration': relax_workflow['configuration'],
+            'wallclock_seconds': wallclock,
+            'num_machines': num_machines,
+            'failed': int(not (process_state == 'finished' and exit_status == 0)),
+            'volume_index': relax_workflow['volume_index'],
+            'calcjob_pk': calc_pk,
+            'eos_workflow_pk': relax_workflow['eos_pk'],
+            'num_cores': num_cores,
+            'core_hours': wallclock * num_cores / 3600 if wallclock is not None and num_cores else None,
+            'scf_iterations': scf_iterations,
+            'memory_mb': memory_mb,
+            'queue_wait_seconds': get_job_info_seconds(submission_time, dispatch_time),
+        })
+    return sorted(calcjobs, key=lambda calcjob: (
+        calcjob['element'], calcjob['configuration'], calcjob['volume_index'], calcjob['calcjob_pk']))
+
+
+def summarize(calcjobs):
+    """Return a summary of the telemetry of a list of calculations (as returned by `get_calcjobs`).
+
+    The means and maxima only include the calculations where the value is available (None if there are none).
+    """
+    def get_values(key):
+        return [calcjob[key] for calcjob in calcjobs if calcjob[key] is not None]
+
+    def get_mean(key):
+        values = get_values(key)
+        return float(np.mean(values)) if values else None
+
+    def get_max(key):
+        values = get_values(key)
+        return max(values) if values else None
+
+    return {
+        'num_calcjobs': len(calcjobs),
+        'num_failed': sum(calcjob['failed'] for calcjob in calcjobs),
+        'core_hours': sum(get_values('core_hours')),
+        'wallclock_seconds_mean': get_mean('wallclock_seconds'),
+        'wallclock_seconds_max': get_max('wallclock_seconds'),
+        'scf_iterations_mean': get_mean('scf_iterations'),
+        'scf_iterations_max': get_max('scf_iterations'),
+        'memory_mb_max': get_max('memory_mb'),
+        'queue_wait_seconds_mean': get_mean('queue_wait_seconds'),
+        'queue_wait_seconds_max': get_max('queue_wait_seconds'),
+    }
+
+
+def summarize_by(calcjobs, get_key):
+    """Return a dictionary with the summary (see `summarize`) of the calculations grouped by `get_key(calcjob)`."""
+    groups = {}
+    for calcjob in calcjobs:
+        groups.setdefault(get_key(calcjob), []).append(calcjob)
+    return {key: summarize(group) for key, group in sorted(groups.items())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collect the telemetry (wallclock, SCF iterations, memory, queue wait) of all the calculations of "
+        "the EOS workflows of a set.")
+    parser.add_argument(
+        'set_name', help="The set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
+    parser.add_argument(
+        '--top', type=int, default=10, help="The number of most expensive systems to print (default: 10)")
+    args = parser.parse_args()
+    SET_NAME = args.set_name
+
+    WORKFLOWS_GROUP_LABEL = f'acwf-verification/{SET_NAME}/workflows/{PLUGIN_NAME}'
+
+    calcjobs = get_calcjobs(WORKFLOWS_GROUP_LABEL)
+    systems = summarize_by(calcjobs, lambda calcjob: f"{calcjob['element']}-{calcjob['configuration']}")
+    total = summarize(calcjobs)
+    data = {
+        'total': total,
+        'systems': systems,
+        'by_element': summarize_by(calcjobs, lambda calcjob: calcjob['element']),
+        'by_configuration': summarize_by(calcjobs, lambda calcjob: calcjob['configuration']),
+        'by_volume_index': summarize_by(calcjobs, lambda calcjob: calcjob['volume_index']),
+    }
+
+    os.makedirs('outputs', exist_ok=True)
+    fname = f"outputs/telemetry-calcjobs-{SET_NAME}-{PLUGIN_NAME}.csv"
+    with open(fname, 'w', newline='') as fhandle:
+        writer = csv.DictWriter(fhandle, fieldnames=CALCJOB_COLUMNS)
+        writer.writeheader()
+        writer.writerows(calcjobs)
+    print(f"'{fname}' written.")
+    fname = f"outputs/telemetry-{SET_NAME}-{PLUGIN_NAME}.json"
+    with open(fname, 'w') as fhandle:
+        json.dump(data, fhandle, indent=2)
+    print(f"'{fname}' written.")
+
+    print()
+    print(f"{total['num_calcjobs']} calculations ({total['num_failed']} failed) of {len(systems)} systems, "
+          f"{total['core_hours']:.0f} core-hours")
+    print("Most expensive systems:")
+    for system, summary in sorted(systems.items(), key=lambda item: -item[1]['core_hours'])[:args.top]:
+        fraction = summary['core_hours'] / total['core_hours'] if total['core_hours'] else 0.
+        line = (f"- {system}: {summary['core_hours']:.0f} core-hours ({fraction:.1%}), {summary['num_calcjobs']} "
+                f"calculations ({summary['num_failed']} failed)")
+        if summary['scf_iterations_max'] is not None:
+            line += f", max {summary['scf_iterations_max']} SCF iterations"
+        print(line)
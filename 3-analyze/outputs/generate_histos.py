@@ -1,14 +1,13 @@
 #!/usr/bin/env python
-import json
 import os
 import sys
 
 import numpy as np
 import pylab as pl
 from scipy.optimize import curve_fit
-import tqdm
 
 import quantities_for_comparison as qc
+from eos_utils.results_io import load_results
 
 # Adapt this factor to change the zoom on the x axis
 # The default zoom is obtained from the standard deviation of the data
@@ -85,8 +84,7 @@ if __name__ == "__main__":
         sys.exit(1)
     
     try:
-        with open(f'results-{SET_NAME}-{PLUGIN_NAME}.json') as fhandle:
-            reference_plugin_data = json.load(fhandle)
+        reference_plugin_data = load_results(f'results-{SET_NAME}-{PLUGIN_NAME}.json')
     except OSError:
         print(f"No data found for your plugin '{PLUGIN_NAME}' (set '{SET_NAME}'). Did you run `./get_results.py` first?")
         sys.exit(1)
@@ -102,8 +100,7 @@ if __name__ == "__main__":
     compare_plugin_data = []
     for compare_with in all_args:
         try:
-            with open(f'results-{SET_NAME}-{compare_with}.json') as fhandle:
-                compare_plugin_data.append(json.load(fhandle))
+            compare_plugin_data.append(load_results(f'results-{SET_NAME}-{compare_with}.json'))
             if not compare_plugin_data[-1]['script_version'] in EXPECTED_SCRIPT_VERSION:
                 raise ValueError(
                     f"This script only works with data generated at version {EXPECTED_SCRIPT_VERSION}. "
@@ -115,10 +112,6 @@ if __name__ == "__main__":
 
     name_file = f'histo-{QUANTITY}-{SET_NAME}-{PLUGIN_NAME}.pdf'
 
-    all_systems = set(reference_plugin_data['eos_data'].keys())
-    all_systems = set(reference_plugin_data['BM_fit_data'].keys())
-    #all_systems.update(compare_plugin_data['BM_fit_data'].keys())
-
     # Plotting
     fig = pl.figure(figsize=(18,6))
 
@@ -137,80 +130,26 @@ if __name__ == "__main__":
     
     for index, compare_plugin in enumerate(compare_plugin_data):
 
-        collect = []
-
         print(f"comparing with {all_args[index]}")
-        progress_bar = tqdm.tqdm(sorted(all_systems))
-        for element_and_configuration in progress_bar:
-            progress_bar.set_description(f"{element_and_configuration:12s}")
-            progress_bar.refresh()
-
-            element, configuration = element_and_configuration.split('-')
-            # Get the data for the reference plugin
-            ref_BM_fit_data = reference_plugin_data['BM_fit_data'][f'{element}-{configuration}']
-        
-            if ref_BM_fit_data is None:
-                continue
-       
-            scaling_factor_ref = qc.get_volume_scaling_to_formula_unit(
-                    reference_plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}'],
-                    element, configuration
-                )
-
-            V0=ref_BM_fit_data['min_volume']/scaling_factor_ref
-            B0=ref_BM_fit_data['bulk_modulus_ev_ang3']
-            B01=ref_BM_fit_data['bulk_deriv']
-
-            # Get the data for the compare_with plugin, if specified (and if the EOS worked for the 
-            # reference plugin, otherwise we don't know which E0 to use)
-            try:
-                compare_BM_fit_data = compare_plugin['BM_fit_data'][f'{element}-{configuration}']
-                if compare_BM_fit_data is None:
-                    # No fitting data in the plugin to compare with.
-                    # Raise this exception that is catched one line below, so
-                    # it will set `compare_eos_fit_energy` to None.
-                    raise KeyError                    
-            except KeyError:
-                # Set to None if fit data is missing (if we are here, the EOS points
-                # are there, so it means that the fit failed). I will still plot the
-                # points
-                continue
-
-            scaling_factor_comp = qc.get_volume_scaling_to_formula_unit(
-                    compare_plugin['num_atoms_in_sim_cell'][f'{element}-{configuration}'],
-                    element, configuration
-                )
-
-            CV0=compare_BM_fit_data['min_volume']/scaling_factor_comp
-            CB0=compare_BM_fit_data['bulk_modulus_ev_ang3']
-            CB01=compare_BM_fit_data['bulk_deriv']
-
-            quant = quantity_for_comparison_map[QUANTITY](V0,B0,B01,CV0,CB0,CB01,DEFAULT_PREFACTOR,DEFAULT_wb0,DEFAULT_wb1)
-
-            collect.append(quant)
-
-        mini = min(collect)
+        # Compute the quantity for all systems with a fit in both plugins at once
+        _, ref_params, compare_params = qc.get_common_fit_parameters(reference_plugin_data, compare_plugin)
+        collect = quantity_for_comparison_map[QUANTITY](
+            *ref_params, *compare_params, DEFAULT_PREFACTOR, DEFAULT_wb0, DEFAULT_wb1)
+
+        mini = collect.min()
 
         if mini > -0.001:
-            sta_dev=np.sqrt(np.mean(np.array(collect)**2)) / X_ZOOM_FACTOR
+            sta_dev=np.sqrt(np.mean(collect**2)) / X_ZOOM_FACTOR
             hist_y, bins, patches = pl.hist(collect, bins=BINS, range=[0, sta_dev], label=f"{all_args[index]}", alpha=0.5)
-            countBig = 0
-            for alls in collect:
-                if alls > sta_dev:
-                    countBig = countBig + 1
+            countBig = int((collect > sta_dev).sum())
             if countBig > 0:
                 pl.annotate(f"{countBig} more for {all_args[index]}", xy=(pl.xlim()[1], (pl.ylim()[1]-pl.ylim()[0])/2/(index+1)), xytext=(pl.xlim()[1]-0.5*sta_dev, (pl.ylim()[1]-pl.ylim()[0])/2/(index+1)), arrowprops=dict(facecolor='black', shrink=0.05))
 
         else:
-            sta_dev = np.std(np.array(collect)) / X_ZOOM_FACTOR
+            sta_dev = np.std(collect) / X_ZOOM_FACTOR
             hist_y, bins, patches = pl.hist(collect, bins=BINS, range=[-2*sta_dev, 2*sta_dev], label=f"{all_args[index]}", alpha=0.5)
-            countBig = 0
-            countSmall = 0
-            for alls in collect:
-                if alls > 2*sta_dev:
-                    countBig = countBig + 1
-                if alls < -2*sta_dev:
-                    countSmall = countSmall + 1
+            countBig = int((collect > 2*sta_dev).sum())
+            countSmall = int((collect < -2*sta_dev).sum())
             if countBig > 0:
                 pl.annotate(f"{countBig} more for {all_args[index]}", xy=(pl.xlim()[1], (pl.ylim()[1]-pl.ylim()[0])/2/(index+1)), xytext=(pl.xlim()[1]-1.5*sta_dev, (pl.ylim()[1]-pl.ylim()[0])/2/(index+1)), arrowprops=dict(facecolor='black', shrink=0.05))
             if countSmall:
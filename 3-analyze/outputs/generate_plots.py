@@ -1,12 +1,18 @@
 #!/usr/bin/env python
+import hashlib
 import json
+import multiprocessing
 import os
 import sys
 
+import matplotlib
+# Plots are only written to file: use a non-interactive backend (also in the worker processes)
+matplotlib.use('Agg')
 import numpy as np
 import pylab as pl
 import tqdm
 
+from eos_utils.results_io import find_results_file, get_stress_arrays, load_results, load_stress_arrays
 from quantities_for_comparison import birch_murnaghan, get_volume_scaling_to_formula_unit
 
 def get_plugin_name():
@@ -33,6 +39,19 @@ PLUGIN_NAME = get_plugin_name()
 
 EXPECTED_SCRIPT_VERSION = ['0.0.3','0.0.4']
 RESIDUALS_THRESHOLD = 1.e-3
+# File in the plot folder with the hash of the inputs of each plot, to skip the systems that did not change
+PLOT_HASHES_FILENAME = 'plot-hashes.json'
+
+LIGHTYELLOW = (255/255, 244/255, 214/255)
+LIGHTORANGE = (255/255, 205/255, 171/255)
+LIGHTGREEN = (144/255, 238/255, 144/255)
+
+# Changes to this script also change the plots
+with open(os.path.realpath(__file__), 'rb') as fhandle:
+    SCRIPT_HASH = hashlib.sha256(fhandle.read()).hexdigest()
+
+# Figures reused for all the plots of this process, one for each layout (with and without the stress panel)
+FIGURES = {}
 
 def get_conf_nice(configuration_string):
     """Convert the configuration string to a nicely typeset string in LaTeX."""
@@ -45,21 +64,284 @@ def get_conf_nice(configuration_string):
     return "".join(ret_pieces)
 
 
+def get_stress_fits(stress_arrays, num_atoms_in_sim_cell):
+    """Compute the volumetric stresses of all systems, and fit them to find the volume at zero stress.
+
+    All systems are processed at once with array operations on the (NaN-padded) stress arrays.
+
+    :param stress_arrays: the stresses of all systems, as returned by `get_stress_arrays` or `load_stress_arrays`
+    :param num_atoms_in_sim_cell: the number of atoms in the simulation cell of each system
+    :return: a dictionary with the systems that have at least one stress as keys, and as values a dictionary with
+        the `volumes` (per formula unit) and the `hydro_stresses_GPa` of the volumes with a stress (lists), the
+        coefficients [a, b, c] of the quadratic `fit` a V^2 + b V + c of the stress, and the `zero_stress_volume`,
+        the solution of the fit within the volume range (the larger one if none is in the range).
+        `fit` is None if there are less than three stresses, `zero_stress_volume` also if the fit has no zero.
+    """
+    systems = stress_arrays['systems']
+    scalings = np.array([
+        get_volume_scaling_to_formula_unit(num_atoms_in_sim_cell[system], *system.split('-')) for system in systems
+    ]).reshape(len(systems), 1)
+    volumes = stress_arrays['volumes'] / scalings
+    #1 eV/Angstrom3 = 160.21766208 GPa
+    hydro_stresses_GPa = 160.21766208 * np.trace(stress_arrays['stresses'], axis1=2, axis2=3) / 3
+    has_stress = ~np.isnan(hydro_stresses_GPa)
+    num_stresses = has_stress.sum(axis=1)
+
+    # Quadratic least-squares fit of each system (the linear one is typically not enough), solving the normal
+    # equations for the volumes centered and scaled to [-1, 1], to keep them well conditioned
+    with np.errstate(invalid='ignore', divide='ignore'):
+        min_volumes = np.where(has_stress, volumes, np.inf).min(axis=1)
+        max_volumes = np.where(has_stress, volumes, -np.inf).max(axis=1)
+        centers = (max_volumes + min_volumes) / 2
+        half_widths = (max_volumes - min_volumes) / 2
+        x = np.where(has_stress, (volumes - centers[:, np.newaxis]) / half_widths[:, np.newaxis], 0.)
+        y = np.where(has_stress, hydro_stresses_GPa, 0.)
+        powers = np.stack([x**2, x, has_stress.astype(float)], axis=-1)
+        can_fit = (num_stresses >= 3) & (half_widths > 0)
+        coeffs_x = np.full((len(systems), 3), np.nan)
+        if can_fit.any():
+            # The right-hand sides are passed as (s, 3, 1) stacks of column vectors: NumPy >= 2 no longer treats
+            # a (s, 3) array as a stack of vectors
+            coeffs_x[can_fit] = np.linalg.solve(
+                np.einsum('svi,svj->sij', powers[can_fit], powers[can_fit]),
+                np.einsum('svi,sv->si', powers[can_fit], y[can_fit])[..., np.newaxis]
+            )[..., 0]
+
+        # Back to the coefficients of a V^2 + b V + c
+        a = coeffs_x[:, 0] / half_widths**2
+        b = coeffs_x[:, 1] / half_widths - 2 * a * centers
+        c = coeffs_x[:, 2] - coeffs_x[:, 1] * centers / half_widths + a * centers**2
+
+        # The quadratic fit leads to two solutions for zero stress, we choose the one within the volume range
+        zero_stress_sol_1 = (-b - np.sqrt(b**2 - 4 * a * c))/2/a
+        zero_stress_sol_2 = (-b + np.sqrt(b**2 - 4 * a * c))/2/a
+        zero_stress_volumes = np.where(
+            (zero_stress_sol_1 < max_volumes) & (zero_stress_sol_1 > min_volumes), zero_stress_sol_1, zero_stress_sol_2)
+
+    stress_fits = {}
+    for idx, system in enumerate(systems):
+        if not num_stresses[idx]:
+            continue
+        stress_fits[system] = {
+            'volumes': volumes[idx, has_stress[idx]].tolist(),
+            'hydro_stresses_GPa': hydro_stresses_GPa[idx, has_stress[idx]].tolist(),
+            'fit': [float(a[idx]), float(b[idx]), float(c[idx])] if can_fit[idx] else None,
+            'zero_stress_volume': (
+                float(zero_stress_volumes[idx]) if can_fit[idx] and np.isfinite(zero_stress_volumes[idx]) else None),
+        }
+    return stress_fits
+
+
+def get_plot_inputs(element_and_configuration, reference_plugin_data, compare_plugin_data, stress_fits):
+    """Return all the data needed to plot a system, or None if the system has no EOS data to plot.
+
+    These (JSON-serializable) inputs are all that is passed to `plot_system`, and their hash decides
+    whether the plot needs to be generated again.
+
+    :param stress_fits: the stresses and their fits for all systems, as returned by `get_stress_fits`
+    """
+    try:
+        eos_data = reference_plugin_data['eos_data'][element_and_configuration]
+    except KeyError:
+        # If this system does not exist in the reference data, skip it
+        return None
+    if eos_data is None:
+        # If there is no data, I skip this material
+        return None
+
+    compare_BM_fit_data = None
+    compare_num_atoms = None
+    if compare_plugin_data is not None:
+        compare_BM_fit_data = compare_plugin_data['BM_fit_data'].get(element_and_configuration)
+        compare_num_atoms = compare_plugin_data['num_atoms_in_sim_cell'].get(element_and_configuration)
+
+    return {
+        'element_and_configuration': element_and_configuration,
+        'eos_data': eos_data,
+        'num_atoms': reference_plugin_data['num_atoms_in_sim_cell'][element_and_configuration],
+        'BM_fit_data': reference_plugin_data['BM_fit_data'].get(element_and_configuration),
+        'compare_BM_fit_data': compare_BM_fit_data,
+        'compare_num_atoms': compare_num_atoms,
+        'stress_fit': stress_fits.get(element_and_configuration),
+        'missing_outputs': bool(reference_plugin_data["missing_outputs"]) and (
+            element_and_configuration in reference_plugin_data['missing_outputs']),
+    }
+
+
+def get_plot_hash(plot_inputs, compare_with):
+    """Return a hash of everything that determines a plot: its inputs, the plugins and this script itself."""
+    return hashlib.sha256(json.dumps(
+        [plot_inputs, PLUGIN_NAME, compare_with, SCRIPT_HASH], sort_keys=True
+    ).encode('utf-8')).hexdigest()
+
+
+def get_plot_filename(plot_folder, element_and_configuration):
+    element, configuration = element_and_configuration.split('-')
+    return f"{plot_folder}/{element}-{configuration.replace('/', '_')}.pdf"
+
+
+def get_figure(with_stress):
+    """Return the figure and axes (stress_ax, eos_ax) for a plot, cleared; stress_ax is None without stresses.
+
+    The figures are created once per process, and then reused for all plots with the same layout.
+    """
+    if with_stress not in FIGURES:
+        if with_stress:
+            fig, (stress_ax, eos_ax) = pl.subplots(nrows=2, ncols=1, gridspec_kw={'height_ratios': [1, 2], 'left': 0.15, 'right': 0.95}, sharex=True)
+        else:
+            # Only EOS panel
+            fig, eos_ax = pl.subplots(nrows=1, ncols=1, gridspec_kw={'left': 0.15, 'right': 0.95})
+            stress_ax = None
+        FIGURES[with_stress] = (fig, stress_ax, eos_ax)
+
+    fig, stress_ax, eos_ax = FIGURES[with_stress]
+    for ax in fig.axes:
+        ax.clear()
+        ax.set_facecolor(pl.rcParams['axes.facecolor'])
+    if stress_ax is not None:
+        # Clearing the axes shows again the tick labels hidden by `sharex`
+        stress_ax.label_outer()
+    return fig, stress_ax, eos_ax
+
+
+def plot_system(plot_inputs, compare_with, plot_folder):
+    """Plot the EOS (and stresses, if available) of a system, from the inputs returned by `get_plot_inputs`."""
+    element_and_configuration = plot_inputs['element_and_configuration']
+    element, configuration = element_and_configuration.split('-')
+    scaling_ref_plugin = get_volume_scaling_to_formula_unit(plot_inputs['num_atoms'], element, configuration)
+
+    # Get the x axis for the plot
+    volumes, energies = (np.array(plot_inputs['eos_data']).T / scaling_ref_plugin).tolist()
+    dense_volumes = np.linspace(
+        min(volumes),
+        max(volumes),
+        100
+    )
+
+    # Get the data for the reference plugin
+    ref_BM_fit_data = plot_inputs['BM_fit_data']
+    compare_eos_fit_energy = None
+    if ref_BM_fit_data is None:
+        # Fit data is missing (either the data was there but was not fitted, or the fit failed).
+        # I will still plot the points
+        reference_eos_fit_energy = None
+        residuals = None
+    else:
+        reference_eos_fit_energy = birch_murnaghan(
+            V=dense_volumes,
+            E0=ref_BM_fit_data['E0'] / scaling_ref_plugin,
+            V0=ref_BM_fit_data['min_volume'] / scaling_ref_plugin,
+            B0=ref_BM_fit_data['bulk_modulus_ev_ang3'],
+            B01=ref_BM_fit_data['bulk_deriv']
+        )
+        residuals = ref_BM_fit_data['residuals']
+
+        # Get the data for the compare_with plugin, if specified and if it has a fit (and if the EOS worked
+        # for the reference plugin, otherwise we don't know which E0 to use)
+        compare_BM_fit_data = plot_inputs['compare_BM_fit_data']
+        if compare_BM_fit_data is not None:
+            scaling_compare_plugin = get_volume_scaling_to_formula_unit(
+                plot_inputs['compare_num_atoms'], element, configuration
+            )
+
+            compare_eos_fit_energy = birch_murnaghan(
+                V=dense_volumes,
+                E0=ref_BM_fit_data['E0'] / scaling_ref_plugin, ## IMPORTANT! here we use the E0 of the reference plugin
+                V0=compare_BM_fit_data['min_volume'] / scaling_compare_plugin,
+                B0=compare_BM_fit_data['bulk_modulus_ev_ang3'],
+                B01=compare_BM_fit_data['bulk_deriv']
+            )
+
+    # Stress data (None if all stresses are None), so I know if I need to do two panels or only one
+    stress_fit = plot_inputs['stress_fit']
+
+    #### START Plotting ####
+    fig, stress_ax, eos_ax = get_figure(with_stress=stress_fit is not None)
+
+    # Plot EOS: this will be done anyway
+    eos_ax.plot(volumes, energies, 'ob', label=f'{PLUGIN_NAME} EOS data')
+    if reference_eos_fit_energy is not None:
+        eos_ax.plot(dense_volumes, reference_eos_fit_energy, '-b', label=f'{PLUGIN_NAME} fit (residuals: {residuals:.3g})')
+        eos_ax.axvline(ref_BM_fit_data['min_volume'] / scaling_ref_plugin, linestyle='--', color='gray')
+        if compare_eos_fit_energy is not None:
+            eos_ax.plot(dense_volumes, compare_eos_fit_energy, '-r', label=f'{compare_with} fit')
+            eos_ax.fill_between(
+                dense_volumes.flatten(),
+                reference_eos_fit_energy.flatten(),
+                compare_eos_fit_energy.flatten(),
+                alpha=0.5, color='red'
+                )
+
+    eos_ax.legend(loc='upper center')
+    eos_ax.set_xlabel("Cell volume per formula unit ($\\AA^3$)")
+    eos_ax.set_ylabel("$E - TS$ per formula unit (eV)")
+
+    if plot_inputs['missing_outputs']:
+        eos_ax.set_facecolor(LIGHTGREEN)
+    if residuals is None:
+        eos_ax.set_facecolor(LIGHTYELLOW)
+    elif residuals > RESIDUALS_THRESHOLD:
+        eos_ax.set_facecolor(LIGHTORANGE)
+
+    conf_nice = get_conf_nice(configuration)
+    fig.suptitle(f"{element} ({conf_nice})")
+
+    # Plot stress, but only if there is data! (otherwise stress_ax is not even defined)
+    if stress_fit is not None:
+        stress_ax.axhline(0.)
+        stress_ax.plot(stress_fit['volumes'], stress_fit['hydro_stresses_GPa'], 'o')
+
+        # Quadratic fit and volume at zero stress, computed for all systems by `get_stress_fits`
+        if stress_fit['fit'] is not None:
+            a, b, c = stress_fit['fit']
+            stress_ax.plot(dense_volumes, a * dense_volumes**2 + b * dense_volumes + c)
+            if stress_fit['zero_stress_volume'] is not None:
+                stress_ax.axvline(stress_fit['zero_stress_volume'], linestyle='--', color='gray')
+
+        stress_ax.set_ylabel("Volumetric stress (GPa)")
+
+    # Clearing reused (shared) axes can leave the data limits of the previous plot
+    for ax in fig.axes:
+        ax.relim()
+        ax.autoscale_view()
+
+    fig.savefig(get_plot_filename(plot_folder, element_and_configuration))
+
+
+def _plot_system_job(job):
+    """Plot a system in a worker process; return its name and hash, to be stored once the plot is written."""
+    plot_inputs, plot_hash, compare_with, plot_folder = job
+    plot_system(plot_inputs, compare_with, plot_folder)
+    return plot_inputs['element_and_configuration'], plot_hash
+
+
 if __name__ == "__main__":
+    # Number of processes generating the plots in parallel (1: plot them in this process)
+    num_workers = 1
+    # If True, regenerate all plots, even those whose inputs did not change since the last run
+    force = False
+    args = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--workers='):
+            num_workers = int(arg[len('--workers='):])
+        elif arg == '--force':
+            force = True
+        else:
+            args.append(arg)
+
     try:
-        SET_NAME = sys.argv[1]
+        SET_NAME = args[0]
     except IndexError:
         print("Pass as first parameter the set name, e.g. oxides-verification-PBE-v1 or unaries-verification-PBE-v1")
         sys.exit(1)
 
     try:
-        compare_with = sys.argv[2]
+        compare_with = args[1]
     except IndexError:
         compare_with = None
 
     try:
-        with open(f'results-{SET_NAME}-{PLUGIN_NAME}.json') as fhandle:
-            reference_plugin_data = json.load(fhandle)
+        reference_plugin_data = load_results(f'results-{SET_NAME}-{PLUGIN_NAME}.json')
     except OSError:
         print(f"No data found for your plugin '{PLUGIN_NAME}' (set '{SET_NAME}'). Did you run `./get_results.py` first?")
         sys.exit(1)
@@ -76,8 +358,7 @@ if __name__ == "__main__":
     else:
         print(f"Plotting data for plugin '{PLUGIN_NAME}' (set '{SET_NAME}') compared with '{compare_with}'.")
         try:
-             with open(f'results-{SET_NAME}-{compare_with}.json') as fhandle:
-                compare_plugin_data = json.load(fhandle)
+            compare_plugin_data = load_results(f'results-{SET_NAME}-{compare_with}.json')
         except OSError:
             print(f"No data found for the reference plugin '{compare_with}': you need the file results-{SET_NAME}-{compare_with}.json.")
             sys.exit(1)
@@ -99,165 +380,51 @@ if __name__ == "__main__":
     if compare_with:
         all_systems.update(compare_plugin_data['BM_fit_data'].keys())
 
-    progress_bar = tqdm.tqdm(sorted(all_systems))
-    for element_and_configuration in progress_bar:
-        progress_bar.set_description(f"{element_and_configuration:12s}")
-        progress_bar.refresh()
+    hashes_fname = os.path.join(PLOT_FOLDER, PLOT_HASHES_FILENAME)
+    try:
+        with open(hashes_fname) as fhandle:
+            plot_hashes = json.load(fhandle)
+    except (OSError, ValueError):
+        plot_hashes = {}
 
-        element, configuration = element_and_configuration.split('-')
-        try:
-            eos_data = reference_plugin_data['eos_data'][f'{element}-{configuration}']
-        except KeyError:
-            # If this system does not exist in the reference data, skip it
+    # Use the stress arrays written by `get_results.py`, unless they are older than the results
+    stresses_fname = f'stresses-{SET_NAME}-{PLUGIN_NAME}.npz'
+    results_fname = find_results_file(f'results-{SET_NAME}-{PLUGIN_NAME}.json')
+    if os.path.exists(stresses_fname) and os.path.getmtime(stresses_fname) >= os.path.getmtime(results_fname):
+        stress_arrays = load_stress_arrays(stresses_fname)
+    else:
+        stress_arrays = get_stress_arrays(reference_plugin_data['stress_data'])
+    stress_fits = get_stress_fits(stress_arrays, reference_plugin_data['num_atoms_in_sim_cell'])
+
+    jobs = []
+    for element_and_configuration in sorted(all_systems):
+        plot_inputs = get_plot_inputs(
+            element_and_configuration, reference_plugin_data, compare_plugin_data, stress_fits)
+        if plot_inputs is None:
             continue
-        if eos_data is None:
-            # If there is no data, I skip this material
+        plot_hash = get_plot_hash(plot_inputs, compare_with)
+        if (not force and plot_hashes.get(element_and_configuration) == plot_hash and
+                os.path.exists(get_plot_filename(PLOT_FOLDER, element_and_configuration))):
+            # Nothing changed since the plot was generated
             continue
-        scaling_ref_plugin = get_volume_scaling_to_formula_unit(
-            reference_plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}'],
-            element, configuration
-        )
+        jobs.append((plot_inputs, plot_hash, compare_with, PLOT_FOLDER))
+    print(f"{len(jobs)} plots to generate ({len(all_systems) - len(jobs)} systems unchanged or without EOS data).")
 
-        # Get the x axis for the plot
-        volumes, energies = (np.array(eos_data).T / scaling_ref_plugin).tolist()
-        dense_volumes = np.linspace(
-            min(volumes),
-            max(volumes),
-            100
-        )
-
-        # Get the data for the reference plugin
-        try:
-            ref_BM_fit_data = reference_plugin_data['BM_fit_data'][f'{element}-{configuration}']
-            if ref_BM_fit_data is None:
-                # No fitting data: data was there but was not fitted.
-                # Raise this exception that is catched one line below, so
-                # there is nothing plotted for the fit but just the data.
-                raise KeyError
-        except KeyError:
-            # Set to None if fit data is missing (if we are here, the EOS points
-            # are there, so it means that the fit failed). I will still plot the
-            # points
-            reference_eos_fit_energy = None
-            residuals = None
-        else:
-            reference_eos_fit_energy = birch_murnaghan(
-                V=dense_volumes,
-                E0=ref_BM_fit_data['E0'] / scaling_ref_plugin,
-                V0=ref_BM_fit_data['min_volume'] / scaling_ref_plugin,
-                B0=ref_BM_fit_data['bulk_modulus_ev_ang3'],
-                B01=ref_BM_fit_data['bulk_deriv']
-            )
-            residuals = ref_BM_fit_data['residuals']
-
-            # Get the data for the compare_with plugin, if specified (and if the EOS worked for the 
-            # reference plugin, otherwise we don't know which E0 to use)
-            if compare_with is not None:
-                try:
-                    compare_BM_fit_data = compare_plugin_data['BM_fit_data'][f'{element}-{configuration}']
-                    if compare_BM_fit_data is None:
-                        # No fitting data in the plugin to compare with.
-                        # Raise this exception that is catched one line below, so
-                        # it will set `compare_eos_fit_energy` to None.
-                        raise KeyError                    
-                except KeyError:
-                    # Set to None if fit data is missing (if we are here, the EOS points
-                    # are there, so it means that the fit failed). I will still plot the
-                    # points
-                    compare_eos_fit_energy = None
-                else:
-                    scaling_compare_plugin = get_volume_scaling_to_formula_unit(
-                        compare_plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}'],
-                        element, configuration
-                    )
-
-                    compare_eos_fit_energy = birch_murnaghan(
-                        V=dense_volumes,
-                        E0=ref_BM_fit_data['E0'] / scaling_ref_plugin, ## IMPORTANT! here we use the E0 of the reference plugin
-                        V0=compare_BM_fit_data['min_volume'] / scaling_compare_plugin,
-                        B0=compare_BM_fit_data['bulk_modulus_ev_ang3'],
-                        B01=compare_BM_fit_data['bulk_deriv']
-                    )
-            else:
-                # No compare_with plugin
-                compare_eos_fit_energy = None
-
-        # Fetch stress data, so I know if I need to do two panels or only one
-        stress_data = reference_plugin_data['stress_data'][f'{element}-{configuration}']
-        stress_volumes = []
-        hydro_stresses_GPa = []
-
-        # After this, `volumes` and `hydro_stresses_GPa`` are empty lists if all stresses are None
-        for stress_volume, stress_tensor in stress_data:
-            if stress_tensor is not None:
-                stress_volumes.append(stress_volume / scaling_ref_plugin)
-                #1 eV/Angstrom3 = 160.21766208 GPa
-                hydro_stresses_GPa.append(
-                    160.21766208 * (stress_tensor[0][0] + stress_tensor[1][1] + stress_tensor[2][2])/3
-                    )
-
-        # Check missing data
-        miss_data = False
-        if reference_plugin_data["missing_outputs"]:
-            if f'{element}-{configuration}' in reference_plugin_data['missing_outputs']:
-                miss_data = True
-
-        #### START Plotting ####
-        if hydro_stresses_GPa:
-            fig, (stress_ax, eos_ax) = pl.subplots(nrows=2, ncols=1, gridspec_kw={'height_ratios': [1, 2], 'left': 0.15, 'right': 0.95}, sharex=True)
+    pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+    try:
+        if pool is None:
+            results = map(_plot_system_job, jobs)
         else:
-            # Only EOS panel
-            fig, eos_ax = pl.subplots(nrows=1, ncols=1, gridspec_kw={'left': 0.15, 'right': 0.95})
-
-        # Plot EOS: this will be done anyway
-        eos_ax.plot(volumes, energies, 'ob', label=f'{PLUGIN_NAME} EOS data')
-        if reference_eos_fit_energy is not None:
-            eos_ax.plot(dense_volumes, reference_eos_fit_energy, '-b', label=f'{PLUGIN_NAME} fit (residuals: {residuals:.3g})')
-            eos_ax.axvline(ref_BM_fit_data['min_volume'] / scaling_ref_plugin, linestyle='--', color='gray')
-            if compare_eos_fit_energy is not None:
-                eos_ax.plot(dense_volumes, compare_eos_fit_energy, '-r', label=f'{compare_with} fit')
-                eos_ax.fill_between(
-                    dense_volumes.flatten(), 
-                    reference_eos_fit_energy.flatten(), 
-                    compare_eos_fit_energy.flatten(),
-                    alpha=0.5, color='red'
-                    )
-        
-        eos_ax.legend(loc='upper center')
-        eos_ax.set_xlabel("Cell volume per formula unit ($\\AA^3$)")
-        eos_ax.set_ylabel("$E - TS$ per formula unit (eV)")
-
-        LIGHTYELLOW = (255/255, 244/255, 214/255)
-        LIGHTORANGE = (255/255, 205/255, 171/255)
-        LIGHTGREEN = (144/255, 238/255, 144/255)
-        if miss_data:
-            eos_ax.set_facecolor(LIGHTGREEN)
-        if residuals is None:
-            eos_ax.set_facecolor(LIGHTYELLOW)
-        elif residuals > RESIDUALS_THRESHOLD:
-            eos_ax.set_facecolor(LIGHTORANGE)
-
-        conf_nice = get_conf_nice(configuration)
-        fig.suptitle(f"{element} ({conf_nice})")
-
-        # Plot stress, but only if there is data! (otherwise stress_ax is not even defined)
-        if hydro_stresses_GPa:
-            stress_ax.axhline(0.)
-            stress_ax.plot(stress_volumes, hydro_stresses_GPa, 'o')
-
-            # Quadratic fit (the linear one is typically not enough);
-            a, b, c = np.polyfit(stress_volumes, hydro_stresses_GPa, 2)
-            stress_ax.plot(dense_volumes, a * dense_volumes**2 + b * dense_volumes + c)
-            # The quadratic fit leads to two solutions for zero stress, we choose the one within the volume range
-            zero_stress_sol_1 = (-b - np.sqrt(b**2 - 4 * a * c))/2/a
-            if zero_stress_sol_1 < max(stress_volumes) and zero_stress_sol_1 > min(stress_volumes):
-                stress_ax.axvline((-b - np.sqrt(b**2 - 4 * a * c))/2/a, linestyle='--', color='gray')
-            else:
-                 stress_ax.axvline((-b + np.sqrt(b**2 - 4 * a * c))/2/a, linestyle='--', color='gray')
- 
-            stress_ax.set_ylabel("Volumetric stress (GPa)")
-
-        pl.savefig(f"{PLOT_FOLDER}/{element}-{configuration.replace('/', '_')}.pdf")
-        pl.close(fig)
+            results = pool.imap_unordered(_plot_system_job, jobs, chunksize=4)
+        progress_bar = tqdm.tqdm(results, total=len(jobs))
+        for element_and_configuration, plot_hash in progress_bar:
+            progress_bar.set_description(f"{element_and_configuration:12s}")
+            plot_hashes[element_and_configuration] = plot_hash
+    finally:
+        if pool is not None:
+            pool.terminate()
+        # Also store the hashes of the plots generated so far, if interrupted
+        with open(hashes_fname, 'w') as fhandle:
+            json.dump(plot_hashes, fhandle, indent=2, sort_keys=True)
 
     print(f"Plots written to: '{PLOT_FOLDER}'")
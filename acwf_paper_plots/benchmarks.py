@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+"""Benchmarks of the EOS fits, of the comparison measures and of the figure scripts.
+
+All benchmarks run offline on the datasets in `code-data`. Run them with:
+
+    python -m acwf_paper_plots.benchmarks [--repeat N] [--only NAME [NAME ...]] [--skip-figures]
+
+Each run is appended as one JSON line to the history file (by default `benchmark-history.jsonl`, next to this file),
+together with the git commit and a description of the machine, and the timings are compared with the last
+run recorded on the same machine. Use `--list` to see the available benchmarks.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from . import quantities_for_comparison as qc
+from .dataset_registry import DatasetRegistry
+from .eosfit_31_adapted import BM, BM_batch
+from .metric_matrix import QUANTITIES, get_dataset_labels, get_fit_parameters, compute_metric_matrix
+
+PACKAGE_FOLDER = os.path.dirname(os.path.realpath(__file__))
+DATA_FOLDER = os.path.join(PACKAGE_FOLDER, 'code-data')
+DEFAULT_HISTORY_FILE = os.path.join(PACKAGE_FOLDER, 'benchmark-history.jsonl')
+PERIODIC_TABLES_SCRIPT = os.path.join(PACKAGE_FOLDER, 'plots', 'common', 'generate_periodic_tables.py')
+
+SET_NAMES = ['unaries', 'oxides']
+# The dataset (with EOS data) used for the benchmarks of the fits
+FIT_LABEL = 'WIEN2k@(L)APW+lo+LO'
+FIT_SET_NAME = 'unaries'
+# The system used for the single-system benchmarks
+SINGLE_SYSTEM = 'Ag-X/FCC'
+
+
+def get_eos_curves(set_name=FIT_SET_NAME, label=FIT_LABEL):
+    """Return the EOS data of all systems of a dataset that have it, as a dictionary {system: (num_volumes, 2) array}."""
+    data = DatasetRegistry(data_folder=DATA_FOLDER).get(label, set_name)
+    return {
+        system: np.array(eos_data) for system, eos_data in sorted(data['eos_data'].items()) if eos_data
+    }
+
+
+def setup_json_load():
+    registry = DatasetRegistry(data_folder=DATA_FOLDER)
+    fnames = sorted(set(
+        registry.get_filename(label, set_name)
+        for set_name in SET_NAMES for label in get_dataset_labels(registry, set_name)
+    ))
+
+    def run():
+        for fname in fnames:
+            with open(fname) as fhandle:
+                json.load(fhandle)
+
+    return run, len(fnames)
+
+
+def setup_registry_load():
+    labels = {set_name: get_dataset_labels(DatasetRegistry(data_folder=DATA_FOLDER), set_name) for set_name in SET_NAMES}
+    # Make sure that the columnar copies exist, so that only the loading is timed
+    registry = DatasetRegistry(data_folder=DATA_FOLDER, expected_script_version=None)
+    for set_name, set_labels in labels.items():
+        for label in set_labels:
+            registry.get(label, set_name)
+
+    def run():
+        registry = DatasetRegistry(data_folder=DATA_FOLDER, expected_script_version=None)
+        for set_name, set_labels in labels.items():
+            for label in set_labels:
+                registry.get(label, set_name)['BM_fit_data']
+
+    return run, sum(len(set_labels) for set_labels in labels.values())
+
+
+def setup_bm_single():
+    energies = get_eos_curves()[SINGLE_SYSTEM]
+    return (lambda: BM(energies)), 1
+
+
+def setup_bm_set_loop():
+    curves = list(get_eos_curves().values())
+
+    def run():
+        for energies in curves:
+            try:
+                BM(energies)
+            except ValueError:
+                pass
+
+    return run, len(curves)
+
+
+def setup_bm_set_batch():
+    curves = list(get_eos_curves().values())
+    max_points = max(len(energies) for energies in curves)
+    stacked = np.full((len(curves), max_points, 2), np.nan)
+    for idx, energies in enumerate(curves):
+        stacked[idx, :len(energies)] = energies
+    return (lambda: BM_batch(stacked)), len(curves)
+
+
+def setup_metrics_single():
+    registry = DatasetRegistry(data_folder=DATA_FOLDER)
+    _, ref_params, compare_params = qc.get_common_fit_parameters(
+        registry.get('all-electron average', FIT_SET_NAME), registry.get(FIT_LABEL, FIT_SET_NAME), systems=[SINGLE_SYSTEM])
+    args = [float(value) for value in np.concatenate([ref_params[:, 0], compare_params[:, 0]])]
+
+    def run():
+        for quantity in ['epsilon', 'nu', 'delta_per_formula_unit']:
+            function, prefact, weight_b0, weight_b1 = QUANTITIES[quantity]
+            function(*args, prefact, weight_b0, weight_b1)
+
+    return run, 3
+
+
+def setup_metrics_all_datasets():
+    registry = DatasetRegistry(data_folder=DATA_FOLDER, expected_script_version=None)
+    params = {}
+    for set_name in SET_NAMES:
+        datasets = {label: registry.get(label, set_name) for label in get_dataset_labels(registry, set_name)}
+        params[set_name] = get_fit_parameters(datasets)[1]
+
+    def run():
+        for set_params in params.values():
+            for quantity in QUANTITIES:
+                compute_metric_matrix(set_params, quantity)
+
+    return run, sum(set_params.shape[0]**2 * set_params.shape[2] for set_params in params.values()) * len(QUANTITIES)
+
+
+def setup_periodic_tables():
+    # The figure script is run as the users run it, in a temporary folder (that receives its output files)
+    env = dict(os.environ, MPLBACKEND='Agg')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(PACKAGE_FOLDER), env.get('PYTHONPATH')]))
+
+    def run():
+        folder = tempfile.mkdtemp()
+        try:
+            subprocess.run(
+                [sys.executable, PERIODIC_TABLES_SCRIPT, 'MAIN', '--renderer=matplotlib'],
+                cwd=folder, env=env, check=True, stdout=subprocess.DEVNULL
+            )
+        finally:
+            shutil.rmtree(folder)
+
+    return run, 1
+
+
+# For each benchmark: the function that prepares it (not timed), returning the function to time and
+# the number of items (systems, files, ...) processed at each call, and the default number of repetitions
+BENCHMARKS = {
+    'json_load': (setup_json_load, 3),
+    'registry_load': (setup_registry_load, 3),
+    'bm_fit_single': (setup_bm_single, 200),
+    'bm_fit_set_loop': (setup_bm_set_loop, 5),
+    'bm_fit_set_batch': (setup_bm_set_batch, 20),
+    'metrics_single': (setup_metrics_single, 200),
+    'metrics_all_datasets': (setup_metrics_all_datasets, 5),
+    'periodic_tables': (setup_periodic_tables, 1),
+}
+FIGURE_BENCHMARKS = ['periodic_tables']
+
+
+def time_function(function, repeat):
+    """Call a function `repeat` times, and return the best and the median time of a call (in seconds)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+def run_benchmarks(names, repeat=None):
+    """Run the given benchmarks, and return a dictionary with the timings (and number of items) of each."""
+    results = {}
+    for name in names:
+        setup, default_repeat = BENCHMARKS[name]
+        # What the benchmarked functions print (e.g. warnings on the fits) is discarded
+        with contextlib.redirect_stdout(io.StringIO()):
+            function, num_items = setup()
+            results[name] = time_function(function, repeat or default_repeat)
+        results[name]['num_items'] = num_items
+        print(f"{name:22s} best {results[name]['best']:.4e} s, median {results[name]['median']:.4e} s "
+              f"({results[name]['repeat']} calls, {num_items} items per call)")
+    return results
+
+
+def get_git_info():
+    """Return the current commit of the repository and whether it has local changes (None if git is not available)."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PACKAGE_FOLDER, check=True, capture_output=True, text=True
+        ).stdout.strip()
+        changes = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=PACKAGE_FOLDER, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(changes)
+
+
+def get_machine_info():
+    return {
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+
+
+def load_history(fname):
+    """Return the list of runs recorded in the history file (an empty list if it does not exist)."""
+    if not os.path.exists(fname):
+        return []
+    with open(fname) as fhandle:
+        return [json.loads(line) for line in fhandle if line.strip()]
+
+
+def compare_with_previous(results, history, machine):
+    """Print the ratio of the timings with those of the last run recorded on the same machine, if any."""
+    previous_runs = [run for run in history if run['machine']['hostname'] == machine['hostname']]
+    if not previous_runs:
+        return
+    previous = previous_runs[-1]
+    print(f"\nComparison with the run of {previous['date']} (commit {previous['commit']}):")
+    for name, timing in results.items():
+        if name in previous['results']:
+            ratio = timing['best'] / previous['results'][name]['best']
+            print(f"{name:22s} {ratio:6.2f}x the previous time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EOS fits, comparison measures and figure scripts.")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="Only run these benchmarks.")
+    parser.add_argument('--repeat', type=int, help="Number of repetitions of each benchmark (default: per benchmark).")
+    parser.add_argument('--skip-figures', action='store_true', help="Skip the benchmarks of the figure scripts.")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE, help="The JSON-lines file where runs are recorded.")
+    parser.add_argument('--no-record', action='store_true', help="Do not record this run in the history file.")
+    parser.add_argument('--list', action='store_true', help="List the available benchmarks and exit.")
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return
+
+    names = args.only or list(BENCHMARKS)
+    if args.skip_figures:
+        names = [name for name in names if name not in FIGURE_BENCHMARKS]
+
+    commit, local_changes = get_git_info()
+    machine = get_machine_info()
+    results = run_benchmarks(names, repeat=args.repeat)
+
+    history = load_history(args.history)
+    compare_with_previous(results, history, machine)
+
+    if not args.no_record:
+        run = {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'local_changes': local_changes,
+            'machine': machine,
+            'results': results,
+        }
+        with open(args.history, 'a') as fhandle:
+            fhandle.write(json.dumps(run) + '\n')
+        print(f"\nRun recorded in '{args.history}'.")
+
+
+if __name__ == "__main__":
+    main()
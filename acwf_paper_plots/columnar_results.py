@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+"""Columnar binary representation of the `results-*.json` files.
+
+Each dataset is stored in a folder containing one `.npy` file per column
+(the list of systems and the small, non per-system fields are in a `meta.json` file):
+
+- `num_atoms_in_sim_cell`, `missing_outputs`: int64 columns;
+- `BM_fit_data`: a float64 (num_systems, 5) table with min_volume, E0, bulk_modulus_ev_ang3, bulk_deriv, residuals
+  (the order of the columns is stored in `meta.json`), plus a boolean table to restore values that were integers;
+- `eos_data`: the (volume, energy) points of all systems, concatenated in a (num_points, 2) table,
+  with the offsets (num_systems + 1) of the points of each system;
+- `stress_data`: same as `eos_data`, with a (num_points,) volume column and a (num_points, 3, 3) stress table;
+- `uuid_mapping`: a (num_systems, 2) table of UUID strings.
+
+For each of these fields, a `<field>-presence.npy` int8 column tells whether the system is missing from the
+field (0), is set to None (1), or has a value (2), and `<field>-rows.npy` gives the row of the tables where the
+value of each system is stored (-1 if it has no value). Fields that do not follow the expected schema are
+stored as they are in `meta.json`, so the conversion is always lossless: `read_columnar_results` returns
+exactly the content of the original JSON file.
+
+The columns can be memory-mapped with `load_columns`, so that e.g. all the BM fit parameters can be accessed
+without parsing the JSON files. Run this file as a script to convert all files in `code-data`
+(or the files passed on the command line):
+
+    python -m acwf_paper_plots.columnar_results [results-XXX.json ...]
+"""
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+from .results_io import load_results
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'code-data')
+COLUMNAR_SUBFOLDER = 'columnar'
+FORMAT_VERSION = 1
+
+ABSENT = 0
+NONE = 1
+PRESENT = 2
+
+
+def get_columnar_folder(json_fname):
+    """Return the folder where the columnar version of a `results-*.json` file is stored.
+
+    This is a subfolder of the `columnar` folder, next to the JSON file, with the same name without extension
+    (streamed results files, see `results_io`, only drop the `.gz` extension, if any, so they get a different folder).
+    """
+    dirname, basename = os.path.split(os.path.abspath(json_fname))
+    if basename.endswith('.json'):
+        basename = basename[:-len('.json')]
+    elif basename.endswith('.gz'):
+        basename = basename[:-len('.gz')]
+    return os.path.join(dirname, COLUMNAR_SUBFOLDER, basename)
+
+
+def _encode_int(values):
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        raise ValueError('not all integers')
+    return {'': np.array(values, dtype=np.int64).reshape(len(values))}, {}
+
+
+def _decode_int(columns, field_meta):
+    return columns[''].tolist()
+
+
+def _encode_float_dict(values):
+    keys = list(values[0].keys()) if values else []
+    table = np.empty((len(values), len(keys)))
+    is_int = np.zeros((len(values), len(keys)), dtype=bool)
+    for row, value in enumerate(values):
+        if not isinstance(value, dict) or list(value.keys()) != keys:
+            raise ValueError('inconsistent keys')
+        for col, key in enumerate(keys):
+            if isinstance(value[key], bool) or not isinstance(value[key], (int, float)):
+                raise ValueError('not a number')
+            table[row, col] = value[key]
+            is_int[row, col] = isinstance(value[key], int)
+    return {'': table, 'is_int': is_int}, {'keys': keys}
+
+
+def _decode_float_dict(columns, field_meta):
+    keys = field_meta['keys']
+    return [
+        {key: int(value) if is_int else value for key, value, is_int in zip(keys, row, row_is_int)}
+        for row, row_is_int in zip(columns[''].tolist(), columns['is_int'].tolist())
+    ]
+
+
+def _encode_string_dict(values):
+    keys = list(values[0].keys()) if values else []
+    for value in values:
+        if not isinstance(value, dict) or list(value.keys()) != keys:
+            raise ValueError('inconsistent keys')
+        if not all(isinstance(value[key], str) for key in keys):
+            raise ValueError('not a string')
+    table = np.array([[value[key] for key in keys] for value in values], dtype=str).reshape(len(values), len(keys))
+    return {'': table}, {'keys': keys}
+
+
+def _decode_string_dict(columns, field_meta):
+    keys = field_meta['keys']
+    return [dict(zip(keys, row)) for row in columns[''].tolist()]
+
+
+def _get_offsets(values):
+    if not all(isinstance(value, list) for value in values):
+        raise ValueError('not a list')
+    return np.cumsum([0] + [len(value) for value in values]).astype(np.int64)
+
+
+def _encode_eos(values):
+    offsets = _get_offsets(values)
+    points = [point for value in values for point in value]
+    for point in points:
+        if not (isinstance(point, list) and len(point) == 2 and all(type(num) is float for num in point)):
+            raise ValueError('unexpected point')
+    return {'offsets': offsets, 'points': np.array(points, dtype=float).reshape(len(points), 2)}, {}
+
+
+def _decode_eos(columns, field_meta):
+    offsets = columns['offsets'].tolist()
+    points = columns['points'].tolist()
+    return [points[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def _encode_stress(values):
+    offsets = _get_offsets(values)
+    points = [point for value in values for point in value]
+    volumes = np.empty(len(points))
+    stresses = np.zeros((len(points), 3, 3))
+    has_stress = np.zeros(len(points), dtype=bool)
+    for idx, point in enumerate(points):
+        if not (isinstance(point, list) and len(point) == 2 and type(point[0]) is float):
+            raise ValueError('unexpected point')
+        volumes[idx] = point[0]
+        if point[1] is not None:
+            stress = np.array(point[1], dtype=object)
+            if stress.shape != (3, 3) or not all(type(num) is float for num in stress.flat):
+                raise ValueError('unexpected stress')
+            stresses[idx] = point[1]
+            has_stress[idx] = True
+    return {'offsets': offsets, 'volumes': volumes, 'stresses': stresses, 'has_stress': has_stress}, {}
+
+
+def _decode_stress(columns, field_meta):
+    offsets = columns['offsets'].tolist()
+    points = [
+        [volume, stress if has_stress else None]
+        for volume, stress, has_stress in zip(
+            columns['volumes'].tolist(), columns['stresses'].tolist(), columns['has_stress'].tolist())
+    ]
+    return [points[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+# The per-system fields (dictionaries with the systems as keys) that are stored as columns
+FIELD_CODECS = {
+    'num_atoms_in_sim_cell': (_encode_int, _decode_int),
+    'missing_outputs': (_encode_int, _decode_int),
+    'BM_fit_data': (_encode_float_dict, _decode_float_dict),
+    'eos_data': (_encode_eos, _decode_eos),
+    'stress_data': (_encode_stress, _decode_stress),
+    'uuid_mapping': (_encode_string_dict, _decode_string_dict),
+}
+
+
+def write_columnar_results(data, folder):
+    """Write the content of a `results-*.json` file (as a dictionary) in columnar format in the given folder."""
+    systems = []
+    system_index = {}
+    for field in FIELD_CODECS:
+        if isinstance(data.get(field), dict):
+            for system in data[field]:
+                if system not in system_index:
+                    system_index[system] = len(systems)
+                    systems.append(system)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'keys': list(data.keys()),
+        'systems': systems,
+        'columnar_fields': {},
+        'verbatim': {},
+    }
+    arrays = {}
+    for key, value in data.items():
+        if key in FIELD_CODECS and isinstance(value, dict):
+            presence = np.full(len(systems), ABSENT, dtype=np.int8)
+            indices = []
+            values = []
+            for system, system_value in value.items():
+                if system_value is None:
+                    presence[system_index[system]] = NONE
+                else:
+                    presence[system_index[system]] = PRESENT
+                    indices.append(system_index[system])
+                    values.append(system_value)
+            # Only the values that are present are stored, in the order of `systems`
+            order = np.argsort(indices, kind='stable')
+            indices = [indices[idx] for idx in order]
+            values = [values[idx] for idx in order]
+            try:
+                encoder, _ = FIELD_CODECS[key]
+                field_arrays, field_meta = encoder(values)
+            except ValueError:
+                meta['verbatim'][key] = value
+                continue
+            field_meta['order'] = list(value.keys())
+            meta['columnar_fields'][key] = field_meta
+            arrays[f'{key}-presence'] = presence
+            # Row of each present system in the tables (-1 if not present)
+            rows = np.full(len(systems), -1, dtype=np.int64)
+            rows[indices] = np.arange(len(indices))
+            arrays[f'{key}-rows'] = rows
+            for suffix, array in field_arrays.items():
+                arrays[f'{key}-{suffix}' if suffix else key] = array
+        else:
+            meta['verbatim'][key] = value
+
+    os.makedirs(folder, exist_ok=True)
+    # Remove the columns of a previous conversion, if any
+    for fname in os.listdir(folder):
+        if fname.endswith('.npy') or fname == 'meta.json':
+            os.remove(os.path.join(folder, fname))
+    for name, array in arrays.items():
+        np.save(os.path.join(folder, f'{name}.npy'), array)
+    # meta.json is written last, its presence marks a complete conversion
+    with open(os.path.join(folder, 'meta.json'), 'w') as fhandle:
+        json.dump(meta, fhandle)
+
+
+def load_columns(folder, mmap_mode='r'):
+    """Load the columns of a dataset in columnar format, memory-mapped by default.
+
+    :return: a tuple (meta, columns), where meta is the content of `meta.json` (including the list of `systems`,
+        and for each columnar field the `keys` of the table columns, if any), and columns is a dictionary
+        {field: {suffix: array}} where the suffix is '' for the main table of the field.
+        Rows of the tables map to systems via the `rows` column (-1 if the system has no value).
+    """
+    with open(os.path.join(folder, 'meta.json')) as fhandle:
+        meta = json.load(fhandle)
+    if meta['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version {meta['format_version']} in '{folder}'")
+
+    columns = {field: {} for field in meta['columnar_fields']}
+    for fname in os.listdir(folder):
+        name, ext = os.path.splitext(fname)
+        if ext != '.npy':
+            continue
+        field, _, suffix = name.partition('-')
+        columns[field][suffix] = np.load(os.path.join(folder, fname), mmap_mode=mmap_mode)
+    return meta, columns
+
+
+def decode_field(meta, columns, key):
+    """Return the value of a single top-level field of the dataset, as in the original `results-*.json` file.
+
+    :param meta: the meta data, as returned by `load_columns`
+    :param columns: the columns, as returned by `load_columns`
+    """
+    if key in meta['verbatim']:
+        return meta['verbatim'][key]
+
+    field_meta = meta['columnar_fields'][key]
+    field_columns = columns[key]
+    _, decoder = FIELD_CODECS[key]
+    values = decoder(field_columns, field_meta)
+    system_index = {system: idx for idx, system in enumerate(meta['systems'])}
+    presence = field_columns['presence'].tolist()
+    rows = field_columns['rows'].tolist()
+
+    decoded = {}
+    for system in field_meta['order']:
+        idx = system_index[system]
+        decoded[system] = None if presence[idx] == NONE else values[rows[idx]]
+    return decoded
+
+
+def read_columnar_results(folder, mmap_mode='r'):
+    """Read a dataset in columnar format, returning the same dictionary as the original `results-*.json` file."""
+    meta, columns = load_columns(folder, mmap_mode=mmap_mode)
+    return {key: decode_field(meta, columns, key) for key in meta['keys']}
+
+
+def convert_results_file(json_fname, folder=None):
+    """Convert a `results-*.json` file to columnar format; by default in the folder from `get_columnar_folder`.
+
+    :return: the folder where the columnar data was written
+    """
+    if folder is None:
+        folder = get_columnar_folder(json_fname)
+    write_columnar_results(load_results(json_fname), folder)
+    return folder
+
+
+if __name__ == "__main__":
+    fnames = sys.argv[1:] or sorted(glob.glob(os.path.join(DATA_FOLDER, 'results-*.json')))
+    for fname in fnames:
+        print(f"'{fname}' converted to '{convert_results_file(fname)}'.")
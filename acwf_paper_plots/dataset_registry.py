@@ -0,0 +1,161 @@
+"""Shared access to the datasets listed in `code-data/labels.json`.
+
+Scripts should not open the `results-*.json` files directly, but use a `DatasetRegistry` (or the functions
+of this module, that use a default registry shared in the whole process):
+
+    from acwf_paper_plots.dataset_registry import get_dataset, get_labels
+
+    reference_data = get_dataset('all-electron average', 'oxides')
+    for label in get_labels('methods-main'):
+        data = get_dataset(label, 'oxides')
+        data['BM_fit_data']...
+
+Datasets are only loaded on first access, and then cached in the process. The `script_version` is checked once,
+when a dataset is loaded. By default, each dataset is also cached on disk in the columnar format of
+`columnar_results` (regenerated automatically when the JSON file is newer), and each of its top-level fields
+(`BM_fit_data`, `eos_data`, ...) is only decoded when first accessed: scripts that only need the BM fits
+do not need to parse the EOS and stress data.
+"""
+import collections.abc
+import json
+import os
+
+from .columnar_results import convert_results_file, decode_field, get_columnar_folder, load_columns
+from .results_io import load_results
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'code-data')
+EXPECTED_SCRIPT_VERSION = ['0.0.3', '0.0.4']
+
+# The groups of labels in `labels.json` that refer to datasets, in the order in which labels are resolved
+DATASET_GROUPS = ['references', 'methods-main', 'methods-supplementary']
+
+
+class LazyResults(collections.abc.Mapping):
+    """Read-only dictionary with the content of a `results-*.json` file, decoding each field only on first access."""
+
+    def __init__(self, columnar_folder):
+        self._meta, self._columns = load_columns(columnar_folder)
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        if key not in self._decoded:
+            if key not in self._meta['keys']:
+                raise KeyError(key)
+            self._decoded[key] = decode_field(self._meta, self._columns, key)
+        return self._decoded[key]
+
+    def __iter__(self):
+        return iter(self._meta['keys'])
+
+    def __len__(self):
+        return len(self._meta['keys'])
+
+
+class DatasetRegistry:
+    """Resolve the labels of `labels.json` (e.g. 'FLEUR@LAPW+LO', 'all-electron average') to their datasets.
+
+    :param data_folder: the folder with `labels.json` and the `results-*.json` files
+    :param expected_script_version: the list of accepted values of `script_version` in the datasets
+    :param use_disk_cache: if True, datasets are read from (and cached in) their columnar version on disk
+    """
+
+    def __init__(self, data_folder=DATA_FOLDER, expected_script_version=EXPECTED_SCRIPT_VERSION, use_disk_cache=True):
+        self.data_folder = data_folder
+        self.expected_script_version = expected_script_version
+        self.use_disk_cache = use_disk_cache
+        self._labels_data = None
+        self._datasets = {}
+
+    @property
+    def labels_data(self):
+        """The content of `labels.json`."""
+        if self._labels_data is None:
+            with open(os.path.join(self.data_folder, 'labels.json')) as fhandle:
+                self._labels_data = json.load(fhandle)
+        return self._labels_data
+
+    def get_labels(self, group='methods-main'):
+        """Return the list of labels in a group of `labels.json` (e.g. 'methods-main', 'references')."""
+        return list(self.labels_data[group].keys())
+
+    def get_label_data(self, label):
+        """Return the entry of `labels.json` for a label, i.e. a dictionary with the file name for each set.
+
+        :raises KeyError: if the label is not defined in any group of `DATASET_GROUPS`
+        """
+        for group in DATASET_GROUPS:
+            if label in self.labels_data[group]:
+                return self.labels_data[group][label]
+        raise KeyError(f"No dataset with label '{label}' in {DATASET_GROUPS}")
+
+    def get_short_label(self, label):
+        """Return the short label of a method, or the label itself if it does not define one."""
+        return self.get_label_data(label).get('short_label', label)
+
+    def get_filename(self, label, set_name):
+        """Return the full path of the `results-*.json` file of a label for a set (e.g. 'unaries', 'oxides')."""
+        try:
+            return os.path.join(self.data_folder, self.get_label_data(label)[set_name])
+        except KeyError as exc:
+            raise KeyError(f"No dataset for label '{label}' and set '{set_name}'") from exc
+
+    def has_dataset(self, label, set_name):
+        """Return True if a dataset is defined for the label and set."""
+        try:
+            self.get_filename(label, set_name)
+        except KeyError:
+            return False
+        return True
+
+    def get(self, label, set_name):
+        """Return the content of the `results-*.json` file of a label for a set, loading it on first access.
+
+        :raises ValueError: if the dataset was generated with a `script_version` that is not expected
+        """
+        key = (label, set_name)
+        if key not in self._datasets:
+            data = self._load(self.get_filename(label, set_name))
+            if self.expected_script_version is not None and \
+                    data['script_version'] not in self.expected_script_version:
+                raise ValueError(
+                    f"This script only works with data generated at version {self.expected_script_version}. "
+                    f"Please re-run ./get_results.py to update the data format for {label} (set '{set_name}')!"
+                )
+            self._datasets[key] = data
+        return self._datasets[key]
+
+    def _load(self, fname):
+        if not self.use_disk_cache:
+            return load_results(fname)
+
+        folder = get_columnar_folder(fname)
+        meta_fname = os.path.join(folder, 'meta.json')
+        if not os.path.exists(meta_fname) or os.path.getmtime(fname) > os.path.getmtime(meta_fname):
+            convert_results_file(fname, folder)
+        return LazyResults(folder)
+
+
+_DEFAULT_REGISTRY = None
+
+
+def get_registry():
+    """Return the default registry, shared in the whole process."""
+    global _DEFAULT_REGISTRY  # pylint: disable=global-statement
+    if _DEFAULT_REGISTRY is None:
+        _DEFAULT_REGISTRY = DatasetRegistry()
+    return _DEFAULT_REGISTRY
+
+
+def get_dataset(label, set_name):
+    """Return the dataset of a label for a set, from the default registry (see `DatasetRegistry.get`)."""
+    return get_registry().get(label, set_name)
+
+
+def get_labels(group='methods-main'):
+    """Return the list of labels in a group of `labels.json`, from the default registry."""
+    return get_registry().get_labels(group)
+
+
+def get_short_label(label):
+    """Return the short label of a method, from the default registry."""
+    return get_registry().get_short_label(label)
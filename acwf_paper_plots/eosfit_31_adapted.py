@@ -59,3 +59,70 @@ def BM(energies):
 
     return volume0, E0, bulk_modulus0, bulk_deriv0, residuals0
 
+def BM_batch(energies):
+    """Fit many E(V) curves at once to a Birch-Murnaghan equation of state.
+
+    Same fit as `BM`, but all systems are solved together with NumPy array operations instead of a Python loop:
+    the cubic least-squares problems in x = V^(-2/3) are solved with a stacked pseudo-inverse, and the minimum
+    is obtained in closed form as the root of the (quadratic) derivative where the second derivative is positive.
+
+    :param energies: array of shape (n_systems, n_volumes, 2), with volumes in the first column and
+        energies in the second (as for `BM`). Systems with fewer volumes can be padded with NaN rows,
+        that are ignored in the fit.
+    :return: a tuple (volume0, E0, bulk_modulus0, bulk_deriv0, residuals0, failed) of 1D arrays of length n_systems.
+        `residuals0` is the 1-R^2 value (i.e. `residuals0[0]` of `BM`). `failed` is a boolean mask of the systems
+        where no minimum could be found (where `BM` would raise), or with fewer than 4 valid points;
+        the other arrays are NaN for these systems.
+    """
+    energies = np.asarray(energies, dtype=float)
+    volumes = energies[:, :, 0]
+    ens = energies[:, :, 1]
+    valid = np.isfinite(volumes) & np.isfinite(ens)
+    num_valid = valid.sum(axis=1)
+
+    # Zero weight for the padding rows; x = 1 there to avoid NaNs, the rows do not contribute anyway.
+    # Energies are shifted by their average (added back to E0) to avoid losing precision on large total energies
+    x_data = np.where(valid, volumes, 1.)**(-2./3.)
+    weights = valid.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        energy_shift = np.where(num_valid > 0, np.where(valid, ens, 0.).sum(axis=1) / num_valid, 0.)
+    y_data = np.where(valid, ens - energy_shift[:, np.newaxis], 0.)
+
+    # Vandermonde matrix with decreasing powers (as in np.polyfit), with columns scaled to improve conditioning
+    vander = x_data[:, :, np.newaxis]**np.arange(3, -1, -1) * weights[:, :, np.newaxis]
+    scale = np.sqrt((vander**2).sum(axis=1))
+    scale[scale == 0] = 1.
+    vander /= scale[:, np.newaxis, :]
+    coeffs = np.einsum('sij,sj->si', np.linalg.pinv(vander), y_data * weights) / scale
+    a, b, c, d = coeffs.T
+
+    fitted = np.einsum('si,sji->sj', coeffs, x_data[:, :, np.newaxis]**np.arange(3, -1, -1))
+    ssr = (((fitted - y_data) * weights)**2).sum(axis=1)
+    sst = (y_data**2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        residuals0 = ssr / sst
+
+        # The derivative 3a x^2 + 2b x + c has the second derivative 6a x + 2b = +-2 sqrt(b^2 - 3ac) at its roots:
+        # the minimum is the root with the + sign. Use the form without cancellation depending on the sign of b.
+        discriminant = b**2 - 3. * a * c
+        sqrt_disc = np.sqrt(np.where(discriminant > 0, discriminant, np.nan))
+        x = np.where(b >= 0, -c / (b + sqrt_disc), (-b + sqrt_disc) / (3. * a))
+
+    failed = (num_valid < 4) | ~np.isfinite(x) | ~(x > 0)
+    x = np.where(failed, np.nan, x)
+
+    volume0 = x**(-3./2.)
+    E0 = ((a * x + b) * x + c) * x + d + energy_shift
+
+    deriv2 = 6. * a * x + 2. * b
+    deriv3 = 6. * a
+    derivV2 = 4./9. * x**5. * deriv2
+    derivV3 = (-20./9. * x**(13./2.) * deriv2 -
+        8./27. * x**(15./2.) * deriv3)
+    bulk_modulus0 = derivV2 / x**(3./2.)
+    bulk_deriv0 = -1 - x**(-3./2.) * derivV3 / derivV2
+
+    residuals0 = np.where(failed, np.nan, residuals0)
+
+    return volume0, E0, bulk_modulus0, bulk_deriv0, residuals0, failed
+
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""Compute, once for all, the comparison measures between all pairs of datasets.
+
+All datasets listed in `code-data/labels.json` (the all-electron reference and all the
+methods, main and supplementary) are loaded once, and for each set (unaries, oxides) and each
+quantity the full (dataset x dataset x system) tensor is computed with vectorized calls to
+the functions of `quantities_for_comparison`, and stored in a `.npz` file that plotting scripts
+can then slice with `load_metric_matrix` and `get_metric_values`, instead of recomputing
+the measures from the JSON files.
+
+Run it as a script to (re)generate the files for all sets:
+
+    python -m acwf_paper_plots.metric_matrix
+"""
+import os
+
+import numpy as np
+
+from . import quantities_for_comparison as qc
+from .dataset_registry import DatasetRegistry
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'code-data')
+SET_NAMES = ['unaries', 'oxides']
+REFERENCE_LABEL = 'all-electron average'
+
+# For each quantity: the function of `quantities_for_comparison`, and the prefactor and the weights
+# for B0 and B1 that are passed to it (the same as used for the periodic tables)
+QUANTITIES = {
+    'epsilon': (qc.epsilon, 1., 1.0/20.0, 1.0/400.0),
+    'nu': (qc.nu, 100., 1.0/20.0, 1.0/400.0),
+    'delta_per_formula_unit': (qc.delta, 1., 1.0/20.0, 1.0/400.0),
+    'V0_rel_diff': (qc.V0_rel_diff, 1., 1.0/20.0, 1.0/400.0),
+    'B0_rel_diff': (qc.B0_rel_diff, 1., 1.0/20.0, 1.0/400.0),
+    'B1_rel_diff': (qc.B1_rel_diff, 1., 1.0/20.0, 1.0/400.0),
+}
+
+
+def get_metric_matrix_filename(set_name, data_folder=DATA_FOLDER):
+    """Return the default path of the file with the metric matrices for the given set."""
+    return os.path.join(data_folder, f'metric-matrix-{set_name}.npz')
+
+
+def get_dataset_labels(registry, set_name):
+    """Return the labels of all datasets in `labels.json` that have data for the given set.
+
+    The all-electron average comes first, followed by the main and the supplementary methods;
+    a method listed both as main and supplementary is only included once.
+    """
+    labels = [REFERENCE_LABEL]
+    for group in ['methods-main', 'methods-supplementary']:
+        for label in registry.get_labels(group):
+            if label not in labels and registry.has_dataset(label, set_name):
+                labels.append(label)
+    return labels
+
+
+def get_fit_parameters(datasets):
+    """Stack the BM fit parameters of many datasets in a single array.
+
+    :param datasets: a dictionary {label: data}, where data is the content of a `results-*.json` file
+    :return: a tuple (systems, params), with the sorted list of all systems (e.g. 'Ag-X/FCC') present in any
+        dataset, and an array of shape (num_datasets, 3, num_systems) with V0 (per formula unit),
+        B0 (in eV/ang^3) and B1, set to NaN if a dataset does not have a BM fit for a system.
+    """
+    systems = sorted(set().union(*(data['BM_fit_data'].keys() for data in datasets.values())))
+    system_index = {system: idx for idx, system in enumerate(systems)}
+
+    params = np.full((len(datasets), 3, len(systems)), np.nan)
+    for dataset_idx, data in enumerate(datasets.values()):
+        for element_and_configuration, BM_fit_data in data['BM_fit_data'].items():
+            if BM_fit_data is None:
+                continue
+            element, configuration = element_and_configuration.split('-')
+            scaling_factor = qc.get_volume_scaling_to_formula_unit(
+                data['num_atoms_in_sim_cell'][element_and_configuration], element, configuration)
+            params[dataset_idx, :, system_index[element_and_configuration]] = [
+                BM_fit_data['min_volume'] / scaling_factor,
+                BM_fit_data['bulk_modulus_ev_ang3'],
+                BM_fit_data['bulk_deriv'],
+            ]
+    return systems, params
+
+
+def compute_metric_matrix(params, quantity):
+    """Compute a quantity between all pairs of datasets, for all systems.
+
+    :param params: the array returned by `get_fit_parameters`, of shape (num_datasets, 3, num_systems)
+    :param quantity: one of the keys of `QUANTITIES`
+    :return: an array of shape (num_datasets, num_datasets, num_systems), where the element [i, j, k] is the
+        quantity for system k computed with dataset i as the first and dataset j as the second argument
+        (i.e. as reference and compared dataset, respectively). It is NaN if either dataset has no fit for the system.
+    """
+    function, prefact, weight_b0, weight_b1 = QUANTITIES[quantity]
+    first = params[:, np.newaxis, :, :]
+    second = params[np.newaxis, :, :, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return function(
+            first[:, :, 0], first[:, :, 1], first[:, :, 2],
+            second[:, :, 0], second[:, :, 1], second[:, :, 2],
+            prefact, weight_b0, weight_b1
+        )
+
+
+def generate_metric_matrix(set_name, data_folder=DATA_FOLDER, quantities=None, fname=None):
+    """Load all datasets of a set, compute the metric matrices and write them to a `.npz` file.
+
+    :param quantities: the list of quantities to compute; by default, all the keys of `QUANTITIES`
+    :param fname: the output file; by default the one returned by `get_metric_matrix_filename`
+    :return: the name of the file written
+    """
+    if quantities is None:
+        quantities = list(QUANTITIES)
+    if fname is None:
+        fname = get_metric_matrix_filename(set_name, data_folder=data_folder)
+
+    # Some methods only computed one of the sets
+    registry = DatasetRegistry(data_folder=data_folder, expected_script_version=None)
+    datasets = {label: registry.get(label, set_name) for label in get_dataset_labels(registry, set_name)}
+
+    systems, params = get_fit_parameters(datasets)
+    arrays = {
+        'labels': np.array(list(datasets)),
+        'systems': np.array(systems),
+        'fit_parameters': params,
+        'quantities': np.array(quantities),
+    }
+    for quantity in quantities:
+        arrays[quantity] = compute_metric_matrix(params, quantity)
+    np.savez_compressed(fname, **arrays)
+    return fname
+
+
+def is_metric_matrix_outdated(set_name, fname, data_folder=DATA_FOLDER):
+    """Return True if the file does not exist, or is older than `labels.json` or any of the datasets of the set."""
+    if not os.path.exists(fname):
+        return True
+    registry = DatasetRegistry(data_folder=data_folder, expected_script_version=None)
+    source_files = [os.path.join(data_folder, 'labels.json')] + [
+        registry.get_filename(label, set_name) for label in get_dataset_labels(registry, set_name)
+    ]
+    return any(os.path.getmtime(source) > os.path.getmtime(fname) for source in source_files)
+
+
+def load_metric_matrix(set_name, data_folder=DATA_FOLDER, fname=None):
+    """Load the metric matrices of a set, (re)generating the file first if it does not exist or is outdated.
+
+    :return: a dictionary with the `labels` of the datasets and the `systems` (lists of strings),
+        the `fit_parameters` array and one array of shape (num_datasets, num_datasets, num_systems)
+        for each quantity.
+    """
+    if fname is None:
+        fname = get_metric_matrix_filename(set_name, data_folder=data_folder)
+    if is_metric_matrix_outdated(set_name, fname, data_folder=data_folder):
+        generate_metric_matrix(set_name, data_folder=data_folder, fname=fname)
+
+    with np.load(fname) as npz:
+        matrix = {key: npz[key] for key in npz.files}
+    for key in ['labels', 'systems', 'quantities']:
+        matrix[key] = matrix[key].tolist()
+    return matrix
+
+
+def get_metric_values(matrix, quantity, label1, label2, systems=None):
+    """Return a dictionary {system: value} of a quantity between two datasets, skipping systems without data.
+
+    :param matrix: the dictionary returned by `load_metric_matrix`
+    :param label1: the label of the first (reference) dataset
+    :param label2: the label of the second (compared) dataset
+    :param systems: if specified, only return the values for these systems
+    """
+    values = matrix[quantity][matrix['labels'].index(label1), matrix['labels'].index(label2)]
+    if systems is not None:
+        systems = set(systems)
+    return {
+        system: float(value) for system, value in zip(matrix['systems'], values)
+        if not np.isnan(value) and (systems is None or system in systems)
+    }
+
+
+if __name__ == "__main__":
+    for SET_NAME in SET_NAMES:
+        print(f"File '{generate_metric_matrix(SET_NAME)}' written.")
@@ -1,14 +1,17 @@
 #!/usr/bin/env python
+import contextlib
+import io
 import json
-import os
+import multiprocessing
+import multiprocessing.util
 import sys
 
 import numpy as np
 import pylab as pl
 from scipy.optimize import curve_fit
-import tqdm
 
 import acwf_paper_plots.quantities_for_comparison as qc
+from acwf_paper_plots.dataset_registry import DatasetRegistry
 
 # As found in the paper, nu and eps can be roughly related via just a multiplication: nu=NU_EPS_FACTOR*eps
 # Use this to set a consistent maximum colorbar value
@@ -20,6 +23,8 @@ DEFAULT_wb1 = 1.0/400.0
 # Default prefactor if not indicated: 1.
 PREFACTOR_DICT = {'nu': 100.}
 EXPECTED_SCRIPT_VERSION = ["0.0.3","0.0.4"]
+# Datasets are loaded (and their version checked) only once, even if used for several sets and quantities
+DATASET_REGISTRY = DatasetRegistry(expected_script_version=EXPECTED_SCRIPT_VERSION)
 # NOTE! in the code, I call the function e.g. 'delta_per_formula_unit', but in reality I then already divide by
 # the number of atoms in the formula unit, so the numbers I get are per atom.
 # Therefore, the UNICODE name has 'per atom' since it is shown in the final plot
@@ -73,8 +78,27 @@ QUANTITIES = ['epsilon', 'nu', 'delta_per_formula_unit', 'delta_per_formula_unit
 EXPORT_SVG = False
 PRINT_JSON = False
 
-if len(sys.argv) == 2:
-    if sys.argv[1] == "MAIN":
+# Number of processes rendering the periodic tables in parallel (1: render them one after the other
+# in this process). It can be set with e.g. `--workers=8`, in addition to the name of the figure set.
+NUM_WORKERS = 1
+# How the periodic tables are drawn and exported: 'bokeh' (exported via a headless browser) or 'matplotlib'
+# (same layout, written directly to file, much faster and without the need of a browser).
+# It can be set with e.g. `--renderer=matplotlib`.
+RENDERER = 'bokeh'
+
+ARGS = []
+for arg in sys.argv[1:]:
+    if arg.startswith('--workers='):
+        NUM_WORKERS = int(arg[len('--workers='):])
+    elif arg.startswith('--renderer='):
+        RENDERER = arg[len('--renderer='):]
+        if RENDERER not in ['bokeh', 'matplotlib']:
+            raise ValueError(f"Unknown renderer '{RENDERER}', it must be 'bokeh' or 'matplotlib'")
+    else:
+        ARGS.append(arg)
+
+if len(ARGS) == 1:
+    if ARGS[0] == "MAIN":
         # FIGURE 2 IN MAIN TEXT
         USE_AE_AVERAGE_AS_REFERENCE = False
         REFERENCE_CODE_LABEL = "FLEUR@LAPW+LO"
@@ -84,7 +108,7 @@ if len(sys.argv) == 2:
         EXPORT_SVG = True
         PRINT_JSON = True
 
-    if sys.argv[1] == "SI-all-tables":
+    if ARGS[0] == "SI-all-tables":
         # Section S14
         USE_AE_AVERAGE_AS_REFERENCE = True
         LABELS_KEY = 'methods-main'
@@ -92,7 +116,7 @@ if len(sys.argv) == 2:
         EXPORT_JSON=True
         PRINT_LATEX_CODE=True
 
-    if sys.argv[1] == "SI-29-vs-960-highlight":
+    if ARGS[0] == "SI-29-vs-960-highlight":
         # Figure S39
         USE_AE_AVERAGE_AS_REFERENCE = True
         LABELS_KEY = 'methods-main'
@@ -117,7 +141,7 @@ if len(sys.argv) == 2:
             }
         }
 
-    if sys.argv[1] == "SI-VASP-1":
+    if ARGS[0] == "SI-VASP-1":
         # S27
         USE_AE_AVERAGE_AS_REFERENCE = True
         LABELS_KEY = 'methods-supplementary'
@@ -125,7 +149,7 @@ if len(sys.argv) == 2:
         QUANTITIES=["epsilon"]
         SET_NAMES = ['unaries']
 
-    if sys.argv[1] == "SI-VASP-2":
+    if ARGS[0] == "SI-VASP-2":
         # S27
         USE_AE_AVERAGE_AS_REFERENCE = True
         LABELS_KEY = 'methods-main'
@@ -134,7 +158,7 @@ if len(sys.argv) == 2:
         SET_NAMES = ['unaries']
 
 
-    if sys.argv[1] == "SI-PSEUDODOJO-SECTION-1":
+    if ARGS[0] == "SI-PSEUDODOJO-SECTION-1":
         # Section S16
         USE_AE_AVERAGE_AS_REFERENCE = False
         REFERENCE_CODE_LABEL = "ABINIT@PW|PseudoDojo-v0.4"
@@ -142,7 +166,7 @@ if len(sys.argv) == 2:
         ONLY_CODES = ["CASTEP@PW|PseudoDojo-v0.4-trim"]
         QUANTITIES=["epsilon"]
 
-    if sys.argv[1] == "SI-PSEUDODOJO-SECTION-2":
+    if ARGS[0] == "SI-PSEUDODOJO-SECTION-2":
         # Section S16
         USE_AE_AVERAGE_AS_REFERENCE = False
         REFERENCE_CODE_LABEL = "ABINIT@PW|PseudoDojo-v0.4"
@@ -150,7 +174,7 @@ if len(sys.argv) == 2:
         ONLY_CODES = ["Quantum ESPRESSO@PW|PseudoDojo-v0.4-trim"]
         QUANTITIES=["epsilon"]
 
-    if sys.argv[1] == "SI-PSEUDODOJO-SECTION-3":
+    if ARGS[0] == "SI-PSEUDODOJO-SECTION-3":
         # Section S16
         USE_AE_AVERAGE_AS_REFERENCE = False
         REFERENCE_CODE_LABEL = "CASTEP@PW|PseudoDojo-v0.4-trim"
@@ -158,7 +182,7 @@ if len(sys.argv) == 2:
         ONLY_CODES = ["Quantum ESPRESSO@PW|PseudoDojo-v0.4-trim"]
         QUANTITIES=["epsilon"]
 
-    if sys.argv[1] == "SI-PSEUDODOJO-SECTION-4":
+    if ARGS[0] == "SI-PSEUDODOJO-SECTION-4":
         # Section S16
         USE_AE_AVERAGE_AS_REFERENCE = False
         REFERENCE_CODE_LABEL = "SIRIUS/CP2K@PW|SSSP-prec-v1.2"
@@ -182,7 +206,12 @@ from bokeh.io import show as show_, export_png, export_svg
 from bokeh.sampledata.periodic_table import elements
 from bokeh.transform import dodge
 from bokeh.colors import RGB
-from matplotlib.colors import Normalize, LogNorm, to_hex, LinearSegmentedColormap
+from matplotlib.colors import Normalize, LogNorm, to_hex, LinearSegmentedColormap, ListedColormap
+from matplotlib.collections import PathCollection, PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.textpath import TextPath
+from matplotlib.ticker import MaxNLocator
+from matplotlib.transforms import Affine2D
 from matplotlib.cm import (
     plasma,
     inferno,
@@ -293,43 +322,25 @@ quantity_for_comparison_map = {
 
 def load_data(SET_NAME):
 
-    DATA_FOLDER = "../../../code-data"
-    with open(os.path.join(DATA_FOLDER, "labels.json")) as fhandle:
-        labels_data = json.load(fhandle)
-    
     if USE_AE_AVERAGE_AS_REFERENCE:
-        reference_data_files = labels_data['references']['all-electron average']
+        reference_label = 'all-electron average'
         reference_short_label = "ae"
     else:
-        reference_data_files = labels_data[LABELS_KEY][REFERENCE_CODE_LABEL]
-        reference_short_label = labels_data[LABELS_KEY][REFERENCE_CODE_LABEL]['short_label']
+        reference_label = REFERENCE_CODE_LABEL
+        reference_short_label = DATASET_REGISTRY.get_short_label(REFERENCE_CODE_LABEL)
     try:
-        with open(os.path.join(DATA_FOLDER, reference_data_files[SET_NAME])) as fhandle:
-            compare_plugin_data = json.load(fhandle)
-            if not compare_plugin_data['script_version'] in EXPECTED_SCRIPT_VERSION:
-                raise ValueError(
-                    f"This script only works with data generated at version {EXPECTED_SCRIPT_VERSION}. "
-                    f"Please re-run ./get_results.py to update the data format for the all-electron dataset!"
-                    )
-                #sys.exit(1)
-    except OSError:
+        compare_plugin_data = DATASET_REGISTRY.get(reference_label, SET_NAME)
+    except (KeyError, OSError):
         print(f"No data found for the all-electron dataset (set '{SET_NAME}'), it is the reference and must be present")
         sys.exit(1)
 
     code_results = {}
     short_labels = {}
-    for code_label in labels_data[LABELS_KEY]:
+    for code_label in DATASET_REGISTRY.get_labels(LABELS_KEY):
         if ONLY_CODES is not None and code_label not in ONLY_CODES:
             continue
-        short_labels[code_label] = labels_data[LABELS_KEY][code_label]['short_label']
-        with open(os.path.join(DATA_FOLDER, labels_data[LABELS_KEY][code_label][SET_NAME])) as fhandle:
-            code_results[code_label] = json.load(fhandle)
-            if not code_results[code_label]['script_version'] in EXPECTED_SCRIPT_VERSION:
-                raise ValueError(
-                    f"This script only works with data generated at version {EXPECTED_SCRIPT_VERSION}. "
-                    f"Please re-run ./get_results.py to update the data format for {code_label}! Skipping it"
-                    )
-                #code_results.pop(label)
+        short_labels[code_label] = DATASET_REGISTRY.get_short_label(code_label)
+        code_results[code_label] = DATASET_REGISTRY.get(code_label, SET_NAME)
 
     loaded_data = {
         "code_results": code_results,
@@ -344,10 +355,6 @@ def load_data(SET_NAME):
 def calculate_quantities(plugin_data, compare_plugin_data, QUANTITY):
     prefactor = PREFACTOR_DICT.get(QUANTITY, 1.)
 
-    all_systems = set(plugin_data['eos_data'].keys())
-    all_systems = set(plugin_data['BM_fit_data'].keys())
-    #all_systems.update(compare_plugin_data['BM_fit_data'].keys())
-
     collect = {
         "X/Diamond" : {"elements": [], "values": []},
         "X/FCC" : {"elements": [], "values": []},
@@ -361,58 +368,16 @@ def calculate_quantities(plugin_data, compare_plugin_data, QUANTITY):
         "X2O" : {"elements": [], "values": []}
         }
 
-    progress_bar = tqdm.tqdm(sorted(all_systems))
-    for element_and_configuration in progress_bar:
-        progress_bar.set_description(f"{element_and_configuration:12s}")
-        progress_bar.refresh()
-
-        element, configuration = element_and_configuration.split('-')
-        # Get the data for the reference plugin
-        ref_BM_fit_data = plugin_data['BM_fit_data'][f'{element}-{configuration}']
-    
-        if ref_BM_fit_data is None:
-            continue
-    
-        scaling_factor_ref = qc.get_volume_scaling_to_formula_unit(
-                plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}'],
-                element, configuration
-            )
-
-        # Here I normalize quantities, so that they are now per atom and not per formula unit!
-        # This does not change anything for epsilon and nu, but changes for delta
-        V0=ref_BM_fit_data['min_volume']/scaling_factor_ref
-        B0=ref_BM_fit_data['bulk_modulus_ev_ang3']
-        B01=ref_BM_fit_data['bulk_deriv']
-
-        # Get the data for the compare_with plugin, if specified (and if the EOS worked for the 
-        # reference plugin, otherwise we don't know which E0 to use)
-        try:
-            compare_BM_fit_data = compare_plugin_data['BM_fit_data'][f'{element}-{configuration}']
-            if compare_BM_fit_data is None:
-                # No fitting data in the plugin to compare with.
-                # Raise this exception that is catched one line below, so
-                # it will set `compare_eos_fit_energy` to None.
-                raise KeyError                    
-        except KeyError:
-            # Set to None if fit data is missing (if we are here, the EOS points
-            # are there, so it means that the fit failed). I will still plot the
-            # points
-            continue
+    # Only systems with a BM fit in both the reference and the compared plugin;
+    # volumes are normalized per formula unit (this does not change anything for epsilon and nu, but changes for delta)
+    systems, ref_params, compare_params = qc.get_common_fit_parameters(plugin_data, compare_plugin_data)
 
-        scaling_factor_comp = qc.get_volume_scaling_to_formula_unit(
-                compare_plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}'],
-                element, configuration
-            )
+    # All systems are computed in one (vectorized) call
+    quant = quantity_for_comparison_map[QUANTITY](*ref_params, *compare_params, prefactor, DEFAULT_wb0, DEFAULT_wb1)
 
-        # Here I normalize quantities, so that they are now per atom and not per formula unit!
-        # This does not change anything for epsilon and nu, but changes for delta
-        CV0=compare_BM_fit_data['min_volume']/scaling_factor_comp
-        CB0=compare_BM_fit_data['bulk_modulus_ev_ang3']
-        CB01=compare_BM_fit_data['bulk_deriv']
-
-        quant = quantity_for_comparison_map[QUANTITY](V0,B0,B01,CV0,CB0,CB01,prefactor,DEFAULT_wb0,DEFAULT_wb1)
-
-        collect[configuration]["values"].append(quant)
+    for element_and_configuration, value in zip(systems, quant.tolist()):
+        element, configuration = element_and_configuration.split('-')
+        collect[configuration]["values"].append(value)
         collect[configuration]["elements"].append(element)
 
     return collect
@@ -428,15 +393,14 @@ def export_json_file(SET_NAME, QUANTITY, collect, list_confs, short_labels, plug
     with open(f"{QUANTITY}-{SET_NAME}-{short_labels[plugin].replace(' ', '_')}-vs-{reference_short_label.replace(' ', '_')}.json", 'w') as fhandle:
         json.dump(data_to_export, fhandle)
 
-def create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, short_labels, plugin, reference_short_label, unaries, SET_MAX_SCALE):
+def compute_periodic_table_colors(SET_NAME, QUANTITY, collect, list_confs, plugin, SET_MAX_SCALE):
+    """
+    Compute the colors of the periodic table tiles, independently of how the table is then rendered.
 
-    width = 1050
-    width_cbar = 80 # needs to be manually adjusted to make the quads square...
-    alpha = 1.
-    extended = True
-    cbar_height = None
-    cbar_standoff = 12
-    cbar_fontsize = 14
+    Return the period and group of each element of `elements` (where the lanthanides and actinides are
+    placed in two additional rows), and for each configuration the list of colors and of highlight line alphas
+    of each element, as well as the color mapper (for the colorbar).
+    """
     blank_color = "#fafafa"
     under_value = None
     under_color = "#140F0E"
@@ -475,6 +439,8 @@ def create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, short_labels,
 
     per = [int(i) for i in elements["period"]]
     grou = [int(i) for i in elements["group"]]
+    # Index of each element in the table, from its (lowercase) chemical symbol
+    symbol_index = {symbol.lower(): index for index, symbol in zip(elements.index, elements.symbol)}
 
     # I put a large (for min) and small (default for empty sets)
     min_data = min([min(collect[i]["values"], default=100) for i in list_confs])
@@ -519,11 +485,8 @@ def create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, short_labels,
 
         # Compare elements in dataset with elements in periodic table
         for i, data_element in enumerate(data_elements):
-            element_entry = elements.symbol[
-                elements.symbol.str.lower() == data_element.lower()
-            ]
-            if element_entry.empty == False:
-                element_index = element_entry.index[0]
+            if data_element.lower() in symbol_index:
+                element_index = symbol_index[data_element.lower()]
             else:
                 warnings.warn("Invalid chemical symbol: " + data_element)
             if color_list[conf][element_index] != blank_color:
@@ -549,6 +512,160 @@ def create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, short_labels,
     if PRINT_NON_EXCELLENT:
         print(f">>> Non excellent agreement ({QUANTITY} >= {EXCELLENT_AGREEMENT_THRESHOLD[QUANTITY]}) for {len(non_excellent)}/{tot_count} systems: {','.join(non_excellent)}")
 
+    return per, grou, color_list, highlight_list, color_mapper
+
+
+def get_periodic_table_filename(SET_NAME, QUANTITY, short_labels, plugin, reference_short_label):
+    extension = "svg" if EXPORT_SVG else "png"
+    return f"periodic-table-{SET_NAME}-{short_labels[plugin].replace(' ', '_')}-vs-{reference_short_label.replace(' ', '_')}-{QUANTITY}.{extension}"
+
+
+# Outlines of the texts drawn by `add_centered_texts`, for each (text, fontsize)
+TEXT_PATHS_CACHE = {}
+
+def add_centered_texts(ax, texts, xs, ys, fontsize, color):
+    """
+    Draw texts centered at the given data coordinates, as a single collection of glyph outlines
+    (much faster to render than one matplotlib `Text` per element).
+    """
+    paths = []
+    for text in texts:
+        if (text, fontsize) not in TEXT_PATHS_CACHE:
+            path = TextPath((0, 0), text, size=fontsize)
+            extents = path.get_extents()
+            # Centered vertically on the capital letters, so that e.g. descenders do not move the text up
+            cap_extents = TextPath((0, 0), "X", size=fontsize).get_extents()
+            TEXT_PATHS_CACHE[(text, fontsize)] = path.transformed(
+                Affine2D().translate(-(extents.x0 + extents.x1) / 2, -(cap_extents.y0 + cap_extents.y1) / 2))
+        paths.append(TEXT_PATHS_CACHE[(text, fontsize)])
+    # The outlines are in points, the offsets in data coordinates
+    ax.add_collection(PathCollection(
+        paths, offsets=np.column_stack([xs, ys]), offset_transform=ax.transData,
+        transform=Affine2D().scale(ax.figure.dpi / 72.), facecolors=color, edgecolors="none"))
+
+
+def create_periodic_table_matplotlib(SET_NAME, QUANTITY, short_labels, plugin, reference_short_label, unaries,
+                                     per, grou, color_list, highlight_list, color_mapper):
+    """
+    Draw the periodic table with matplotlib, with the same layout as the bokeh version,
+    and save it directly to file (no browser is needed).
+    """
+    dpi = 100
+    # bokeh sizes are in pixels, matplotlib line widths in points
+    px = 72. / dpi
+    width = 1050
+    width_cbar = 80
+    height = 600
+    border_color = "#b5b5b5"
+    text_color = "#333333"
+
+    if unaries:
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        ax = fig.add_axes([0.01, 0.01, 0.98 - width_cbar / width, 0.91])
+    else:
+        fig = Figure(figsize=((width - width_cbar) / dpi, height / dpi), dpi=dpi)
+        ax = fig.add_axes([0.01, 0.01, 0.98, 0.91])
+    ax.set_xlim(0, 19)
+    ax.set_ylim(11, 0)
+    ax.set_axis_off()
+
+    left = [i - 0.45 for i in grou]
+    top = [i - 0.45 for i in per]
+
+    # For each tile: the configuration, and the x and y offsets and size of the sub-tile (in units of tile size)
+    if unaries:
+        tiles = [
+            ("X/Diamond", 0., 0.45, 0.45, 0.45),
+            ("X/SC", 0., 0., 0.45, 0.45),
+            ("X/BCC", 0.45, 0.45, 0.45, 0.45),
+            ("X/FCC", 0.45, 0., 0.45, 0.45),
+        ]
+    else:
+        tiles = [
+            ("X2O3", 0., 0., 0.45, 0.3),
+            ("X2O", 0., 0.3, 0.45, 0.3),
+            ("XO3", 0., 0.6, 0.45, 0.3),
+            ("X2O5", 0.45, 0., 0.45, 0.3),
+            ("XO2", 0.45, 0.3, 0.45, 0.3),
+            ("XO", 0.45, 0.6, 0.45, 0.3),
+        ]
+
+    # Corners of the sub-tiles of all elements, for each configuration, then drawn all at once
+    left = np.array(left)
+    top = np.array(top)
+    tile_corners = np.array([[0., 0.], [1., 0.], [1., 1.], [0., 1.]])
+    polygons = []
+    facecolors = []
+    highlights = []
+    for conf, dx, dy, w, h in tiles:
+        conf_polygons = np.stack([left + dx, top + dy], axis=-1)[:, np.newaxis, :] + tile_corners * [w, h]
+        polygons.append(conf_polygons)
+        facecolors += color_list[conf]
+        highlights.append(conf_polygons[np.array(highlight_list[conf]) > 0])
+    ax.add_collection(PolyCollection(np.concatenate(polygons), facecolors=facecolors, edgecolors="none"))
+    # border around each box
+    boxes = np.stack([left, top], axis=-1)[:, np.newaxis, :] + tile_corners * 0.9
+    ax.add_collection(PolyCollection(boxes, facecolors="none", edgecolors=border_color, linewidths=1 * px))
+    highlights = np.concatenate(highlights)
+    if len(highlights):
+        ax.add_collection(PolyCollection(highlights, facecolors="none", edgecolors="lime", linewidths=6 * px))
+
+    # The reference block
+    if unaries:
+        ref_tiles = [(5, 0, 1.5, 1.5, "SC"), (5, 1.5, 1.5, 1.5, "DIA"), (6.5, 0, 1.5, 1.5, "FCC"), (6.5, 1.5, 1.5, 1.5, "BCC")]
+    else:
+        ref_tiles = [
+            (5, 0, 1.5, 1, "X₂O₃"), (5, 1, 1.5, 1, "X₂O"), (5, 2, 1.5, 1, "XO₃"),
+            (6.5, 0, 1.5, 1, "X₂O₅"), (6.5, 1, 1.5, 1, "XO₂"), (6.5, 2, 1.5, 1, "XO"),
+        ]
+    ax.add_collection(PolyCollection(
+        [[x, y] + tile_corners * [w, h] for x, y, w, h, _ in ref_tiles],
+        facecolors="white", edgecolors="black", linewidths=1 * px))
+    add_centered_texts(
+        ax, [text for *_, text in ref_tiles], [x + w / 2 for x, _, w, _, _ in ref_tiles],
+        [y + h / 2 for _, y, _, h, _ in ref_tiles], fontsize=17, color="black")
+
+    # Element names
+    add_centered_texts(ax, elements["symbol"], grou, per, fontsize=16, color=text_color)
+
+    reference_label = 'all-electron average' if USE_AE_AVERAGE_AS_REFERENCE else REFERENCE_CODE_LABEL
+    ax.set_title(f"{UNICODE_QUANTITY[QUANTITY]} for {plugin} vs. {reference_label}", fontsize=16, loc="left")
+
+    # Skip the colorbar for oxides
+    if unaries:
+        if isinstance(color_mapper, LogColorMapper):
+            norm = LogNorm(vmin=color_mapper.low, vmax=color_mapper.high)
+        else:
+            norm = Normalize(vmin=color_mapper.low, vmax=color_mapper.high)
+        cax = fig.add_axes([0.995 - width_cbar / width + 12 / width, 0.05, 16 / width, 0.85])
+        colorbar = fig.colorbar(
+            ScalarMappable(norm=norm, cmap=ListedColormap(list(color_mapper.palette))),
+            cax=cax, ticks=MaxNLocator(10))
+        colorbar.outline.set_visible(False)
+        cax.tick_params(labelsize=14, length=0)
+
+    fig.savefig(get_periodic_table_filename(SET_NAME, QUANTITY, short_labels, plugin, reference_short_label), dpi=dpi)
+
+
+def create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, short_labels, plugin, reference_short_label, unaries, SET_MAX_SCALE):
+
+    per, grou, color_list, highlight_list, color_mapper = compute_periodic_table_colors(
+        SET_NAME, QUANTITY, collect, list_confs, plugin, SET_MAX_SCALE)
+
+    if RENDERER == "matplotlib":
+        create_periodic_table_matplotlib(
+            SET_NAME, QUANTITY, short_labels, plugin, reference_short_label, unaries,
+            per, grou, color_list, highlight_list, color_mapper)
+        return
+
+    width = 1050
+    width_cbar = 80 # needs to be manually adjusted to make the quads square...
+    alpha = 1.
+    extended = True
+    cbar_height = None
+    cbar_standoff = 12
+    cbar_fontsize = 14
+
     if unaries:
         # Define figure properties for visualizing data
         source = ColumnDataSource(
@@ -766,10 +883,14 @@ def create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, short_labels,
         show_(p)
     else:
         try:
+            # The headless browser is started on the first export, and then reused for all the others in this process
+            # (imported here as it requires selenium, that is not needed by the other renderers)
+            from bokeh.io.webdriver import webdriver_control
+            fname = get_periodic_table_filename(SET_NAME, QUANTITY, short_labels, plugin, reference_short_label)
             if EXPORT_SVG:
-                export_svg(p, filename=f"periodic-table-{SET_NAME}-{short_labels[plugin].replace(' ', '_')}-vs-{reference_short_label.replace(' ', '_')}-{QUANTITY}.svg")
+                export_svg(p, filename=fname, webdriver=webdriver_control.get())
             else:
-                export_png(p, filename=f"periodic-table-{SET_NAME}-{short_labels[plugin].replace(' ', '_')}-vs-{reference_short_label.replace(' ', '_')}-{QUANTITY}.png")
+                export_png(p, filename=fname, webdriver=webdriver_control.get())
 
         except RuntimeError as exc:
             msg = str(exc)
@@ -796,9 +917,13 @@ in this case udpate it).
 
 
 
-def plot_periodic_tables(SET_NAME, QUANTITY, measures_max_and_avg, master_data_dict):
-
+def get_periodic_table_jobs(SET_NAME, QUANTITY, measures_max_and_avg, master_data_dict):
+    """
+    Return the list of periodic tables to plot for a set and a quantity, one per method, as tuples
+    of arguments of `create_periodic_table` (the JSON files, if requested, are already exported here).
+    """
     ld = master_data_dict[SET_NAME]["loaded_data"]
+    jobs = []
 
     for plugin, plugin_data in ld["code_results"].items():
 
@@ -850,7 +975,54 @@ def plot_periodic_tables(SET_NAME, QUANTITY, measures_max_and_avg, master_data_d
         else:
             raise ValueError("Unknown max scale type!")
 
-        create_periodic_table(SET_NAME, QUANTITY, collect, list_confs, ld["short_labels"], plugin, ld["reference_short_label"], unaries, SET_MAX_SCALE)
+        jobs.append((SET_NAME, QUANTITY, collect, list_confs, ld["short_labels"], plugin, ld["reference_short_label"], unaries, SET_MAX_SCALE))
+
+    return jobs
+
+
+def _render_periodic_table(job):
+    """
+    Create a periodic table in a worker process, returning what was printed,
+    so that the main process can print it in the order of the jobs.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        create_periodic_table(*job)
+    return output.getvalue()
+
+
+def _close_webdrivers():
+    if 'bokeh.io.webdriver' in sys.modules:
+        sys.modules['bokeh.io.webdriver'].webdriver_control.cleanup()
+
+
+def _init_render_worker():
+    # Pool workers do not run the `atexit` handlers with which bokeh closes its browser
+    multiprocessing.util.Finalize(None, _close_webdrivers, exitpriority=10)
+
+
+def render_periodic_tables(jobs, num_workers=1):
+    """
+    Create the periodic tables of a list of jobs (see `get_periodic_table_jobs`).
+
+    With more than one worker, the jobs are distributed over a pool of processes, each reusing its own headless
+    browser for all its exports. Each job writes its own file, and the messages are printed in the order of
+    the jobs, so the outputs are the same as when rendering serially.
+    """
+    if num_workers <= 1 or SHOW_IN_BROWSER:
+        for job in jobs:
+            create_periodic_table(*job)
+        return
+
+    # 'spawn' re-imports this script in each worker, with the same command-line arguments,
+    # so that the workers use the same settings
+    with multiprocessing.get_context('spawn').Pool(num_workers, initializer=_init_render_worker) as pool:
+        for output in pool.imap(_render_periodic_table, jobs):
+            print(output, end='')
+        # Let the workers exit normally (leaving the `with` block terminates them), so that their finalizers close
+        # the browsers
+        pool.close()
+        pool.join()
 
 
 def find_code_measures_max_and_avg(master_data_dict):
@@ -1026,8 +1198,10 @@ if __name__ == "__main__":
 
 
     print("Plotting the periodic tables.")
+    jobs = []
     for SET_NAME in SET_NAMES:
         for QUANTITY in QUANTITIES:
-            plot_periodic_tables(SET_NAME, QUANTITY, measures_max_and_avg, master_data_dict)
+            jobs += get_periodic_table_jobs(SET_NAME, QUANTITY, measures_max_and_avg, master_data_dict)
+    render_periodic_tables(jobs, num_workers=NUM_WORKERS)
 
     analyze_stats(master_data_dict)
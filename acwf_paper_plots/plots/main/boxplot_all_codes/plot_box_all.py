@@ -1,10 +1,9 @@
 #!/usr/bin/env python
-import json
 import matplotlib.pyplot as plt
-import os
 import sys
 import copy
 import acwf_paper_plots.quantities_for_comparison as qc
+from acwf_paper_plots.dataset_registry import DatasetRegistry
 
 plt.rcParams.update({
     "text.usetex": True,
@@ -64,13 +63,11 @@ QUANTITY_FANCY_NAMES = {
     'B1': "$B_1$"
 }
 
-DATA_FOLDER = "../../../code-data"
-with open(os.path.join(DATA_FOLDER, "labels.json")) as fhandle:
-    labels_data = json.load(fhandle)
-code_labels = list(labels_data['methods-main'].keys())[::-1] # invert order because they are plot bottom to top, so we keep them alphabetical
+DATASET_REGISTRY = DatasetRegistry(expected_script_version=EXPECTED_SCRIPT_VERSION)
+code_labels = DATASET_REGISTRY.get_labels('methods-main')[::-1] # invert order because they are plot bottom to top, so we keep them alphabetical
 
 ALL_ELECTRON_CODES_SHORT = ["FLEUR", "WIEN2k"][::-1] # Revert order as they are printed from top to bottom
-ALL_ELECTRON_CODES = [labels_data['all-electron-keys'][short_label] for short_label in ALL_ELECTRON_CODES_SHORT]
+ALL_ELECTRON_CODES = [DATASET_REGISTRY.labels_data['all-electron-keys'][short_label] for short_label in ALL_ELECTRON_CODES_SHORT]
 
 
 def generate_box_plt(set_names, file_name, material_set_label, file_suffix, only_must_have_elements=None, keep_only_codes=None):
@@ -113,11 +110,9 @@ def generate_box_plt(set_names, file_name, material_set_label, file_suffix, only
             plugin_small = 0
             out_data[code_label] = {}
             for set_name in set_names:
-                reference_data_files = labels_data['references']['all-electron average']
-                with open(os.path.join(DATA_FOLDER, reference_data_files[set_name])) as fhandle:
-                    ref_plugin_data = json.load(fhandle)
-                with open(os.path.join(DATA_FOLDER, labels_data['methods-main'][code_label][set_name])) as fhandle:
-                    plugin_data = json.load(fhandle)
+                # Datasets are only loaded the first time, and then reused for all quantities
+                ref_plugin_data = DATASET_REGISTRY.get('all-electron average', set_name)
+                plugin_data = DATASET_REGISTRY.get(code_label, set_name)
 
                 ref_BM_fit_data = ref_plugin_data['BM_fit_data']
                 # List the reference systems that have BM fit data
@@ -158,36 +153,18 @@ def generate_box_plt(set_names, file_name, material_set_label, file_suffix, only
                         print(f"   -> Plotting: {len(new_plot_systems)}")
                 plot_systems = new_plot_systems
 
-                for element_and_configuration in plot_systems:
-                    element, configuration = element_and_configuration.split('-')
-                
-                    ref_n_atoms = ref_plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}']
-                    ref_scaling_factor = qc.get_volume_scaling_to_formula_unit(
-                        ref_n_atoms, element, configuration
-                    )
-                    ref_V0 = ref_BM_fit_data[f'{element}-{configuration}']['min_volume'] / ref_scaling_factor
-                    ref_B0 = ref_BM_fit_data[f'{element}-{configuration}']['bulk_modulus_ev_ang3']
-                    ref_B01 = ref_BM_fit_data[f'{element}-{configuration}']['bulk_deriv']
-
-                    plugin_n_atoms = plugin_data['num_atoms_in_sim_cell'][f'{element}-{configuration}']
-                    plugin_scaling_factor = qc.get_volume_scaling_to_formula_unit(
-                        plugin_n_atoms, element, configuration
-                    )
-                    plugin_V0 = plugin_BM_fit_data[f'{element}-{configuration}']['min_volume'] / plugin_scaling_factor
-                    plugin_B0 = plugin_BM_fit_data[f'{element}-{configuration}']['bulk_modulus_ev_ang3']
-                    plugin_B01 = plugin_BM_fit_data[f'{element}-{configuration}']['bulk_deriv']
-
-                    quantity_value = quantity_for_comparison_map[quantity_name](
-                        ref_V0, ref_B0, ref_B01,
-                        plugin_V0, plugin_B0, plugin_B01,
-                        DEFAULT_PREFACTOR, DEFAULT_WB0, DEFAULT_WB01
-                    )
+                # Compute the quantity for all systems at once
+                _, ref_params, plugin_params = qc.get_common_fit_parameters(
+                    ref_plugin_data, plugin_data, systems=plot_systems
+                )
+                quantity_values = quantity_for_comparison_map[quantity_name](
+                    *ref_params, *plugin_params,
+                    DEFAULT_PREFACTOR, DEFAULT_WB0, DEFAULT_WB01
+                )
 
-                    plugin_values.append(quantity_value)
-                    if quantity_value < xlims[quantity_name][0]:
-                        plugin_big = plugin_big+1  
-                    if quantity_value > xlims[quantity_name][1]:
-                        plugin_small = plugin_small+1
+                plugin_values.extend(quantity_values.tolist())
+                plugin_big += int((quantity_values < xlims[quantity_name][0]).sum())
+                plugin_small += int((quantity_values > xlims[quantity_name][1]).sum())
 
             out_data[code_label]['values'] = plugin_values
             out_data[code_label]['big'] = plugin_big
@@ -1,6 +1,4 @@
 #!/usr/bin/env python
-import json
-import os
 import sys
 
 import numpy as np
@@ -9,6 +7,7 @@ from scipy.optimize import curve_fit
 import tqdm
 
 import acwf_paper_plots.quantities_for_comparison as qc
+from acwf_paper_plots.dataset_registry import DatasetRegistry
 
 # Adapt this factor to change the zoom on the x axis
 # The default zoom is obtained from the standard deviation of the data
@@ -40,11 +39,9 @@ quantity_for_comparison_map = {
 }
 
 
-DATA_FOLDER = "../../../code-data"
-with open(os.path.join(DATA_FOLDER, "labels.json")) as fhandle:
-    labels_data = json.load(fhandle)
-FLEUR_LABEL = labels_data['all-electron-keys']["FLEUR"]
-WIEN2k_LABEL = labels_data['all-electron-keys']["WIEN2k"]
+DATASET_REGISTRY = DatasetRegistry(expected_script_version=EXPECTED_SCRIPT_VERSION)
+FLEUR_LABEL = DATASET_REGISTRY.labels_data['all-electron-keys']["FLEUR"]
+WIEN2k_LABEL = DATASET_REGISTRY.labels_data['all-electron-keys']["WIEN2k"]
 
 def generate_histo(sets, name_file):
     """
@@ -53,24 +50,8 @@ def generate_histo(sets, name_file):
     compare_plugin_data = []
 
     for SET_NAME in sets:
-
-        with open(os.path.join(DATA_FOLDER, labels_data['methods-main'][WIEN2k_LABEL][SET_NAME])) as fhandle:
-            reference_plugin_data.append(json.load(fhandle))
- 
-        if not reference_plugin_data[-1]['script_version'] in EXPECTED_SCRIPT_VERSION:
-            raise ValueError(
-                f"This script only works with data generated at version {EXPECTED_SCRIPT_VERSION}. "
-                f"Please re-run ./get_results.py to update the data format for WIEN2k!"
-                )
-
-        with open(os.path.join(DATA_FOLDER, labels_data['methods-main'][FLEUR_LABEL][SET_NAME])) as fhandle:
-            compare_plugin_data.append(json.load(fhandle))
-
-        if not compare_plugin_data[-1]['script_version'] in EXPECTED_SCRIPT_VERSION:
-            raise ValueError(
-                f"This script only works with data generated at version {EXPECTED_SCRIPT_VERSION}. "
-                f"Please re-run ./get_results.py to update the data format for FLEUR!"
-                )
+        reference_plugin_data.append(DATASET_REGISTRY.get(WIEN2k_LABEL, SET_NAME))
+        compare_plugin_data.append(DATASET_REGISTRY.get(FLEUR_LABEL, SET_NAME))
 
     # Plotting
     #fig = pl.figure(figsize=(18,6))
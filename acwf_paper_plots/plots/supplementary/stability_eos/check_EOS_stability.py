@@ -12,7 +12,7 @@ from scipy.optimize import curve_fit
 from scipy.stats import pearsonr
 import matplotlib.pyplot as plt
 import tqdm
-from acwf_paper_plots.eosfit_31_adapted import BM
+from acwf_paper_plots.eosfit_31_adapted import BM, BM_batch
 from acwf_paper_plots.quantities_for_comparison import birch_murnaghan
 
 eV_over_ang3_to_GPa = 160.21766208
@@ -150,46 +150,68 @@ def fit_eos(EV, eos_type='BM'):
                 'equilibrium_vol_in_A3': popt[1]}
     return out_dict
 
-def perturb_en(data, noise_sigma):
-    l = len(data)
-    noise = np.random.normal(0, noise_sigma, l)
-    noisy_data = np.array(data) + noise
-    return noisy_data
+# Maximum number of noisy E(V) curves fitted together by `get_statistics`; this bounds the memory used,
+# independently of the number of samples
+MAX_CURVES_PER_BATCH = 200000
 
-def get_statistics(dataset, noise_sigma, volumes_percents, nr_of_samples=10000):
-    deviations = {}
+def get_statistics(dataset, noise_sigma, volumes_percents, nr_of_samples=10000, seed=None):
+    """
+    For each system, evaluate the BM curve of `dataset` at the given volumes (as fractions of V0), perturb
+    the energies with Gaussian noise of standard deviation `noise_sigma` and fit them again, `nr_of_samples` times.
+
+    All samples of all systems are generated as (systems x samples x volumes) arrays and fitted together with
+    `BM_batch`, in chunks of samples; for each system, only the sums of the absolute deviations and the number
+    of successful fits are accumulated, so that the memory does not grow with the number of samples.
+
+    Return a dictionary with, for each system, the mean absolute (symmetric, in percent, as in the definition
+    of epsilon and nu) deviations 'mean_V0', 'mean_B0', 'mean_B1' and 'mean_E0' of the noisy fits from the fit
+    without noise at the same volumes, and the number of 'failed_runs' (noisy curves where no minimum was found).
+    """
+    rng = np.random.default_rng(seed)
+    systems = sorted(key for key, val in dataset['BM_fit_data'].items() if val is not None)
+    fit_data = [dataset['BM_fit_data'][key] for key in systems]
+    min_volumes = np.array([val['min_volume'] for val in fit_data])[:, np.newaxis]
+    volumes = min_volumes * np.array(volumes_percents)
+    en_ok_murn = birch_murnaghan(
+        volumes, 0, min_volumes,
+        np.array([val['bulk_modulus_ev_ang3'] for val in fit_data])[:, np.newaxis],
+        np.array([val['bulk_deriv'] for val in fit_data])[:, np.newaxis]
+    )
+    num_systems, num_volumes = volumes.shape
+
+    # Fit without noise with the (possibly) different volumes, used as reference.
+    # The parameters are in the order V0, B0, B1, E0 (the same of the stats returned)
+    V0, E0, B0, B1, _, _ = BM_batch(np.stack([volumes, en_ok_murn], axis=-1))
+    reference = np.array([V0, B0, B1, E0])[:, :, np.newaxis]
+
+    abs_deviation_sums = np.zeros((4, num_systems))
+    num_ok_runs = np.zeros(num_systems, dtype=int)
+    samples_per_batch = max(1, MAX_CURVES_PER_BATCH // max(num_systems, 1))
+    with tqdm.tqdm(total=nr_of_samples) as progress_bar:
+        for first_sample in range(0, nr_of_samples, samples_per_batch):
+            num_samples = min(samples_per_batch, nr_of_samples - first_sample)
+            noisy_energies = en_ok_murn[:, np.newaxis, :] + rng.normal(0, noise_sigma, (num_systems, num_samples, num_volumes))
+            curves = np.stack([np.broadcast_to(volumes[:, np.newaxis, :], noisy_energies.shape), noisy_energies], axis=-1)
+            V0, E0, B0, B1, _, failed = BM_batch(curves.reshape(-1, num_volumes, 2))
+            fitted = np.array([V0, B0, B1, E0]).reshape(4, num_systems, num_samples)
+            failed = failed.reshape(num_systems, num_samples)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                # Symmetric deviation, as in the definition of epsilon and nu
+                deviations = 100 * (reference - fitted) / ((reference + fitted) / 2)
+            abs_deviation_sums += np.where(failed, 0., np.abs(deviations)).sum(axis=2)
+            num_ok_runs += (~failed).sum(axis=1)
+            progress_bar.update(num_samples)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_abs_deviations = abs_deviation_sums / num_ok_runs
     stats = {}
-    progress_bar = tqdm.tqdm(sorted(dataset['BM_fit_data'].items()))
-    for key, val in progress_bar:
-        deviations[key] = {'bulk_modulus': [],
-                           'bulk_modulus_derivative': [],
-                           'equilibrium_volume': [],
-                           'total_energy': [],
-                           'failed_runs': 0}
-        volumes_list = [i*val['min_volume'] for i in volumes_percents]
-        en_ok_murn = birch_murnaghan(np.array(volumes_list), 0, val['min_volume'], val["bulk_modulus_ev_ang3"], val['bulk_deriv'])
-        data_diff_vols = np.array([[volumes_list[i], en_ok_murn[i]] for i in range(len(en_ok_murn))])
-        new_fit_with_different_vols = fit_eos(data_diff_vols, eos_type='AiiDA')
-        #print(val['min_volume'], new_fit_with_different_vols['fitted_parameters']['equilibrium_volume'])
-        for i in range(nr_of_samples):
-            new_en = perturb_en(en_ok_murn, noise_sigma)
-            data = np.array([[volumes_list[i], new_en[i]] for i in range(len(new_en))])
-            try:
-                eos = fit_eos(data, eos_type='AiiDA')
-                for k, v in eos['fitted_parameters'].items():
-                    # Symmetric deviation, as in the definition of epsilon and nu
-                    dev = (100*
-                        (new_fit_with_different_vols['fitted_parameters'][k]-eos['fitted_parameters'][k])/
-                        ((new_fit_with_different_vols['fitted_parameters'][k]+eos['fitted_parameters'][k])/2)
-                    )
-                    deviations[key][k].append(dev)
-            except Exception:
-                deviations[key]['failed_runs'] += 1
-        stats[key] = {'mean_V0': np.mean(abs(np.asarray(deviations[key]['equilibrium_volume']))),
-                      'mean_B0': np.mean(abs(np.asarray(deviations[key]['bulk_modulus']))),
-                      'mean_B1': np.mean(abs(np.asarray(deviations[key]['bulk_modulus_derivative']))),
-                      'mean_E0': np.mean(abs(np.asarray(deviations[key]['total_energy'])))}
-    return stats, deviations
+    for idx, key in enumerate(systems):
+        stats[key] = {'mean_V0': mean_abs_deviations[0, idx],
+                      'mean_B0': mean_abs_deviations[1, idx],
+                      'mean_B1': mean_abs_deviations[2, idx],
+                      'mean_E0': mean_abs_deviations[3, idx],
+                      'failed_runs': int(nr_of_samples - num_ok_runs[idx])}
+    return stats
 
 
 if __name__ == '__main__':
@@ -205,7 +227,7 @@ if __name__ == '__main__':
             unaries = json.load(fhandle)
             
     noise_sigma = 1E-4
-    nr_of_samples = 100
+    nr_of_samples = 10000
     nr_volume_points = 7
     max_and_min_percentage = [0.94, 1.06]
 
@@ -218,9 +240,9 @@ if __name__ == '__main__':
     #oxides_fname = f'oxides_ae_{noise_sigma}'
 
     print("Unaries set:")
-    stats_unaries, deviations_unaries = get_statistics(unaries, noise_sigma, set_vols_perc, nr_of_samples)
+    stats_unaries = get_statistics(unaries, noise_sigma, set_vols_perc, nr_of_samples)
     print("Oxides set:")
-    stats_oxides, deviations_oxides = get_statistics(oxides, noise_sigma, set_vols_perc, nr_of_samples)
+    stats_oxides = get_statistics(oxides, noise_sigma, set_vols_perc, nr_of_samples)
 
     print('Generating histograms...')
     make_histograms(stats=stats_unaries, bins=50, fname="Unaries", title="Unaries")
@@ -43,6 +43,51 @@ def get_volume_scaling_to_formula_unit(num_atoms_in_cell, element, configuration
     scaling = num_atoms_in_cell / num_atoms_in_formula_unit
     return scaling
 
+def get_common_fit_parameters(reference_data, compare_data, systems=None):
+    """Return, as arrays, the BM fit parameters of the systems with a successful fit in both datasets.
+
+    The returned arrays can be passed directly to all the comparison functions of this module
+    (delta, epsilon, nu, ...), that all work element-wise on arrays, to compute a quantity for
+    all systems in one call, e.g. `epsilon(*ref_params, *compare_params, prefact, weight_b0, weight_b1)`.
+    The volumes are rescaled with `get_volume_scaling_to_formula_unit`.
+
+    :param reference_data: the content of a `results-*.json` file (reference code)
+    :param compare_data: the content of a `results-*.json` file (code to compare)
+    :param systems: an iterable of strings like 'Ag-X/FCC'; if not specified, all the systems of the reference
+    :return: a tuple (systems, ref_params, compare_params): the sorted list of systems with a fit in both
+        datasets, and two arrays of shape (3, len(systems)) with V0, B0 (in eV/ang^3) and B1 for each system.
+    """
+    if systems is None:
+        systems = reference_data['BM_fit_data'].keys()
+
+    common_systems = []
+    ref_params = []
+    compare_params = []
+    for element_and_configuration in sorted(systems):
+        ref_BM_fit_data = reference_data['BM_fit_data'].get(element_and_configuration)
+        compare_BM_fit_data = compare_data['BM_fit_data'].get(element_and_configuration)
+        if ref_BM_fit_data is None or compare_BM_fit_data is None:
+            continue
+
+        element, configuration = element_and_configuration.split('-')
+        common_systems.append(element_and_configuration)
+        for data, BM_fit_data, params in [
+                (reference_data, ref_BM_fit_data, ref_params),
+                (compare_data, compare_BM_fit_data, compare_params)]:
+            scaling_factor = get_volume_scaling_to_formula_unit(
+                data['num_atoms_in_sim_cell'][element_and_configuration], element, configuration)
+            params.append([
+                BM_fit_data['min_volume'] / scaling_factor,
+                BM_fit_data['bulk_modulus_ev_ang3'],
+                BM_fit_data['bulk_deriv']
+            ])
+
+    return (
+        common_systems,
+        np.array(ref_params, dtype=float).reshape(-1, 3).T,
+        np.array(compare_params, dtype=float).reshape(-1, 3).T
+    )
+
 def birch_murnaghan(V,E0,V0,B0,B01):
     """
     Return the energy for given volume (V - it can be a vector) according to
@@ -249,9 +294,14 @@ def epsilon(v0w, b0w, b1w, v0f, b0f, b1f, prefact, weight_b0, weight_b1):
 
     #We saw a case when, for numerical error, intdiff2 was negative
     #(about -1*10^{-13}). For this reason, we add a safty check.
-    if eps2 < 0.0:
-        print(f"eps2 = {eps2}, negative due to numerical error probably, we take the absolute value")
-        eps2 = abs(eps2)
+    #This is done element-wise, so that all functions also work on arrays of systems.
+    negative = eps2 < 0.0
+    if np.any(negative):
+        if np.ndim(eps2):
+            print(f"{np.sum(negative)} values of eps2 (min: {np.min(eps2[negative])}) negative due to numerical error probably, we take the absolute value")
+        else:
+            print(f"eps2 = {eps2}, negative due to numerical error probably, we take the absolute value")
+        eps2 = np.abs(eps2)
     
     return np.sqrt(eps2)*prefact
 
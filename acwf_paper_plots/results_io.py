@@ -0,0 +1,213 @@
+"""Streaming writer and loader of the results files of `get_results.py`.
+
+Besides the standard (indented) `results-*.json` files, results can be written in a compact streamed format,
+one JSON document per line (optionally gzip-compressed, if the file name ends with `.gz`):
+
+- a header line, with the format name and version, the `script_version`, the `set_name` and the list of
+  the per-system fields (`eos_data`, `BM_fit_data`, ...);
+- one line per system, written as soon as the system is processed, with its name (e.g. "Ag-X/FCC")
+  and the value of each per-system field for that system;
+- a last line with the summary fields (`failed_wfs`, `completely_off`, ...).
+
+Use `load_results` to read a results file in either format: it always returns the same dictionary as
+the standard JSON file.
+
+The stresses of all systems (the `stress_data` field) can also be stored as contiguous arrays in a `.npz` file,
+see `get_stress_arrays` (or `StressArraysBuilder`, to fill them one system at a time), `save_stress_arrays` and
+`load_stress_arrays`.
+"""
+import gzip
+import json
+import os
+
+import numpy as np
+
+STREAM_FORMAT = 'acwf-results-stream'
+STREAM_FORMAT_VERSION = 1
+# Extensions of the streamed files, tried by `load_results` if a `.json` file does not exist
+STREAM_EXTENSIONS = ['.jsonl', '.jsonl.gz']
+
+
+def open_results_file(fname, mode='r'):
+    """Open a results file in text mode, decompressing or compressing it if the name ends with `.gz`."""
+    if fname.endswith('.gz'):
+        return gzip.open(fname, mode + 't', encoding='utf-8')
+    return open(fname, mode, encoding='utf-8')
+
+
+class ResultsWriter:
+    """Write a results file in the streamed format, one system at a time.
+
+    Use it as a context manager::
+
+        with ResultsWriter(fname, script_version, set_name, system_fields) as writer:
+            writer.write_system('Ag-X/FCC', {'eos_data': ..., 'BM_fit_data': ...})
+            ...
+            writer.write_summary({'failed_wfs': ..., 'completely_off': ...})
+
+    :param system_fields: the list of the per-system fields, that are dictionaries with the systems as keys
+        once the file is loaded with `load_results`.
+    """
+
+    def __init__(self, fname, script_version, set_name, system_fields):
+        self.fname = fname
+        self.system_fields = list(system_fields)
+        self._fhandle = open_results_file(fname, 'w')
+        self._write_line({
+            'format': STREAM_FORMAT,
+            'format_version': STREAM_FORMAT_VERSION,
+            'script_version': script_version,
+            'set_name': set_name,
+            'system_fields': self.system_fields,
+        })
+
+    def _write_line(self, value):
+        self._fhandle.write(json.dumps(value, separators=(',', ':')))
+        self._fhandle.write('\n')
+
+    def write_system(self, system, values):
+        """Write the values of the per-system fields for one system (a dictionary with the fields as keys)."""
+        unknown_fields = set(values) - set(self.system_fields)
+        if unknown_fields:
+            raise ValueError(f"Unknown per-system fields {sorted(unknown_fields)} for system '{system}'")
+        self._write_line({'system': system, 'values': values})
+
+    def write_summary(self, summary):
+        """Write the summary fields (a dictionary); this must be the last call before closing the writer."""
+        self._write_line({'summary': summary})
+
+    def close(self):
+        self._fhandle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_stream(fhandle):
+    """Read a results file in the streamed format from an open file, returning the standard results dictionary."""
+    header = json.loads(fhandle.readline())
+    if header.get('format') != STREAM_FORMAT or header.get('format_version') != STREAM_FORMAT_VERSION:
+        raise ValueError(f"Unsupported results stream format: {header.get('format')} {header.get('format_version')}")
+
+    data = {'script_version': header['script_version'], 'set_name': header['set_name']}
+    for field in header['system_fields']:
+        data[field] = {}
+    summary = None
+    for line in fhandle:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        if 'summary' in entry:
+            summary = entry['summary']
+            continue
+        for field, value in entry['values'].items():
+            data[field][entry['system']] = value
+    if summary is None:
+        raise ValueError("Incomplete results stream: the summary line is missing (was the file fully written?)")
+    data.update(summary)
+    return data
+
+
+def find_results_file(fname):
+    """Return the name of the results file to read for `fname`.
+
+    This is `fname` itself if it exists; otherwise, if it ends with `.json`, the first existing streamed file with the
+    same name and one of the extensions of `STREAM_EXTENSIONS` (or `fname` if none exists).
+    """
+    if not os.path.exists(fname) and fname.endswith('.json'):
+        for extension in STREAM_EXTENSIONS:
+            candidate = fname[:-len('.json')] + extension
+            if os.path.exists(candidate):
+                return candidate
+    return fname
+
+
+def load_results(fname):
+    """Load a results file, either a standard JSON file or in the streamed format (see `ResultsWriter`).
+
+    If `fname` ends with `.json` but does not exist, the streamed files with the same name and the extensions
+    of `STREAM_EXTENSIONS` are tried, so that scripts can keep looking for `results-*.json` files.
+
+    :raises FileNotFoundError: if no file is found.
+    """
+    with open_results_file(find_results_file(fname)) as fhandle:
+        first_line = fhandle.readline()
+        try:
+            is_stream = json.loads(first_line).get('format') == STREAM_FORMAT
+        except (ValueError, AttributeError):
+            # The first line of a standard, indented JSON file is just '{'
+            is_stream = False
+        fhandle.seek(0)
+        if is_stream:
+            return read_stream(fhandle)
+        return json.load(fhandle)
+
+
+class StressArraysBuilder:
+    """Fill the stress arrays of `get_stress_arrays` one system at a time, without keeping the nested lists.
+
+    The arrays are allocated once for the maximum number of systems and of volumes; `get_stress_arrays` then returns
+    them trimmed to the systems actually added.
+
+    :param max_num_systems: the maximum number of systems that will be added.
+    :param max_num_volumes: the maximum number of volumes of a system.
+    """
+
+    def __init__(self, max_num_systems, max_num_volumes):
+        self.systems = []
+        self.volumes = np.full((max_num_systems, max_num_volumes), np.nan)
+        self.stresses = np.full((max_num_systems, max_num_volumes, 3, 3), np.nan)
+        self._num_volumes = 0
+
+    def add(self, system, points):
+        """Add the stresses of a system; `points` is a list of [volume, stress] pairs, or None (nothing is added)."""
+        if points is None:
+            return
+        row = len(self.systems)
+        self.systems.append(system)
+        for col, (volume, stress) in enumerate(points):
+            self.volumes[row, col] = volume
+            if stress is not None:
+                self.stresses[row, col] = stress
+        self._num_volumes = max(self._num_volumes, len(points))
+
+    def get_stress_arrays(self):
+        """Return the arrays of the systems added so far, in the format of `get_stress_arrays`."""
+        num_systems = len(self.systems)
+        return {
+            'systems': list(self.systems),
+            'volumes': np.ascontiguousarray(self.volumes[:num_systems, :self._num_volumes]),
+            'stresses': np.ascontiguousarray(self.stresses[:num_systems, :self._num_volumes]),
+        }
+
+
+def get_stress_arrays(stress_data):
+    """Convert the stresses of many systems to contiguous arrays, padded with NaN.
+
+    :param stress_data: a dictionary {system: points}, as the `stress_data` of a results file, where the points are
+        a list of [volume, stress] pairs (the stress being a 3x3 nested list, or None), or None (the system is skipped).
+    :return: a dictionary with the list of `systems` (the index of each system is its row in the arrays),
+        the `volumes` array of shape (num_systems, max_num_volumes) and the `stresses` array of shape
+        (num_systems, max_num_volumes, 3, 3). The padding, and the stresses of the volumes without stress, are NaN.
+    """
+    systems = [system for system, points in stress_data.items() if points is not None]
+    builder = StressArraysBuilder(len(systems), max((len(stress_data[system]) for system in systems), default=0))
+    for system in systems:
+        builder.add(system, stress_data[system])
+    return builder.get_stress_arrays()
+
+
+def save_stress_arrays(fname, stress_arrays):
+    """Write the stress arrays returned by `get_stress_arrays` to a `.npz` file."""
+    np.savez(
+        fname, systems=np.array(stress_arrays['systems'], dtype=str),
+        volumes=stress_arrays['volumes'], stresses=stress_arrays['stresses'])
+
+
+def load_stress_arrays(fname):
+    """Load the stress arrays written by `save_stress_arrays`, in the format returned by `get_stress_arrays`."""
+    with np.load(fname) as npz:
+        return {'systems': npz['systems'].tolist(), 'volumes': npz['volumes'], 'stresses': npz['stresses']}